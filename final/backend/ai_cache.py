@@ -0,0 +1,110 @@
+"""
+Response cache for the AI endpoints
+Keyed on the normalized question, the username, the user's data version and
+the model, so asking the same thing twice about unchanged data is answered
+from memory instead of another Gemini call. Entries expire after a TTL and
+the in-memory tier evicts least-recently-used entries; an optional SQLite
+file keeps answers across restarts
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer"""
+    return _SPACE.sub(" ", message).strip().rstrip("?!. ").lower()
+
+
+class ResponseCache:
+    """TTL + LRU memory tier in front of an optional SQLite tier"""
+
+    # Expired rows are swept from SQLite every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_entries: int = 500, ttl: float = 3600, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = self.disk_hits = self.misses = 0
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(endpoint: str, model: str, username: str, data_version, message: str) -> str:
+        raw = json.dumps([endpoint, model, username, str(data_version), normalize_message(message)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM ai_responses WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    # The disk tier stores wall-clock expiry; carry what's left over
+                    self._remember(key, value, now + (row[1] - time.time()))
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._remember(key, value, time.monotonic() + self.ttl)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ai_responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time() + self.ttl)
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    self._db.execute("DELETE FROM ai_responses WHERE expires_at <= ?", (time.time(),))
+
+    def _remember(self, key: str, value, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,101 @@
+"""
+Onboarding a year of history: row-by-row POSTs vs POST /api/transactions/bulk
+
+Runs the app against the in-memory Firestore stand-in (fake_firestore.py)
+with a simulated per-RPC latency and imports the same rows
+  - before: one POST /api/transactions per row
+  - after:  one POST /api/transactions/bulk (JSON) and one as a CSV upload
+reporting wall time, rows/sec and Firestore commits for each.
+
+Run from final/backend:
+    python benchmarks/bench_bulk_import.py --rows 3000 --latency 0.005
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_firestore import install
+
+CATEGORIES = ["Food", "Transport", "Utilities", "Shopping", "Health"]
+
+
+def year_of_rows(count: int, username: str):
+    for i in range(count):
+        income = i % 10 == 0
+        yield {
+            "username": username,
+            "type": "income" if income else "expense",
+            "category": "Salary" if income else CATEGORIES[i % len(CATEGORIES)],
+            "amount": 50000.0 if income else 100.0 + i % 900,
+            "description": f"Row {i}",
+            "date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "currency": "PKR",
+        }
+
+
+def as_csv(rows) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["date", "type", "category", "amount", "currency", "description"], extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+async def register(client, username):
+    await client.post("/api/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw", "fullName": username
+    })
+
+
+async def timed(label, fake, count, run):
+    fake.counters.reset()
+    start = time.perf_counter()
+    imported = await run()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s {count / elapsed:10.0f} rows/s {fake.counters.commits:8d} commits  ({imported} imported)")
+
+
+async def main_async(args):
+    fake = install(latency=args.latency)
+    import main_firestore_uuid as main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in ("single", "bulk_json", "bulk_csv"):
+            await register(client, name)
+
+        print(f"{args.rows} rows, {args.latency * 1000:.1f} ms per RPC\n")
+
+        async def one_by_one():
+            for row in year_of_rows(args.rows, "single"):
+                (await client.post("/api/transactions", json=row)).raise_for_status()
+            return args.rows
+
+        async def bulk_json():
+            response = await client.post("/api/transactions/bulk", json=list(year_of_rows(args.rows, "bulk_json")))
+            return response.json()["imported"]
+
+        async def bulk_csv():
+            body = as_csv(year_of_rows(args.rows, "bulk_csv"))
+            response = await client.post("/api/transactions/bulk?username=bulk_csv", files={"file": ("history.csv", body, "text/csv")})
+            return response.json()["imported"]
+
+        await timed("before: POST per row", fake, args.rows, one_by_one)
+        await timed("after: bulk JSON", fake, args.rows, bulk_json)
+        await timed("after: bulk CSV upload", fake, args.rows, bulk_csv)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated seconds per Firestore RPC")
+    asyncio.run(main_async(parser.parse_args()))
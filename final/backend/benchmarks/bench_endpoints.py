@@ -0,0 +1,175 @@
+"""
+Read endpoint latency and Firestore documents read at 1k / 10k / 100k
+transactions per user
+
+Loads one user per size with a synthetic history (datagen.py) through
+POST /api/transactions/bulk, plus a budget per category for the last month
+and a few goals, alongside --background users so queries run against a
+shared collection. Then calls each read endpoint --repeat times (after one
+warm-up call, so the identity cache is hot) and reports p50/p95 latency,
+documents read and response size per endpoint and size, plus the latency and
+documents read of revalidating with the response's ETag (a 304).
+
+The default engine is Firestore via the in-memory stand-in
+(fake_firestore.py), where reads are counted exactly and --latency adds a
+simulated round trip per RPC; --engine sqlite/memory runs the same calls
+against those repositories (no read counts). The stand-in has no ordered
+indexes, so each query also costs time linear in the user's documents - at
+100k that dominates paged queries, where docs read is the Firestore cost.
+
+Run from final/backend:
+    python benchmarks/bench_endpoints.py --sizes 1000,10000,100000 --latency 0.002
+    python benchmarks/bench_endpoints.py --engine sqlite --json sqlite.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datagen
+
+LAST_MONTH = "2025-12"
+MONTHS = 24
+ENDPOINTS = [
+    ("transactions: all", "/api/transactions/{u}?all=true"),
+    ("transactions: month", "/api/transactions/{u}?month={m}"),
+    ("transactions: first page", "/api/transactions/{u}?paginate=true&limit=50"),
+    ("transactions: by month", "/api/transactions/{u}?group_by_month=true&from=2025-07-01&to=2025-12-31"),
+    ("months", "/api/transactions/{u}/months"),
+    ("report: month", "/api/report/{u}?month={m}"),
+    ("report: all-time", "/api/report/{u}"),
+    ("report: 6-month range", "/api/report/{u}?from=2025-07-01&to=2025-12-31"),
+    ("dashboard", "/api/dashboard/{u}?month={m}"),
+    ("budgets: 12 months", "/api/budgets/status/{u}?months={months12}"),
+    ("goals", "/api/goals/{u}"),
+    ("profile", "/api/profile/{u}"),
+    ("export csv: month", "/api/export/{u}?format=csv&month={m}"),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def load_user(client, main, user, count, seed):
+    """Register a user and import `count` transactions, budgets and goals through the API"""
+    (await client.post("/api/register", json=user)).raise_for_status()
+    username = user["username"]
+    rows = list(datagen.transactions(username, count, MONTHS, LAST_MONTH, seed))
+    for i in range(0, len(rows), main.BULK_MAX_ROWS):
+        response = await client.post("/api/transactions/bulk", json=rows[i:i + main.BULK_MAX_ROWS])
+        response.raise_for_status()
+        assert response.json()["failed"] == 0, response.json()["errors"][:3]
+    for category, _, typical, _, _ in datagen.EXPENSE_PROFILE:
+        (await client.post("/api/budgets/set", json={
+            "username": username, "category": category, "amount": typical * 50, "month": LAST_MONTH
+        })).raise_for_status()
+    for name, target in (("Emergency fund", 300000), ("Car", 1500000), ("Holiday", 200000)):
+        (await client.post("/api/goals/create", json={
+            "username": username, "name": name, "target_amount": target, "deadline": "2027-12-31"
+        })).raise_for_status()
+
+
+async def measure(client, fake, path, repeat):
+    (await client.get(path)).raise_for_status()
+    latencies, reads, size = [], [], 0
+    for _ in range(repeat):
+        before = fake.counters.reads if fake else 0
+        start = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        reads.append(fake.counters.reads - before if fake else None)
+        size = len(response.content)
+
+    not_modified_ms, not_modified_reads = None, None
+    etag = response.headers.get("etag")
+    if etag:
+        before = fake.counters.reads if fake else 0
+        start = time.perf_counter()
+        revalidated = await client.get(path, headers={"If-None-Match": etag})
+        not_modified_ms = (time.perf_counter() - start) * 1000
+        assert revalidated.status_code == 304, revalidated.status_code
+        not_modified_reads = fake.counters.reads - before if fake else None
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "reads": reads[-1],
+        "bytes": size,
+        "not_modified_ms": not_modified_ms,
+        "not_modified_reads": not_modified_reads,
+    }
+
+
+async def main_async(args):
+    os.environ["STORAGE_ENGINE"] = args.engine
+    if args.engine == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    fake = None
+    if args.engine == "firestore":
+        from fake_firestore import install
+        fake = install()
+    import main_firestore_uuid as main
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    months12 = ",".join(start.strftime("%Y-%m") for start in datagen.month_starts(12, LAST_MONTH))
+    results = {}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        for user in datagen.users(args.background, prefix="background"):
+            await load_user(client, main, user, args.background_size, args.seed)
+        for size in sizes:
+            await load_user(client, main, datagen.users(1, prefix=f"user{size}")[0], size, args.seed)
+        print(f"engine {args.engine}: loaded {sizes} + {args.background} x {args.background_size} "
+              f"transactions in {time.perf_counter() - start:.1f}s")
+
+        if fake:
+            fake.latency = args.latency
+            print(f"{args.latency * 1000:.1f} ms per simulated Firestore RPC")
+        print(f"{args.repeat} timed calls per endpoint after one warm-up\n")
+
+        for size in sizes:
+            username = f"user{size}_0"
+            results[size] = {}
+            print(f"{size} transactions per user")
+            print(f"  {'endpoint':<26} {'p50 ms':>9} {'p95 ms':>9} {'docs read':>10} {'KB':>9} "
+                  f"{'304 ms':>8} {'304 docs':>9}")
+            for label, template in ENDPOINTS:
+                path = template.format(u=username, m=LAST_MONTH, months12=months12)
+                result = results[size][label] = await measure(client, fake, path, args.repeat)
+                reads = "-" if result["reads"] is None else str(result["reads"])
+                not_modified_ms = "-" if result["not_modified_ms"] is None else f"{result['not_modified_ms']:.2f}"
+                not_modified_reads = "-" if result["not_modified_reads"] is None else str(result["not_modified_reads"])
+                print(f"  {label:<26} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {reads:>10} "
+                      f"{result['bytes'] / 1024:9.1f} {not_modified_ms:>8} {not_modified_reads:>9}")
+            print()
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"engine": args.engine, "latency": args.latency, "results": results}, out, indent=2)
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="transactions per user, comma-separated")
+    parser.add_argument("--engine", choices=["firestore", "sqlite", "memory"], default="firestore")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per Firestore RPC")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--background", type=int, default=5, help="other users sharing the collections")
+    parser.add_argument("--background-size", type=int, default=1000, help="transactions per background user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main_async(parser.parse_args()))
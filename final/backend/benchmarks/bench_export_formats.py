@@ -0,0 +1,52 @@
+"""
+Export CPU time and payload size per format
+
+Streams the same synthetic rows through every writer in exports.py and
+reports wall time, CPU time and bytes produced.
+
+Run from final/backend:
+    python benchmarks/bench_export_formats.py --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exports import EXPORT_FORMATS, export_writer, stream_export
+from bench_export_memory import HEADERS, synthetic_rows
+
+
+def measure(fmt: str, count: int) -> tuple:
+    writer = export_writer(fmt)
+
+    async def consume():
+        size = 0
+        async for chunk in stream_export(lambda sink: writer(sink, HEADERS, synthetic_rows(count))):
+            size += len(chunk)
+        return size
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    size = asyncio.run(consume())
+    return time.perf_counter() - wall, time.process_time() - cpu, size
+
+
+def main(count: int):
+    print(f"{count} rows")
+    print(f"{'format':>8} {'wall s':>8} {'cpu s':>8} {'MB':>8}")
+    for fmt in EXPORT_FORMATS:
+        try:
+            wall, cpu, size = measure(fmt, count)
+        except RuntimeError as e:
+            print(f"{fmt:>8}  skipped ({e})")
+            continue
+        print(f"{fmt:>8} {wall:>8.2f} {cpu:>8.2f} {size / 1024 / 1024:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,92 @@
+"""
+Peak memory of the XLSX export as the row count grows
+
+Compares the old in-memory build (Workbook + BytesIO) against the streaming
+write-only export in exports.py, measuring peak traced allocations with
+tracemalloc. The streaming column should stay flat while the old one grows
+linearly with the number of rows; the run fails (exit status 1) if the
+streaming peak at the largest row count is more than --max-growth times the
+peak at the smallest.
+
+Run from final/backend:
+    python benchmarks/bench_export_memory.py --rows 1000 10000 50000
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tracemalloc
+
+from openpyxl import Workbook, load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exports import stream_export, write_xlsx
+
+HEADERS = ["Date", "Type", "Category", "Amount", "Currency", "Description"]
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        yield (f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "expense", "Food", 10.5 + i % 100, "PKR", f"Transaction {i}")
+
+
+def in_memory_export(count: int) -> int:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for row in synthetic_rows(count):
+        ws.append(row)
+    output = io.BytesIO()
+    wb.save(output)
+    return len(output.getvalue())
+
+
+def streaming_export(count: int, keep: bool = False):
+    async def consume():
+        size, kept = 0, io.BytesIO() if keep else None
+        async for chunk in stream_export(lambda sink: write_xlsx(sink, HEADERS, synthetic_rows(count))):
+            size += len(chunk)
+            if kept is not None:
+                kept.write(chunk)
+        return kept if keep else size
+    return asyncio.run(consume())
+
+
+def peak_mb(fn, *args) -> float:
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main(row_counts, max_growth: float) -> int:
+    # Sanity check: the streamed bytes are a readable workbook with every row
+    workbook = load_workbook(streaming_export(100, keep=True), read_only=True)
+    assert sum(1 for _ in workbook.active.iter_rows()) == 101
+
+    print(f"{'rows':>10} {'in-memory MB':>14} {'streaming MB':>14}")
+    streaming = {}
+    for count in sorted(row_counts):
+        streaming[count] = peak_mb(streaming_export, count)
+        print(f"{count:>10} {peak_mb(in_memory_export, count):>14.1f} {streaming[count]:>14.1f}")
+
+    smallest, largest = min(streaming), max(streaming)
+    growth = streaming[largest] / streaming[smallest]
+    if growth > max_growth:
+        print(f"FAIL: streaming peak grew {growth:.1f}x from {smallest} to {largest} rows (limit {max_growth}x)")
+        return 1
+    print(f"ok: streaming peak grew {growth:.1f}x from {smallest} to {largest} rows (limit {max_growth}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--max-growth", type=float, default=2.0,
+                        help="largest allowed streaming peak at the most rows / at the fewest")
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.max_growth))
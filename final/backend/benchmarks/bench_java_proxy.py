@@ -0,0 +1,126 @@
+"""
+Microbenchmark: per-request overhead of proxying to the Java backend
+
+Starts a stand-in Java backend on port 9000 and compares
+  - before: a new httpx.AsyncClient per request (the old handler pattern)
+  - after:  main.forward() over the shared, pooled app client
+
+Run from final/backend:
+    python benchmarks/bench_java_proxy.py --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = 9000
+PAYLOAD = json.dumps([
+    {"id": str(i), "username": "bench", "type": "expense", "category": "Food",
+     "amount": 12.5, "description": "Lunch", "date": "2025-11-01"}
+    for i in range(20)
+]).encode()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers every request with the same JSON body, keeping the connection alive"""
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", PORT), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def before(url: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params={"username": "bench"}, timeout=10.0)
+        return response.json()
+
+
+async def run(label: str, call, total: int, concurrency: int) -> dict:
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with slots:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "label": label,
+        "requests": total,
+        "req_per_sec": total / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+    print(f"{label:>8}: {result['req_per_sec']:8.0f} req/s  mean {result['mean_ms']:6.2f} ms  "
+          f"p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms")
+    return result
+
+
+async def main(total: int, concurrency: int):
+    import main as proxy
+
+    url = f"http://127.0.0.1:{PORT}/api/java/transactions/get"
+    proxy.app.state.java = proxy.create_java_client()
+    try:
+        # Warm up both paths once
+        await before(url)
+        await proxy.forward("GET", "/api/java/transactions/get", "failed", params={"username": "bench"})
+
+        old = await run("before", lambda: before(url), total, concurrency)
+        new = await run("after", lambda: proxy.forward(
+            "GET", "/api/java/transactions/get", "failed", params={"username": "bench"}
+        ), total, concurrency)
+    finally:
+        await proxy.app.state.java.aclose()
+
+    print(f"per-request overhead saved: {old['mean_ms'] - new['mean_ms']:.2f} ms "
+          f"({old['mean_ms'] / new['mean_ms']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("JAVA_BACKEND_URL", f"http://127.0.0.1:{PORT}")
+    server = start_stand_in()
+    try:
+        asyncio.run(main(args.requests, args.concurrency))
+    finally:
+        server.shutdown()
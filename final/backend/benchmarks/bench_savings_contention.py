@@ -0,0 +1,119 @@
+"""
+Load test: concurrent savings vault deposits and withdrawals on one user
+
+Runs against the in-memory Firestore stand-in (fake_firestore.py) with a
+simulated per-RPC latency, firing a shuffled mix of deposits and withdrawals
+through the app's bounded DB pool and comparing
+  - before: read savingsVault, compute in Python, update (the old handlers)
+  - after:  main.repo.deposit_savings (Increment) / main.withdraw (transaction)
+
+For each it checks the final vault against deposits minus the withdrawals
+that reported success (and, for "after", against the savings ledger), and
+reports throughput.
+
+Run from final/backend:
+    python benchmarks/bench_savings_contention.py --ops 400 --latency 0.002
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_firestore import install
+
+DEPOSIT, WITHDRAWAL = 10.0, 5.0
+
+
+def legacy_deposit(db, user_id, amount):
+    user_ref = db.collection('users').document(user_id)
+    current = user_ref.get().to_dict().get('savingsVault', 0)
+    user_ref.update({'savingsVault': current + amount})
+
+
+def legacy_withdraw(db, user_id, amount):
+    user_ref = db.collection('users').document(user_id)
+    current = user_ref.get().to_dict().get('savingsVault', 0)
+    if amount > current:
+        raise HTTPException(status_code=400, detail="Insufficient savings")
+    user_ref.update({'savingsVault': current - amount})
+
+
+async def run_mix(main, user_id, ops, deposit, withdraw):
+    async def one(kind):
+        try:
+            if kind == 'deposit':
+                await deposit(user_id, DEPOSIT)
+            else:
+                await withdraw(user_id, WITHDRAWAL)
+            return kind, 'ok'
+        except HTTPException as exc:
+            return kind, 'insufficient' if exc.status_code == 400 else 'contention'
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(kind) for kind in ops))
+    return results, time.perf_counter() - start
+
+
+def report(label, main, fake, user_id, results, elapsed, check_ledger):
+    deposits = sum(1 for kind, status in results if kind == 'deposit' and status == 'ok')
+    withdrawals = sum(1 for kind, status in results if kind == 'withdrawal' and status == 'ok')
+    refused = sum(1 for _, status in results if status == 'insufficient')
+    contention = sum(1 for _, status in results if status == 'contention')
+    expected = deposits * DEPOSIT - withdrawals * WITHDRAWAL
+    actual = main.repo.db.collection('users').document(user_id).get().to_dict().get('savingsVault', 0)
+
+    print(f"\n{label}")
+    print(f"  ops/sec           {len(results) / elapsed:10.0f}   ({elapsed:.2f}s)")
+    print(f"  ok deposits       {deposits:10d}")
+    print(f"  ok withdrawals    {withdrawals:10d}   refused {refused}, gave up on contention {contention}")
+    print(f"  txn aborts        {fake.counters.aborts:10d}")
+    print(f"  expected vault    {expected:10.2f}")
+    print(f"  actual vault      {actual:10.2f}   {'OK' if actual == expected else 'LOST UPDATES'}")
+    if check_ledger:
+        ledger = main.repo.db.collection('users').document(user_id).collection('savings_ledger').get()
+        total = sum(e.get('amount') if e.get('type') == 'deposit' else -e.get('amount') for e in ledger)
+        print(f"  ledger total      {total:10.2f}   {'OK' if total == actual else 'MISMATCH'} ({len(ledger)} entries)")
+
+
+def fresh_user(main, name):
+    user_id = main.generate_id()
+    main.repo.db.collection('users').document(user_id).set({'userId': user_id, 'username': name, 'savingsVault': 0})
+    return user_id
+
+
+async def main_async(args):
+    fake = install(latency=args.latency)
+    import main_firestore_uuid as main
+
+    rng = random.Random(args.seed)
+    ops = ['deposit'] * (args.ops // 2) + ['withdrawal'] * (args.ops - args.ops // 2)
+    rng.shuffle(ops)
+
+    print(f"{args.ops} ops, {main.DB_MAX_WORKERS} DB workers, {args.latency * 1000:.1f} ms per RPC")
+
+    def pooled(fn, *bound):
+        return lambda *args: main.run_db(fn, *bound, *args)
+
+    for label, deposit, withdraw, check_ledger in (
+        ("before: read-compute-update", pooled(legacy_deposit, main.repo.db), pooled(legacy_withdraw, main.repo.db), False),
+        ("after: Increment + transaction", pooled(main.repo.deposit_savings), main.withdraw, True),
+    ):
+        user_id = fresh_user(main, label)
+        fake.counters.reset()
+        results, elapsed = await run_mix(main, user_id, ops, deposit, withdraw)
+        report(label, main, fake, user_id, results, elapsed, check_ledger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated seconds per Firestore RPC")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
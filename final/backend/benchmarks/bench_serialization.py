@@ -0,0 +1,105 @@
+"""
+Serializing a 10k-transaction response: FastAPI's default path vs orjson,
+and the bytes that go on the wire with and without compression
+
+Builds the rows GET /api/transactions/{username} returns (and the
+group_by_month shape) from datagen.py, then times
+  - before: jsonable_encoder + JSONResponse (json.dumps)
+  - after:  FastJSONResponse (orjson, no jsonable_encoder pass)
+and reports body size raw, gzip'd and brotli'd (if brotli is installed) at
+the levels CompressionMiddleware uses, with the time each takes.
+
+Run from final/backend:
+    python benchmarks/bench_serialization.py --transactions 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import datagen
+import responses
+from responses import FastJSONResponse, compress
+
+
+def api_rows(count: int, seed: int) -> list:
+    """Rows shaped like the transaction endpoint's, newest first"""
+    rows = []
+    for i, row in enumerate(datagen.transactions("bench_0", count, seed=seed)):
+        txn_id = f"{i:08x}-0000-4000-8000-{i:012x}"
+        rows.append({
+            **row,
+            "transactionId": txn_id,
+            "userId": "5f1c0a52-1d2e-4c9b-9a57-0d5f3e9c2b71",
+            "created_at": f"{row['date']}T12:00:00.000000",
+            "id": txn_id,
+        })
+    return rows[::-1]
+
+
+def grouped_by_month(rows: list) -> dict:
+    grouped = defaultdict(list)
+    for txn in rows:
+        grouped[txn["date"][:7]].append(txn)
+    return {"grouped_by_month": [
+        {
+            "month": month,
+            "transactions": txns,
+            "count": len(txns),
+            "total_income": sum(t["amount"] for t in txns if t["type"] == "income"),
+            "total_expense": sum(t["amount"] for t in txns if t["type"] == "expense"),
+        }
+        for month, txns in sorted(grouped.items(), reverse=True)
+    ]}
+
+
+def timed(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def report(label: str, payload, repeat: int):
+    print(label)
+    before_ms, before = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    after_ms, after = timed(lambda: FastJSONResponse(payload).body, repeat)
+    print(f"  {'encoder':<40} {'ms':>8} {'KB':>9}")
+    print(f"  {'before: jsonable_encoder + json.dumps':<40} {before_ms:8.1f} {len(before) / 1024:9.1f}")
+    print(f"  {'after: orjson' + ('' if responses.orjson else ' (not installed: stdlib)'):<40} "
+          f"{after_ms:8.1f} {len(after) / 1024:9.1f}   {before_ms / after_ms:.1f}x faster")
+
+    print(f"  {'on the wire':<40} {'ms':>8} {'KB':>9}")
+    print(f"  {'identity':<40} {0:8.1f} {len(after) / 1024:9.1f}")
+    for coding in ("gzip", "br"):
+        if coding == "br" and responses.brotli is None:
+            print(f"  {'br':<40} {'-':>8} {'-':>9}   (brotli not installed)")
+            continue
+        ms, body = timed(lambda: compress(after, coding), repeat)
+        print(f"  {coding:<40} {ms:8.1f} {len(body) / 1024:9.1f}   {len(after) / len(body):.1f}x smaller")
+    print()
+
+
+def main(args):
+    rows = api_rows(args.transactions, args.seed)
+    print(f"{args.transactions} transactions, median of {args.repeat} runs\n")
+    report("GET /api/transactions/{username}?all=true", rows, args.repeat)
+    report("GET /api/transactions/{username}?group_by_month=true", grouped_by_month(rows), args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+"""
+Deterministic synthetic users and transaction histories for the benchmarks
+
+The same (seed, username, count) always produces the same rows, so runs are
+comparable across commits. Histories look like a household's: a salary at
+the start of each month, occasional freelance/investment income, and
+expenses whose categories, amounts (log-normal around a typical price) and
+days (busier at weekends for food, shopping and entertainment) follow
+per-category profiles. Rows are TransactionCreate-shaped, oldest first.
+
+    python benchmarks/datagen.py --users 2 --transactions 1000 > rows.ndjson
+"""
+import argparse
+import calendar
+import json
+import math
+import random
+import sys
+from datetime import date
+from typing import Iterator, List
+
+# category, weight, typical amount (PKR), spread (sigma of the log), weekend-heavy
+EXPENSE_PROFILE = [
+    ("Food", 40, 1200, 0.6, True),
+    ("Transport", 20, 600, 0.5, False),
+    ("Shopping", 12, 3500, 0.8, True),
+    ("Entertainment", 8, 2000, 0.7, True),
+    ("Utilities", 6, 5000, 0.4, False),
+    ("Healthcare", 5, 3000, 0.9, False),
+    ("Other", 9, 1500, 1.0, False),
+]
+INCOME_PROFILE = [
+    ("Freelance", 60, 25000, 0.5),
+    ("Investments", 30, 8000, 0.8),
+    ("Other", 10, 5000, 0.7),
+]
+SALARY = 90000
+# Roughly one extra (non-salary) income row per this many transactions
+EXTRA_INCOME_EVERY = 40
+
+
+def users(count: int, prefix: str = "bench") -> List[dict]:
+    """Registration payloads for bench_0 .. bench_{count-1}"""
+    return [
+        {
+            "username": f"{prefix}_{i}",
+            "email": f"{prefix}_{i}@example.com",
+            "password": "benchmark",
+            "fullName": f"Bench User {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def month_starts(months: int, end: str) -> List[date]:
+    """First day of each of the `months` months ending with `end` (YYYY-MM)"""
+    year, month = map(int, end.split("-"))
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def _amount(rng: random.Random, typical: float, spread: float) -> float:
+    return round(typical * math.exp(rng.gauss(0, spread)), 2)
+
+
+def _day(rng: random.Random, start: date, weekend_heavy: bool) -> date:
+    days = calendar.monthrange(start.year, start.month)[1]
+    while True:
+        day = start.replace(day=rng.randint(1, days))
+        # Weekend-heavy categories keep every weekend day but only 60% of weekdays
+        if not weekend_heavy or day.weekday() >= 5 or rng.random() < 0.6:
+            return day
+
+
+def transactions(username: str, count: int, months: int = 24, end: str = "2025-12",
+                 seed: int = 0) -> Iterator[dict]:
+    """`count` rows for one user spread over `months` months, oldest first"""
+    rng = random.Random(f"{seed}:{username}:{count}")
+    starts = month_starts(months, end)
+    salaries = min(count, len(starts))
+    rows = []
+
+    for start in starts[-salaries:]:
+        rows.append((start, "income", "Salary", float(SALARY), "Monthly salary"))
+
+    expense_weights = [weight for _, weight, _, _, _ in EXPENSE_PROFILE]
+    income_weights = [weight for _, weight, _, _ in INCOME_PROFILE]
+    for _ in range(count - salaries):
+        start = rng.choice(starts)
+        if rng.randrange(EXTRA_INCOME_EVERY) == 0:
+            category, _, typical, spread = rng.choices(INCOME_PROFILE, income_weights)[0]
+            rows.append((_day(rng, start, False), "income", category, _amount(rng, typical, spread), category))
+        else:
+            category, _, typical, spread, weekend = rng.choices(EXPENSE_PROFILE, expense_weights)[0]
+            rows.append((_day(rng, start, weekend), "expense", category, _amount(rng, typical, spread), category))
+
+    rows.sort(key=lambda row: row[0])
+    for i, (day, kind, category, amount, label) in enumerate(rows):
+        yield {
+            "username": username,
+            "type": kind,
+            "category": category,
+            "amount": amount,
+            "description": f"{label} #{i}",
+            "date": day.isoformat(),
+            "currency": "PKR",
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print synthetic transactions as NDJSON")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--transactions", type=int, default=1000, help="transactions per user")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--end", default="2025-12", help="last month of history (YYYY-MM)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for user in users(args.users):
+        for row in transactions(user["username"], args.transactions, args.months, args.end, args.seed):
+            sys.stdout.write(json.dumps(row) + "\n")
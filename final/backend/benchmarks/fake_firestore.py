@@ -0,0 +1,406 @@
+"""
+In-memory stand-in for the subset of the Firestore client the backend uses
+
+Good enough to run main_firestore_uuid.py end to end without a project:
+documents, collections/subcollections, where/order_by/limit/start_after
+queries, batches, get_all, Increment/SERVER_TIMESTAMP/DELETE_FIELD and
+transactions. Queries return documents in id order unless ordered, use a
+per-field index for their first equality filter (so one user's query doesn't
+scan everyone's documents) and bill one read when they match nothing, as
+the service does. Transactions are optimistic like the real service - reads are
+versioned, a commit whose reads went stale is aborted and the transactional
+function is retried (up to max_attempts, then ValueError as in the client).
+
+An optional per-RPC latency makes races and round trips show up in timings,
+and every client keeps read/write/delete counters.
+
+    from fake_firestore import install
+    fake = install(latency=0.002)   # before importing main_firestore_uuid
+    import main_firestore_uuid
+"""
+import copy
+import datetime
+import heapq
+import threading
+import time
+import uuid
+
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import BaseQuery
+
+DESCENDING = BaseQuery.DESCENDING
+
+
+class Counters:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.reads = self.writes = self.deletes = 0
+        self.commits = self.aborts = 0
+
+
+class Aborted(Exception):
+    """A transaction's reads went stale before it committed"""
+
+
+# ========== VALUES ==========
+
+def _apply_value(current, value):
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.datetime.now(datetime.timezone.utc)
+    return copy.deepcopy(value)
+
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict):
+            node = target.get(key)
+            if not isinstance(node, dict):
+                node = target[key] = {}
+            _merge(node, value)
+        elif value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        else:
+            target[key] = _apply_value(target.get(key), value)
+
+
+def _index_key(value):
+    """Hashable stand-in for a field value in the equality indexes"""
+    return value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+
+
+def _nest(data):
+    """Expand dotted update() paths into nested dicts"""
+    nested = {}
+    for key, value in data.items():
+        node = nested
+        parts = key.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return nested
+
+
+# ========== DOCUMENTS ==========
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split('.'):
+            value = value[part]
+        return value
+
+
+class DocumentReference:
+    def __init__(self, client, parent, doc_id):
+        self._client = client
+        self.parent = parent
+        self.id = doc_id
+        self.path = f"{parent}/{doc_id}"
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        return self._client._get([self], transaction)[0]
+
+    def set(self, data, merge=False):
+        self._client._commit([('set', self, data, merge)])
+
+    def update(self, data):
+        self._client._commit([('update', self, data, None)])
+
+    def delete(self):
+        self._client._commit([('delete', self, None, None)])
+
+
+# ========== QUERIES ==========
+
+class Query:
+    def __init__(self, client, path, filters=(), orders=(), limit=None, cursor=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit, cursor=self._cursor)
+        args.update(changes)
+        return Query(self._client, self._path, **args)
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        if isinstance(values, DocumentSnapshot):
+            values = values.to_dict()
+        return self._copy(cursor=values)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if field not in data:
+                return False
+            actual = data[field]
+            if op == '==' and actual != value:
+                return False
+            if op == '<' and not actual < value:
+                return False
+            if op == '<=' and not actual <= value:
+                return False
+            if op == '>' and not actual > value:
+                return False
+            if op == '>=' and not actual >= value:
+                return False
+            if op == 'in' and actual not in value:
+                return False
+        return True
+
+    def _after_cursor(self, data):
+        for field, direction in self._orders:
+            value, bound = data[field], self._cursor[field]
+            if value != bound:
+                return value < bound if direction == DESCENDING else value > bound
+        return False
+
+    def _ordered(self, rows):
+        """The first `limit` rows in query order, ties broken by document id as in Firestore"""
+        directions = {direction for _, direction in self._orders}
+        if len(directions) > 1:
+            rows.sort(key=lambda row: row[0])
+            for field, direction in reversed(self._orders):
+                rows.sort(key=lambda row: row[1][field], reverse=direction == DESCENDING)
+            return rows[:self._limit] if self._limit is not None else rows
+
+        descending = directions == {DESCENDING}
+        key = lambda row: tuple(row[1][field] for field, _ in self._orders) + (row[0],)
+        if self._limit is not None:
+            return (heapq.nlargest if descending else heapq.nsmallest)(self._limit, rows, key=key)
+        return sorted(rows, key=key, reverse=descending)
+
+    def stream(self, transaction=None):
+        equals = next(((field, value) for field, op, value in self._filters if op == '=='), None)
+        rows = [(doc_id, data) for doc_id, (_, data) in self._client._scan(self._path, equals) if self._matches(data)]
+        rows = [row for row in rows if all(field in row[1] for field, _ in self._orders)]
+        if self._cursor is not None:
+            rows = [row for row in rows if self._after_cursor(row[1])]
+        rows = self._ordered(rows)
+        refs = [DocumentReference(self._client, self._path, doc_id) for doc_id, _ in rows]
+        if not refs:
+            self._client._bill_empty_query()
+            return iter([])
+        return iter(self._client._get(refs, transaction))
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction))
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, doc_id=None):
+        return DocumentReference(self._client, self._path, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+# ========== WRITES ==========
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(('set', ref, data, merge))
+
+    def update(self, ref, data):
+        self._ops.append(('update', ref, data, None))
+
+    def delete(self, ref):
+        self._ops.append(('delete', ref, None, None))
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        self._client._commit(ops)
+
+
+class Transaction(WriteBatch):
+    def __init__(self, client, max_attempts=5):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_versions = {}
+
+    def _begin(self):
+        self._ops = []
+        self._read_versions = {}
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        self._client._commit(ops, self._read_versions)
+
+
+def transactional(fn):
+    """Retry fn(transaction, ...) when its reads go stale, like firestore.transactional"""
+    def run(transaction, *args, **kwargs):
+        for _ in range(transaction._max_attempts):
+            transaction._begin()
+            result = fn(transaction, *args, **kwargs)
+            try:
+                transaction.commit()
+                return result
+            except Aborted:
+                continue
+        raise ValueError(f"Failed to commit transaction in {transaction._max_attempts} attempts.")
+    return run
+
+
+# ========== CLIENT ==========
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.counters = Counters()
+        self._collections = {}
+        # (collection path, field) -> field value -> ids of the documents holding it
+        self._indexes = {}
+        self._version = 0
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, **kwargs):
+        return Transaction(self, max_attempts)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        return iter(self._get(references, transaction) if references else [])
+
+    def _rpc(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _scan(self, path, equals=None):
+        """A collection's (id, (version, data)) pairs, narrowed to field == value if given"""
+        self._rpc()
+        with self._lock:
+            docs = self._collections.get(path, {})
+            if equals is None:
+                return list(docs.items())
+            field, value = equals
+            ids = self._index(path, field).get(_index_key(value), ())
+            return [(doc_id, docs[doc_id]) for doc_id in ids]
+
+    def _index(self, path, field):
+        """The equality index for a field, built on first use and kept up to date by _commit"""
+        index = self._indexes.get((path, field))
+        if index is None:
+            index = self._indexes[(path, field)] = {}
+            for doc_id, (_, data) in self._collections.get(path, {}).items():
+                if field in data:
+                    index.setdefault(_index_key(data[field]), set()).add(doc_id)
+        return index
+
+    def _reindex(self, path, doc_id, old, new):
+        for (index_path, field), index in self._indexes.items():
+            if index_path != path:
+                continue
+            if old is not None and field in old:
+                index.get(_index_key(old[field]), set()).discard(doc_id)
+            if new is not None and field in new:
+                index.setdefault(_index_key(new[field]), set()).add(doc_id)
+
+    def _bill_empty_query(self):
+        with self._lock:
+            self.counters.reads += 1
+
+    def _get(self, refs, transaction=None):
+        self._rpc()
+        with self._lock:
+            snapshots = []
+            for ref in refs:
+                version, data = self._collections.get(ref.parent, {}).get(ref.id, (0, None))
+                if transaction is not None:
+                    transaction._read_versions.setdefault(ref.path, (ref, version))
+                snapshots.append(DocumentSnapshot(ref, copy.deepcopy(data) if data is not None else None))
+            self.counters.reads += len(refs)
+            return snapshots
+
+    def _commit(self, ops, read_versions=None):
+        self._rpc()
+        with self._lock:
+            for ref, version in (read_versions or {}).values():
+                if self._collections.get(ref.parent, {}).get(ref.id, (0, None))[0] != version:
+                    self.counters.aborts += 1
+                    raise Aborted(ref.path)
+            # Validate before applying anything so a failed commit writes nothing
+            pending = {}
+            for op, ref, _, _ in ops:
+                exists = pending.get(ref.path, ref.id in self._collections.get(ref.parent, {}))
+                if op == 'update' and not exists:
+                    raise KeyError(f"No document to update: {ref.path}")
+                pending[ref.path] = op != 'delete'
+            self._version += 1
+            for op, ref, data, merge in ops:
+                docs = self._collections.setdefault(ref.parent, {})
+                old = docs[ref.id][1] if ref.id in docs else None
+                if op == 'delete':
+                    self.counters.deletes += 1
+                    docs.pop(ref.id, None)
+                    self._reindex(ref.parent, ref.id, old, None)
+                    continue
+                self.counters.writes += 1
+                current = copy.deepcopy(old) if (merge or op == 'update') and old is not None else {}
+                _merge(current, _nest(data) if op == 'update' else data)
+                docs[ref.id] = (self._version, current)
+                self._reindex(ref.parent, ref.id, old, current)
+            self.counters.commits += 1
+
+
+def install(latency: float = 0.0) -> FakeClient:
+    """Point firebase_admin at a fresh FakeClient (call before importing the app)"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    fake = FakeClient(latency)
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: fake
+    firestore.transactional = transactional
+    return fake
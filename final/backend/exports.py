@@ -0,0 +1,288 @@
+"""
+Streaming export helpers shared by the backends
+Every format is written on a worker thread from one row iterator and the
+bytes are handed to the response as they are produced, so memory stays
+bounded by the chunk size (or one Parquet row group) instead of the row count
+"""
+import asyncio
+import codecs
+import contextvars
+import csv
+import json
+import queue
+import threading
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "xlsx": (XLSX_MEDIA_TYPE, "xlsx"),
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+PARQUET_ROW_GROUP_SIZE = 10000
+
+CHUNK_SIZE = 64 * 1024
+MAX_PENDING_CHUNKS = 8
+
+_DONE = object()
+
+
+class ExportCancelled(Exception):
+    """Raised inside the producer thread once the client has gone away"""
+
+
+def _put(chunks: queue.Queue, item, cancelled: threading.Event):
+    # Block while the client is slower than the producer, but give up as soon
+    # as the response has been abandoned
+    while True:
+        if cancelled.is_set():
+            raise ExportCancelled()
+        try:
+            chunks.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+class ChunkWriter:
+    """Write-only file object that hands fixed-size chunks to a bounded queue
+    
+    It deliberately has no seek/tell, so zipfile writes the archive as a
+    plain forward-only stream.
+    """
+    closed = False
+    
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event, chunk_size: int = CHUNK_SIZE):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+    
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            self._emit()
+        return len(data)
+    
+    def writable(self) -> bool:
+        return True
+    
+    def flush(self):
+        pass
+    
+    def finish(self):
+        if self._buffer:
+            self._emit()
+    
+    def _emit(self):
+        _put(self._chunks, bytes(self._buffer), self._cancelled)
+        self._buffer.clear()
+
+
+def write_xlsx(sink, headers: List[str], rows: Iterable[tuple], column_widths: Optional[List[float]] = None, title: str = "Transactions"):
+    """Write a single-sheet workbook with a styled header row into `sink`"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    
+    # Column widths must be set before the first row in write-only mode
+    for col, width in enumerate(column_widths or [], 1):
+        ws.column_dimensions[chr(ord('A') + col - 1)].width = width
+    
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_alignment = Alignment(horizontal="center")
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        header_row.append(cell)
+    ws.append(header_row)
+    
+    for row in rows:
+        ws.append(row)
+    
+    wb.save(sink)
+
+
+class _TextSink:
+    """Lets csv.writer write str into a binary ChunkWriter"""
+    
+    def __init__(self, sink):
+        self._sink = sink
+    
+    def write(self, text: str) -> int:
+        return self._sink.write(text.encode("utf-8"))
+
+
+def write_csv(sink, headers: List[str], rows: Iterable[tuple]):
+    writer = csv.writer(_TextSink(sink))
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_ndjson(sink, headers: List[str], rows: Iterable[tuple]):
+    """One JSON object per line, keyed by the lower-cased headers"""
+    fields = [header.lower() for header in headers]
+    for row in rows:
+        sink.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False).encode("utf-8"))
+        sink.write(b"\n")
+
+
+def write_parquet(sink, headers: List[str], rows: Iterable[tuple], row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+    """Columnar export written one row group at a time
+    
+    Numeric columns (judged from the first row) are stored as float64 and
+    everything else as strings.
+    """
+    fields = [header.lower() for header in headers]
+    rows = iter(rows)
+    writer = None
+    try:
+        while True:
+            group = [row for _, row in zip(range(row_group_size), rows)]
+            if writer is None:
+                sample = group[0] if group else [None] * len(fields)
+                schema = pa.schema([
+                    (field, pa.float64() if isinstance(value, (int, float)) and not isinstance(value, bool) else pa.string())
+                    for field, value in zip(fields, sample)
+                ])
+                writer = pq.ParquetWriter(sink, schema)
+            if not group:
+                break
+            columns = list(zip(*group))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            if len(group) < row_group_size:
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# ========== SOURCES ==========
+# Row sources for producers that read from an upstream HTTP body instead of a
+# database cursor: the body is pulled from the event loop a chunk at a time
+# and decoded as it arrives, so it's never held in memory whole.
+
+def iter_async(items: AsyncIterator, loop: asyncio.AbstractEventLoop) -> Iterator:
+    """Consume an async iterator from a worker thread, one step at a time on `loop`"""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(items.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator:
+    """The items of a JSON array, decoded as its bytes arrive"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer, pos, started, exhausted = "", 0, False, False
+
+    def more() -> bool:
+        nonlocal buffer, pos, exhausted
+        if exhausted:
+            return False
+        try:
+            data = text.decode(next(chunks))
+        except StopIteration:
+            data, exhausted = text.decode(b"", final=True), True
+        buffer, pos = buffer[pos:] + data, 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n" + ("," if started else ""):
+            pos += 1
+        if pos == len(buffer):
+            if not more():
+                raise ValueError("JSON array ended early")
+            continue
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started, pos = True, pos + 1
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        # A number cut off mid-chunk ("12" of "12.5") also decodes: only take an
+        # item once the delimiter after it has arrived
+        if (end == len(buffer) or buffer[end] not in " \t\r\n,]") and not exhausted:
+            more()
+            continue
+        pos = end
+        yield item
+
+
+def export_writer(fmt: str) -> Callable:
+    """Writer function for an export format (see EXPORT_FORMATS)"""
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    return {"xlsx": write_xlsx, "csv": write_csv, "ndjson": write_ndjson, "parquet": write_parquet}[fmt]
+
+
+async def stream_export(produce: Callable[[ChunkWriter], None]):
+    """Run `produce(writer)` on a worker thread and yield the bytes it writes
+    
+    At most MAX_PENDING_CHUNKS chunks are buffered; if the client disconnects
+    the producer is stopped at its next write.
+    """
+    chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+    cancelled = threading.Event()
+    
+    def run():
+        writer = ChunkWriter(chunks, cancelled)
+        try:
+            produce(writer)
+            writer.finish()
+            _put(chunks, _DONE, cancelled)
+        except ExportCancelled:
+            # Wake a consumer that may still be blocked on get()
+            try:
+                chunks.put_nowait(_DONE)
+            except queue.Full:
+                pass
+        except BaseException as e:
+            try:
+                _put(chunks, e, cancelled)
+            except ExportCancelled:
+                pass
+    
+    # Run in a copy of the caller's context so per-request state (e.g. document
+    # accounting) follows the rows into the producer thread
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="export", daemon=True).start()
+    try:
+        while True:
+            item = await asyncio.to_thread(chunks.get)
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
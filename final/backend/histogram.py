@@ -0,0 +1,49 @@
+"""
+Bounded histograms for the metrics endpoints
+Counts observations into fixed buckets and keeps the last `window` values
+for percentiles, so memory stays flat however long the process runs.
+Subclasses pick the BUCKETS and the UNIT their snapshot keys are named in.
+"""
+import threading
+from collections import Counter, deque
+
+
+class Histogram:
+    """Bucket counts plus percentiles over the last N observations"""
+
+    BUCKETS = ()
+    UNIT = "value"
+
+    def __init__(self, window: int = 1000):
+        self._recent = deque(maxlen=window)
+        self._buckets = Counter()
+        self._count = 0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._recent.append(value)
+            self._count += 1
+            self._total += value
+            bucket = next((limit for limit in self.BUCKETS if value <= limit), "+Inf")
+            self._buckets[bucket] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            buckets = dict(self._buckets)
+            count, total = self._count, self._total
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0
+
+        return {
+            "count": count,
+            f"mean_{self.UNIT}": total / count if count else 0,
+            f"p50_{self.UNIT}": percentile(0.50),
+            f"p90_{self.UNIT}": percentile(0.90),
+            f"p99_{self.UNIT}": percentile(0.99),
+            f"max_{self.UNIT}": recent[-1] if recent else 0,
+            "buckets": {f"le_{limit}": buckets.get(limit, 0) for limit in self.BUCKETS + ("+Inf",)},
+        }
@@ -0,0 +1,130 @@
+"""
+Cached, indexed view of the Java backend's JSON data files
+The Java service rewrites users.json / transactions.json in place
+(Files.write truncates, then writes), so a reader can catch a half-written
+file. Each file is re-parsed only when its mtime or size changes, grouped by
+username once per parse, and a read that doesn't parse - or that raced with
+a write - keeps serving the last good snapshot until the file settles
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class JsonFileIndex:
+    """A JSON array file, parsed on change and indexed by a key function"""
+
+    def __init__(self, path: Path, index: Callable[[List[dict]], dict]):
+        self.path = path
+        self._index = index
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.rows: List[dict] = []
+        self.by_key: dict = {}
+        # Bumped on every successful re-parse; lets callers memoize derived data
+        self.generation = 0
+        self.parses = self.hits = self.torn_reads = 0
+        self._derived: Dict[tuple, tuple] = {}
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        """Re-parse if the file changed since the last good read"""
+        stamp = self._stat()
+        if stamp == self._stamp:
+            self.hits += 1
+            return
+        with self._lock:
+            stamp = self._stat()
+            if stamp == self._stamp:
+                self.hits += 1
+                return
+            if stamp is None:
+                rows = []
+            else:
+                try:
+                    rows = json.loads(self.path.read_bytes())
+                except (OSError, ValueError):
+                    # Mid-write: keep the previous snapshot, retry next call
+                    self.torn_reads += 1
+                    return
+                if self._stat() != stamp or not isinstance(rows, list):
+                    # The file changed under us; what we parsed may mix versions
+                    self.torn_reads += 1
+                    return
+            self.rows = rows
+            self.by_key = self._index(rows)
+            self._derived = {}
+            self._stamp = stamp
+            self.generation += 1
+            self.parses += 1
+
+    def derived(self, key: tuple, source, build: Callable[[], object]):
+        """`build()` computed once per snapshot of `source` (e.g. a per-user search index)
+
+        `source` is the rows the value is built from; a value built from an
+        older snapshot's rows is never handed out for newer ones.
+        """
+        with self._lock:
+            cached = self._derived.get(key)
+            if cached is not None and cached[0] is source:
+                return cached[1]
+            value = build()
+            self._derived[key] = (source, value)
+            return value
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "rows": len(self.rows),
+            "keys": len(self.by_key),
+            "generation": self.generation,
+            "parses": self.parses,
+            "hits": self.hits,
+            "torn_reads": self.torn_reads,
+        }
+
+
+def group_by_username(rows: List[dict]) -> Dict[str, List[dict]]:
+    groups: Dict[str, List[dict]] = {}
+    for row in rows:
+        groups.setdefault(row.get("username"), []).append(row)
+    return groups
+
+
+def unique_by_username(rows: List[dict]) -> Dict[str, dict]:
+    return {row.get("username"): row for row in rows}
+
+
+class JavaDataStore:
+    """Per-username lookups over the Java backend's users and transactions"""
+
+    def __init__(self, data_dir: Path):
+        self.transactions = JsonFileIndex(data_dir / "transactions.json", group_by_username)
+        self.users = JsonFileIndex(data_dir / "users.json", unique_by_username)
+
+    def user_transactions(self, username: str) -> List[dict]:
+        self.transactions.refresh()
+        return self.transactions.by_key.get(username, [])
+
+    def user(self, username: str) -> Optional[dict]:
+        self.users.refresh()
+        return self.users.by_key.get(username)
+
+    def all_transactions(self) -> List[dict]:
+        self.transactions.refresh()
+        return self.transactions.rows
+
+    def all_users(self) -> List[dict]:
+        self.users.refresh()
+        return self.users.rows
+
+    def stats(self) -> dict:
+        return {"transactions": self.transactions.stats(), "users": self.users.stats()}
@@ -0,0 +1,209 @@
+"""
+Shared gateway for Gemini calls
+One async client per process instead of one per request, and no blocking
+generate_content on the event loop. At most `max_concurrency` calls run at
+once; up to `max_queue` more wait for a slot and anything beyond that is shed
+with a 429. Waiting too long for a slot is a 503, a call that runs past its
+timeout is retried and ends as a 504. Transient upstream failures (429/5xx,
+connection errors, timeouts) are retried with jittered exponential backoff.
+Queue wait, call latency and time to first streamed chunk are recorded as
+histograms for sizing the limits against real traffic
+"""
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import HTTPException
+from google import genai
+from google.genai import errors
+
+from histogram import Histogram
+
+# Upstream status codes worth another attempt
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMUnavailable(HTTPException):
+    """The gateway refused or gave up on a call; carries the status to return"""
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    return isinstance(exc, errors.APIError) and exc.code in RETRYABLE_CODES
+
+
+class LatencyHistogram(Histogram):
+    """Bucketed latencies (seconds) plus percentiles over the last N observations"""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    UNIT = "seconds"
+
+
+class LLMGateway:
+    """Concurrency-limited, load-shedding, retrying access to one genai client"""
+
+    def __init__(self, api_key: Optional[str], model: str, max_concurrency: int = 8, max_queue: int = 32,
+                 queue_timeout: float = 10.0, call_timeout: float = 60.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._client = None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.counters = Counter()
+        self.queue_wait = LatencyHistogram()
+        self.call_latency = LatencyHistogram()
+        self.first_chunk = LatencyHistogram()
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str], model: str) -> "LLMGateway":
+        return cls(
+            api_key,
+            model,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+            call_timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    # ========== ADMISSION ==========
+
+    def raise_if_saturated(self):
+        """Shed load up front when every slot is busy and the queue is full"""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise LLMUnavailable(
+                status_code=429,
+                detail="AI service is busy, please retry shortly",
+                headers={"Retry-After": str(max(1, int(self.queue_timeout)))}
+            )
+
+    @asynccontextmanager
+    async def slot(self):
+        self.raise_if_saturated()
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["rejected_queue_timeout"] += 1
+            raise LLMUnavailable(status_code=503, detail="AI service is overloaded, please retry later")
+        finally:
+            self.waiting -= 1
+        self.queue_wait.observe(time.monotonic() - started)
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    # ========== CALLS ==========
+
+    async def _with_retries(self, attempt):
+        """Run `attempt()` under the call timeout, retrying transient failures"""
+        for number in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(attempt(), self.call_timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    self.counters["failed"] += 1
+                    raise
+                if number == self.max_retries:
+                    self.counters["failed"] += 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.counters["timed_out"] += 1
+                        raise LLMUnavailable(status_code=504, detail="AI service timed out")
+                    raise LLMUnavailable(status_code=503, detail=f"AI service unavailable: {str(e)}")
+                self.counters["retries"] += 1
+                # Full jitter keeps retrying callers from arriving in lockstep
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** number)))
+
+    async def generate(self, contents, model: Optional[str] = None) -> str:
+        """Text of a single (non-streamed) completion"""
+        async with self.slot():
+            started = time.monotonic()
+            response = await self._with_retries(
+                lambda: self.client.aio.models.generate_content(model=model or self.model, contents=contents)
+            )
+            self.call_latency.observe(time.monotonic() - started)
+            self.counters["completed"] += 1
+            return response.text
+
+    async def stream(self, contents, model: Optional[str] = None) -> AsyncIterator:
+        """Chunks of a streamed completion; the slot is held until it is exhausted or closed
+
+        Opening the stream and receiving the first chunk are retried; once
+        chunks have been handed out a failure is final.
+        """
+        async with self.slot():
+            started = time.monotonic()
+            upstream = None
+
+            async def first_chunk():
+                nonlocal upstream
+                if upstream is not None:
+                    await upstream.aclose()
+                upstream = await self.client.aio.models.generate_content_stream(
+                    model=model or self.model, contents=contents
+                )
+                try:
+                    return await upstream.__anext__()
+                except StopAsyncIteration:
+                    return None
+
+            try:
+                chunk = await self._with_retries(first_chunk)
+                self.first_chunk.observe(time.monotonic() - started)
+
+                while chunk is not None:
+                    yield chunk
+                    try:
+                        chunk = await asyncio.wait_for(upstream.__anext__(), self.call_timeout)
+                    except StopAsyncIteration:
+                        chunk = None
+                    except asyncio.TimeoutError:
+                        self.counters["timed_out"] += 1
+                        raise LLMUnavailable(status_code=504, detail="AI service timed out mid-answer")
+
+                self.call_latency.observe(time.monotonic() - started)
+                self.counters["completed"] += 1
+            finally:
+                if upstream is not None:
+                    await upstream.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "counters": dict(self.counters),
+            "queue_wait": self.queue_wait.snapshot(),
+            "call_latency": self.call_latency.snapshot(),
+            "time_to_first_chunk": self.first_chunk.snapshot(),
+        }
@@ -0,0 +1,169 @@
+"""
+Local SQLite store for users and transactions
+Replaces rewriting data/users.json and data/transactions.json wholesale on
+every change: rows live in one SQLite file in WAL mode, so a single insert,
+update or delete touches only that row, readers never block the writer, and
+several worker processes can share the file without corrupting it. Month
+queries use the (username, date) index. The old JSON files are imported once
+with
+
+    python local_store.py data/expense_tracker.db --import-dir data
+
+main.py doesn't open it: every endpoint there proxies to the Java backend,
+which owns the data, so a second local copy would only drift from it.
+"""
+import argparse
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_username_date ON transactions (username, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _transaction_row(txn: dict) -> tuple:
+    return (
+        str(txn["id"]),
+        txn.get("username") or "",
+        txn.get("date") or "",
+        txn.get("created_at") or "",
+        json.dumps(txn),
+    )
+
+
+class LocalStore:
+    """Users and transactions as JSON documents in indexed SQLite tables"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections aren't shared across threads; one per thread
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        """Write transaction: commit on success, roll back on error"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ========== USERS ==========
+
+    def load_users(self) -> List[dict]:
+        return [json.loads(data) for (data,) in self._conn().execute("SELECT data FROM users ORDER BY rowid")]
+
+    def get_user(self, username: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_user(self, user: dict):
+        """Insert or replace one user"""
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO users (username, data) VALUES (?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET data = excluded.data",
+                (user["username"], json.dumps(user))
+            )
+
+    # ========== TRANSACTIONS ==========
+
+    def load_transactions(self) -> List[dict]:
+        return [json.loads(data) for (data,) in self._conn().execute("SELECT data FROM transactions ORDER BY rowid")]
+
+    def user_transactions(self, username: str, month: Optional[str] = None) -> List[dict]:
+        """A user's transactions, newest date first; `month` is YYYY-MM"""
+        if month:
+            rows = self._conn().execute(
+                "SELECT data FROM transactions WHERE username = ? AND date >= ? AND date < ? "
+                "ORDER BY date DESC, created_at DESC",
+                (username, month, month + "~")
+            )
+        else:
+            rows = self._conn().execute(
+                "SELECT data FROM transactions WHERE username = ? ORDER BY date DESC, created_at DESC", (username,)
+            )
+        return [json.loads(data) for (data,) in rows]
+
+    def add_transactions(self, transactions: Iterable[dict]):
+        """Insert or replace transactions by id, all in one commit"""
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO transactions (id, username, date, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (_transaction_row(txn) for txn in transactions)
+            )
+
+    def delete_transaction(self, transaction_id: str) -> bool:
+        with self._tx() as conn:
+            return conn.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,)).rowcount > 0
+
+    # ========== IMPORT ==========
+
+    def import_json(self, users_file: Path, transactions_file: Path) -> Optional[dict]:
+        """One-shot import of the legacy JSON files; a no-op once it has run"""
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return None
+            counts = {"users": 0, "transactions": 0}
+            if Path(users_file).exists():
+                users = json.loads(Path(users_file).read_text() or "[]")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+                    ((u["username"], json.dumps(u)) for u in users)
+                )
+                counts["users"] = len(users)
+            if Path(transactions_file).exists():
+                transactions = json.loads(Path(transactions_file).read_text() or "[]")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO transactions (id, username, date, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (_transaction_row(txn) for txn in transactions)
+                )
+                counts["transactions"] = len(transactions)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (json.dumps(counts),))
+            return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import users.json/transactions.json into the local SQLite store")
+    parser.add_argument("db", help="SQLite file to create or update")
+    parser.add_argument("--import-dir", default="data", help="directory holding users.json and transactions.json")
+    args = parser.parse_args()
+
+    store = LocalStore(Path(args.db))
+    source = Path(args.import_dir)
+    counts = store.import_json(source / "users.json", source / "transactions.json")
+    print(f"Imported {counts}" if counts is not None else "Already imported, nothing to do")
@@ -2,23 +2,55 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Optional
 from datetime import datetime
 import hashlib
 from pathlib import Path
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
 import httpx
 import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from google import genai
 import os
-import json
+from exports import EXPORT_FORMATS, export_writer, iter_async, iter_json_array, stream_export
+from prompt_context import PromptSizeMetrics, TransactionIndex, build_context, estimate_tokens
+from ai_cache import ResponseCache
+from sse import SSE_HEADERS, stream_answer
+from llm_gateway import LLMGateway, LLMUnavailable
+from java_data import JavaDataStore
+from responses import CompressionMiddleware, FastJSONResponse
 
 load_dotenv()
 
-app = FastAPI(title="Expense Tracker API", version="2.0.0")
+JAVA_BACKEND_URL = os.getenv("JAVA_BACKEND_URL", "http://localhost:9000")
+
+# One pooled, keep-alive client to the Java backend for the app's lifetime
+JAVA_MAX_CONNECTIONS = int(os.getenv("JAVA_MAX_CONNECTIONS", "100"))
+JAVA_MAX_KEEPALIVE = int(os.getenv("JAVA_MAX_KEEPALIVE", "20"))
+JAVA_KEEPALIVE_EXPIRY = float(os.getenv("JAVA_KEEPALIVE_EXPIRY", "30"))
+
+# Per-route timeouts (seconds); heavier Java endpoints get more headroom
+JAVA_TIMEOUT = 10.0
+JAVA_REPORT_TIMEOUT = 30.0
+JAVA_EXPORT_TIMEOUT = 60.0
+
+def create_java_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=JAVA_BACKEND_URL,
+        limits=httpx.Limits(
+            max_connections=JAVA_MAX_CONNECTIONS,
+            max_keepalive_connections=JAVA_MAX_KEEPALIVE,
+            keepalive_expiry=JAVA_KEEPALIVE_EXPIRY
+        ),
+        timeout=JAVA_TIMEOUT
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.java = create_java_client()
+    yield
+    await app.state.java.aclose()
+
+app = FastAPI(title="Expense Tracker API", version="2.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,18 +60,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-JAVA_BACKEND_URL = "http://localhost:9000"
+# brotli/gzip for JSON and text bodies of at least COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv('COMPRESS_MIN_BYTES', '1024')))
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 USERS_FILE = DATA_DIR / "users.json"
 TRANSACTIONS_FILE = DATA_DIR / "transactions.json"
 
-if not USERS_FILE.exists():
-    USERS_FILE.write_text("[]")
-if not TRANSACTIONS_FILE.exists():
-    TRANSACTIONS_FILE.write_text("[]")
-
 # Models
 class UserRegister(BaseModel):
     username: str
@@ -73,48 +101,91 @@ class ChatMessage(BaseModel):
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
-def load_users() -> List[dict]:
-    return json.loads(USERS_FILE.read_text())
-
-def save_users(users: List[dict]):
-    USERS_FILE.write_text(json.dumps(users, indent=2))
-
-def load_transactions() -> List[dict]:
-    return json.loads(TRANSACTIONS_FILE.read_text())
-
-def save_transactions(transactions: List[dict]):
-    TRANSACTIONS_FILE.write_text(json.dumps(transactions, indent=2))
-
 def generate_id() -> str:
     from uuid import uuid4
     return str(uuid4())
 
+JAVA_DATA_DIR = Path(__file__).parent.parent / "java-backend" / "data"
+
+# Parsed once per change of the Java data files and indexed by username
+java_data = JavaDataStore(JAVA_DATA_DIR)
+
 def load_local_transactions():
-    """Load transactions from Java backend JSON file"""
-    try:
-        # Use Java backend data directory
-        data_path = Path(__file__).parent.parent / "java-backend" / "data" / "transactions.json"
-        if data_path.exists():
-            content = data_path.read_text()
-            transactions = json.loads(content)
-            return transactions
-        return []
-    except Exception as e:
-        print(f"Error reading transactions from Java backend: {e}")
-        return []
+    """Load transactions from Java backend JSON file (cached until it changes)"""
+    return java_data.all_transactions()
 
 def load_users_from_java():
-    """Load users from Java backend JSON file"""
+    """Load users from Java backend JSON file (cached until it changes)"""
+    return java_data.all_users()
+
+# Per-user data versions for the AI response cache. Every write proxied to
+# Java bumps its user's counter (or everyone's, when the body doesn't name
+# the user); the data files' mtimes also catch writes that bypass this API
+data_versions = {}
+global_data_version = 0
+
+def bump_data_version(username: Optional[str] = None):
+    global global_data_version
+    if username:
+        data_versions[username] = data_versions.get(username, 0) + 1
+    else:
+        global_data_version += 1
+
+def data_version(username: str) -> str:
+    mtimes = []
+    for name in ("transactions.json", "users.json"):
+        try:
+            mtimes.append((JAVA_DATA_DIR / name).stat().st_mtime_ns)
+        except OSError:
+            mtimes.append(0)
+    return f"{global_data_version}.{data_versions.get(username, 0)}.{mtimes[0]}.{mtimes[1]}"
+
+async def forward(method: str, path: str, error: str, params: Optional[dict] = None, json: Optional[dict] = None, timeout: float = JAVA_TIMEOUT, status_code: Optional[int] = None):
+    """Forward a request to the Java backend over the shared client
+    
+    Returns the decoded JSON body on 200; otherwise raises HTTPException with the
+    Java "error" message (or `error`), using `status_code` if given.
+    """
     try:
-        data_path = Path(__file__).parent.parent / "java-backend" / "data" / "users.json"
-        if data_path.exists():
-            content = data_path.read_text()
-            users = json.loads(content)
-            return users
-        return []
-    except Exception as e:
-        print(f"Error reading users from Java backend: {e}")
-        return []
+        response = await app.state.java.request(method, path, params=params, json=json, timeout=timeout)
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Java backend unavailable")
+    finally:
+        # After the write, so a concurrent reader can't cache old data under the new version
+        if method != "GET":
+            bump_data_version((json or {}).get("username"))
+    
+    if response.status_code == 200:
+        return response.json()
+    
+    try:
+        detail = response.json().get("error", error)
+    except ValueError:
+        detail = error
+    raise HTTPException(status_code=status_code or response.status_code, detail=detail)
+
+async def open_java_stream(method: str, path: str, error: str, params: Optional[dict] = None, timeout: float = JAVA_TIMEOUT, status_code: Optional[int] = None) -> httpx.Response:
+    """Like forward(), but returns the open 200 response for its body to be streamed
+    
+    The caller must aclose() it.
+    """
+    request = app.state.java.build_request(method, path, params=params, timeout=timeout)
+    try:
+        response = await app.state.java.send(request, stream=True)
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Java backend unavailable")
+    
+    if response.status_code == 200:
+        return response
+    
+    try:
+        await response.aread()
+        detail = response.json().get("error", error)
+    except ValueError:
+        detail = error
+    finally:
+        await response.aclose()
+    raise HTTPException(status_code=status_code or response.status_code, detail=detail)
 
 # Root endpoint
 @app.get("/")
@@ -124,419 +195,163 @@ def read_root():
 # All your existing endpoints...
 @app.post("/api/register")
 async def register(user: UserRegister):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/register",
-                json=user.dict(),
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Registration failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/register", "Registration failed", json=user.dict())
 
 @app.post("/api/login")
 async def login(user: UserLogin):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/login",
-                json=user.dict(),
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Invalid credentials"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/login", "Invalid credentials", json=user.dict())
 
 @app.get("/api/profile/{username}")
 async def get_profile(username: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/profile",
-                params={"username": username},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "User not found"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("GET", "/api/java/profile", "User not found", params={"username": username})
 
 @app.put("/api/profile/name")
 async def update_name(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.put(
-                f"{JAVA_BACKEND_URL}/api/java/profile/name",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Update failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("PUT", "/api/java/profile/name", "Update failed", json=data)
 
 @app.put("/api/profile/password")
 async def update_password(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.put(
-                f"{JAVA_BACKEND_URL}/api/java/profile/password",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Password update failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("PUT", "/api/java/profile/password", "Password update failed", json=data)
 
 @app.put("/api/profile/currency")
 async def update_currency(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.put(
-                f"{JAVA_BACKEND_URL}/api/java/profile/currency",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Currency update failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("PUT", "/api/java/profile/currency", "Currency update failed", json=data)
 
 @app.post("/api/transactions")
 async def add_transaction(transaction: TransactionCreate):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/transactions/add",
-                json=transaction.dict(),
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Transaction failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
-
-@app.get("/api/transactions/{username}")
+    return await forward("POST", "/api/java/transactions/add", "Transaction failed", json=transaction.dict())
+
+@app.get("/api/transactions/{username}", response_class=FastJSONResponse)
 async def get_transactions(username: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/transactions/get",
-                params={"username": username},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to fetch transactions"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return FastJSONResponse(await forward("GET", "/api/java/transactions/get", "Failed to fetch transactions", params={"username": username}))
 
 @app.get("/api/report/{username}")
 async def get_monthly_report(username: str, month: Optional[str] = None):
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {"username": username}
-            if month:
-                params["month"] = month
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/report",
-                params=params,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Report generation failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    params = {"username": username}
+    if month:
+        params["month"] = month
+    return await forward("GET", "/api/java/report", "Report generation failed", params=params, timeout=JAVA_REPORT_TIMEOUT)
 
 @app.get("/api/currency/rates")
 async def get_currency_rates():
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/currency/rates",
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch rates")
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("GET", "/api/java/currency/rates", "Failed to fetch rates")
 
 @app.get("/api/export/{username}")
-async def export_excel(username: str, month: Optional[str] = None):
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {"username": username}
-            if month:
-                params["month"] = month
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/transactions/get",
-                params=params,
-                timeout=10.0
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            user_transactions = response.json()
-            
-            if month:
-                user_transactions = [t for t in user_transactions if t["date"].startswith(month)]
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transactions"
-    
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    
-    headers = ["Date", "Type", "Category", "Amount", "Description"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center")
-    
-    for row, t in enumerate(user_transactions, 2):
-        ws.cell(row=row, column=1, value=t["date"])
-        ws.cell(row=row, column=2, value=t["type"].capitalize())
-        ws.cell(row=row, column=3, value=t["category"])
-        ws.cell(row=row, column=4, value=t["amount"])
-        ws.cell(row=row, column=5, value=t["description"])
+async def export_excel(username: str, month: Optional[str] = None, format: str = "xlsx"):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        writer = export_writer(format)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 12
-    ws.column_dimensions['E'].width = 30
+    params = {"username": username}
+    if month:
+        params["month"] = month
+    # Stream the Java response too: rows are decoded as its body arrives
+    # instead of the whole list being parsed up front
+    upstream = await open_java_stream("GET", "/api/java/transactions/get", "User not found",
+                                      params=params, timeout=JAVA_EXPORT_TIMEOUT, status_code=404)
+    loop = asyncio.get_running_loop()
     
-    excel_file = io.BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
+    def produce(sink):
+        try:
+            rows = (
+                (t["date"], t["type"].capitalize(), t["category"], t["amount"], t["description"])
+                for t in iter_json_array(iter_async(upstream.aiter_bytes(), loop))
+                if not month or t["date"].startswith(month)
+            )
+            options = {"column_widths": [12, 10, 15, 12, 30]} if format == "xlsx" else {}
+            writer(sink, ["Date", "Type", "Category", "Amount", "Description"], rows, **options)
+        finally:
+            asyncio.run_coroutine_threadsafe(upstream.aclose(), loop).result()
     
-    filename = f"expense_report_{username}_{month or 'all'}.xlsx"
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"expense_report_{username}_{month or 'all'}.{extension}"
     
     return StreamingResponse(
-        excel_file,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        stream_export(produce),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.delete("/api/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.delete(
-                f"{JAVA_BACKEND_URL}/api/java/transactions/delete",
-                params={"id": transaction_id},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Delete failed"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("DELETE", "/api/java/transactions/delete", "Delete failed", params={"id": transaction_id})
 
 @app.post("/api/savings/add")
 async def add_to_savings(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/savings/add",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to add to savings"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/savings/add", "Failed to add to savings", json=data)
 
 @app.post("/api/savings/withdraw")
 async def withdraw_from_savings(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/savings/withdraw",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to withdraw from savings"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/savings/withdraw", "Failed to withdraw from savings", json=data)
 
 
 # --- Budget Management Endpoints ---
 
 @app.post("/api/budgets/set")
 async def set_budget(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/budgets/set",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to set budget"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/budgets/set", "Failed to set budget", json=data)
 
 @app.get("/api/budgets/{username}")
 async def get_budgets(username: str, month: Optional[str] = None):
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {"username": username}
-            if month:
-                params["month"] = month
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/budgets/get",
-                params=params,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch budgets")
-        except httpx.RequestError:
-            raise HTTPException(status_cxode=503, detail="Java backend unavailable")
+    params = {"username": username}
+    if month:
+        params["month"] = month
+    return await forward("GET", "/api/java/budgets/get", "Failed to fetch budgets", params=params)
 
 @app.get("/api/budgets/status/{username}")
 async def get_budget_status(username: str, month: Optional[str] = None):
-    async with httpx.AsyncClient() as client:
-        try:
-            params = {"username": username}
-            if month:
-                params["month"] = month
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/budgets/status",
-                params=params,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch budget status")
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    params = {"username": username}
+    if month:
+        params["month"] = month
+    return await forward("GET", "/api/java/budgets/status", "Failed to fetch budget status", params=params, timeout=JAVA_REPORT_TIMEOUT)
 
 @app.delete("/api/budgets/{budget_id}")
 async def delete_budget(budget_id: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.delete(
-                f"{JAVA_BACKEND_URL}/api/java/budgets/delete",
-                params={"id": budget_id},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to delete budget")
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("DELETE", "/api/java/budgets/delete", "Failed to delete budget", params={"id": budget_id})
 
 
 # --- Financial Goals Endpoints ---
 
 @app.post("/api/goals/create")
 async def create_goal(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/goals/create",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to create goal"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/goals/create", "Failed to create goal", json=data)
 
 @app.get("/api/goals/{username}")
 async def get_goals(username: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{JAVA_BACKEND_URL}/api/java/goals/get",
-                params={"username": username},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch goals")
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("GET", "/api/java/goals/get", "Failed to fetch goals", params={"username": username})
 
 @app.post("/api/goals/contribute")
 async def contribute_to_goal(data: dict):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{JAVA_BACKEND_URL}/api/java/goals/contribute",
-                json=data,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.json().get("error", "Failed to contribute to goal"))
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("POST", "/api/java/goals/contribute", "Failed to contribute to goal", json=data)
 
 @app.delete("/api/goals/{goal_id}")
 async def delete_goal(goal_id: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.delete(
-                f"{JAVA_BACKEND_URL}/api/java/goals/delete",
-                params={"id": goal_id},
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to delete goal")
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Java backend unavailable")
+    return await forward("DELETE", "/api/java/goals/delete", "Failed to delete goal", params={"id": goal_id})
 
 
 # --- AI Analysis Endpoint (Direct Gemini Integration) ---
 
+# Estimated tokens of transaction context per analysis prompt: aggregates plus
+# as many of the most relevant transactions as fit
+ANALYZE_TOKEN_BUDGET = int(os.getenv("ANALYZE_TOKEN_BUDGET", "4000"))
+prompt_metrics = PromptSizeMetrics()
+
+AI_MODEL = "gemini-2.5-flash"
+
+# Every Gemini call goes through one shared, concurrency-limited async client
+llm = LLMGateway.from_env(os.getenv("GOOGLE_API_KEY"), AI_MODEL)
+
+# Answers are reused while the question, user, data version and model match;
+# set AI_CACHE_DB to a file path to keep them across restarts
+ai_cache = ResponseCache(
+    max_entries=int(os.getenv("AI_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("AI_CACHE_TTL", "3600")),
+    sqlite_path=os.getenv("AI_CACHE_DB") or None
+)
+
 @app.post("/api/analyze")
 async def analyze_expenses_endpoint(request: AnalysisRequest):
     """
@@ -548,10 +363,14 @@ async def analyze_expenses_endpoint(request: AnalysisRequest):
     if not api_key:
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
     
+    cache_key = ai_cache.key("analyze", AI_MODEL, request.username, data_version(request.username), request.query)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         # Load user's transactions
-        all_transactions = load_local_transactions()
-        user_transactions = [t for t in all_transactions if t.get("username") == request.username]
+        user_transactions = java_data.user_transactions(request.username)
         
         if not user_transactions:
             return {
@@ -559,12 +378,18 @@ async def analyze_expenses_endpoint(request: AnalysisRequest):
                 "transaction_count": 0
             }
         
-        # Create context for Gemini
-        transactions_summary = json.dumps(user_transactions, indent=2)
+        # Create context for Gemini - bounded by the token budget however long the history is
+        # The search index and the aggregates are rebuilt only when the data file changes
+        index = java_data.transactions.derived(
+            ("tfidf", request.username), user_transactions, lambda: TransactionIndex(user_transactions)
+        )
+        transactions_summary, context_stats = build_context(
+            user_transactions, request.query, ANALYZE_TOKEN_BUDGET, index=index
+        )
         
         system_instruction = f"""You are a helpful financial assistant analyzing expense data.
 
-User's Transaction History ({len(user_transactions)} transactions):
+User's Transaction History ({len(user_transactions)} transactions - totals cover all of them, the listed rows are the {context_stats['transactions_included']} most relevant to the question):
 {transactions_summary}
 
 User's Question: {request.query}
@@ -577,89 +402,95 @@ Provide a helpful analysis based on their data. Include:
 - Actionable recommendations
 
 Be concise, helpful, and data-driven."""
+        prompt_metrics.observe(estimate_tokens(system_instruction))
 
         # Call Gemini API
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=system_instruction,
-        )
+        analysis = await llm.generate(system_instruction)
         
-        return {
-            "analysis": response.text,
+        result = {
+            "analysis": analysis,
             "transaction_count": len(user_transactions),
+            "transactions_in_prompt": context_stats['transactions_included'],
             "username": request.username
         }
+        ai_cache.set(cache_key, result)
+        return result
         
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print(f"Error in analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
-@app.post("/api/chat")
-async def chat_endpoint(request: ChatMessage):
-    """
-    Chat endpoint for CopilotKit integration
-    Analyzes user's financial data and responds to questions
-    """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """Hit rate of the AI response cache"""
+    return {"ai_responses": ai_cache.stats(), "java_data": java_data.stats()}
+
+
+@app.get("/api/metrics/llm")
+def get_llm_metrics():
+    """Gemini gateway load, counters and latency histograms"""
+    return llm.stats()
+
+
+@app.get("/api/metrics/prompts")
+def get_prompt_metrics():
+    """Estimated prompt-size distribution of recent /api/analyze calls"""
+    return {"analyze": prompt_metrics.snapshot(), "token_budget": ANALYZE_TOKEN_BUDGET}
+
+
+CHAT_PROFILE_NOT_FOUND = "User profile not found. Please make sure you're logged in."
+
+def build_chat_prompt(username: str, message: str):
+    """(context, prompt) for a chat message - (None, None) if the user has no profile"""
+    # Load user's transactions and profile from Java backend
+    user_transactions = java_data.user_transactions(username)
+    user_profile = java_data.user(username)
     
-    try:
-        # Load user's transactions from Java backend
-        all_transactions = load_local_transactions()
-        user_transactions = [t for t in all_transactions if t.get("username") == request.username]
-        
-        # Load user profile from Java backend
-        users = load_users_from_java()
-        user_profile = next((u for u in users if u.get("username") == request.username), None)
-        
-        if not user_profile:
-            return {
-                "response": f"User profile not found. Please make sure you're logged in.",
-                "context": {}
-            }
-        
-        # Calculate financial summary
-        total_income = sum(t.get("amount", 0) for t in user_transactions if t.get("type") == "income")
-        total_expense = sum(t.get("amount", 0) for t in user_transactions if t.get("type") == "expense")
-        balance = total_income - total_expense
-        savings = user_profile.get("savingsVault", 0)
-        currency = user_profile.get("currency", "PKR")
-        
-        # Category breakdown for expenses
-        category_spending = {}
-        for t in user_transactions:
-            if t.get("type") == "expense":
-                category = t.get("category", "Other")
-                category_spending[category] = category_spending.get(category, 0) + t.get("amount", 0)
-        
-        # Find top spending category
-        top_category = max(category_spending.items(), key=lambda x: x[1]) if category_spending else ("None", 0)
-        
-        # Recent transactions (last 5)
-        recent = sorted(user_transactions, key=lambda x: x.get("created_at", ""), reverse=True)[:5]
-        
-        # Prepare context
-        context = {
-            "total_transactions": len(user_transactions),
-            "total_income": total_income,
-            "total_expense": total_expense,
-            "balance": balance,
-            "savings_vault": savings,
-            "currency": currency,
-            "category_breakdown": category_spending,
-            "top_spending_category": top_category[0],
-            "top_spending_amount": top_category[1],
-            "recent_transactions": recent
-        }
-        
-        # Build comprehensive financial summary for AI
-        category_list = "\n".join([f"  • {cat}: {currency} {amt:,.2f}" for cat, amt in category_spending.items()])
-        recent_list = "\n".join([f"  • {t.get('date', 'N/A')}: {t.get('category', 'N/A')} - {currency} {t.get('amount', 0):,.2f} ({t.get('type', 'expense')})" for t in recent[:5]])
-        
-        system_instruction = f"""You are a friendly and professional financial assistant for an expense tracking app.
+    if not user_profile:
+        return None, None
+    
+    # Calculate financial summary
+    total_income = sum(t.get("amount", 0) for t in user_transactions if t.get("type") == "income")
+    total_expense = sum(t.get("amount", 0) for t in user_transactions if t.get("type") == "expense")
+    balance = total_income - total_expense
+    savings = user_profile.get("savingsVault", 0)
+    currency = user_profile.get("currency", "PKR")
+    
+    # Category breakdown for expenses
+    category_spending = {}
+    for t in user_transactions:
+        if t.get("type") == "expense":
+            category = t.get("category", "Other")
+            category_spending[category] = category_spending.get(category, 0) + t.get("amount", 0)
+    
+    # Find top spending category
+    top_category = max(category_spending.items(), key=lambda x: x[1]) if category_spending else ("None", 0)
+    
+    # Recent transactions (last 5)
+    recent = sorted(user_transactions, key=lambda x: x.get("created_at", ""), reverse=True)[:5]
+    
+    # Prepare context
+    context = {
+        "total_transactions": len(user_transactions),
+        "total_income": total_income,
+        "total_expense": total_expense,
+        "balance": balance,
+        "savings_vault": savings,
+        "currency": currency,
+        "category_breakdown": category_spending,
+        "top_spending_category": top_category[0],
+        "top_spending_amount": top_category[1],
+        "recent_transactions": recent
+    }
+    
+    # Build comprehensive financial summary for AI
+    category_list = "\n".join([f"  • {cat}: {currency} {amt:,.2f}" for cat, amt in category_spending.items()])
+    recent_list = "\n".join([f"  • {t.get('date', 'N/A')}: {t.get('category', 'N/A')} - {currency} {t.get('amount', 0):,.2f} ({t.get('type', 'expense')})" for t in recent[:5]])
+    
+    system_instruction = f"""You are a friendly and professional financial assistant for an expense tracking app.
 
 **User's Complete Financial Summary:**
 
@@ -683,7 +514,7 @@ async def chat_endpoint(request: ChatMessage):
 - Savings Rate: {((savings / total_income * 100) if total_income > 0 else 0):.1f}%
 - Expense Ratio: {((total_expense / total_income * 100) if total_income > 0 else 0):.1f}%
 
-**User's Question:** {request.message}
+**User's Question:** {message}
 
 **Guidelines for your response:**
 1. Be warm, conversational, and encouraging
@@ -700,24 +531,88 @@ async def chat_endpoint(request: ChatMessage):
 **Important:** You have complete access to their financial data. Analyze it yourself and provide insights without asking them for more information.
 
 Respond naturally and helpfully to their message."""
+    
+    return context, system_instruction
+
 
+@app.post("/api/chat")
+async def chat_endpoint(request: ChatMessage):
+    """
+    Chat endpoint for CopilotKit integration
+    Analyzes user's financial data and responds to questions
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
+    
+    cache_key = ai_cache.key("chat", AI_MODEL, request.username, data_version(request.username), request.message)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        context, system_instruction = build_chat_prompt(request.username, request.message)
+        
+        if context is None:
+            return {
+                "response": CHAT_PROFILE_NOT_FOUND,
+                "context": {}
+            }
+        
         # Call Gemini API
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=system_instruction,
-        )
+        answer = await llm.generate(system_instruction)
         
-        return {
-            "response": response.text,
+        result = {
+            "response": answer,
             "context": context
         }
+        ai_cache.set(cache_key, result)
+        return result
         
+    except LLMUnavailable:
+        raise
     except Exception as e:
         print(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatMessage):
+    """
+    Chat endpoint streamed as server-sent events
+    Sends the financial context first, then the answer as `token` events,
+    then `done` (or `error`). Disconnecting cancels the Gemini stream.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
+    
+    cache_key = ai_cache.key("chat", AI_MODEL, request.username, data_version(request.username), request.message)
+    cached = ai_cache.get(cache_key)
+    
+    if cached is not None:
+        context, system_instruction = cached["context"], None
+    else:
+        context, system_instruction = build_chat_prompt(request.username, request.message)
+    
+    if context is None:
+        body = stream_answer({}, None, cached_text=CHAT_PROFILE_NOT_FOUND)
+    else:
+        def remember(text: str):
+            ai_cache.set(cache_key, {"response": text, "context": context})
+        
+        if cached is None:
+            llm.raise_if_saturated()
+        body = stream_answer(
+            context,
+            llm.stream(system_instruction),
+            on_complete=remember,
+            cached_text=cached["response"] if cached is not None else None
+        )
+    
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 # --- CopilotKit Integration (Optional) ---
 # try:
 #     from copilotkit.integrations.api import add_fastapi_endpoint
@@ -1,32 +1,66 @@
 """
 Expense Tracker Backend with Firestore - UUID-Based Schema
 Uses userId (UUID) as primary identifier for better database design
+Storage goes through repository.py: Firestore by default, or SQLite /
+in-memory with STORAGE_ENGINE=sqlite|memory
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import List, Optional
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+import asyncio
 import hashlib
+import threading
+import time
+import weakref
+import base64
+import csv
 import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+import json
+import re
 from dotenv import load_dotenv
-from google import genai
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
 from uuid import uuid4
+from exports import EXPORT_FORMATS, export_writer, stream_export
+from ai_cache import ResponseCache
+from repository import ALL_TIME, create_repository, rollup_balance
+from sse import SSE_HEADERS, stream_answer
+from llm_gateway import LLMGateway
+from responses import CompressionMiddleware, FastJSONResponse
+from request_metrics import (
+    PROMETHEUS_CONTENT_TYPE, RequestMetrics, RequestMetricsMiddleware, TimedJSONResponse, TimedRoute, storage_timer
+)
 
 load_dotenv()
 
-# Initialize Firebase
-cred = credentials.Certificate('serviceAccountKey.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Storage engine (firestore, sqlite or memory) - see repository.py
+repo = create_repository()
+
+# Repository calls are synchronous, so handlers never make them on the event
+# loop directly: blocking work runs on this bounded pool via run_db()
+DB_MAX_WORKERS = int(os.getenv('DB_MAX_WORKERS', '16'))
+db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix='storage')
 
-app = FastAPI(title="Expense Tracker API with Firestore (UUID)", version="3.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    db_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(
+    title="Expense Tracker API with Firestore (UUID)",
+    version="3.0.0",
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
+)
+# Routes note when their endpoint returns so serialization can be timed (see request_metrics.py)
+app.router.route_class = TimedRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,10 +70,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Gemini AI
+# brotli/gzip for JSON and text bodies of at least COMPRESS_MIN_BYTES. Added
+# before the @app.middleware("http") below so it sits inside it and sees
+# whole bodies (BaseHTTPMiddleware re-sends every body as a stream)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv('COMPRESS_MIN_BYTES', '1024')))
+
+# Initialize Gemini AI - every call goes through one shared, concurrency-limited
+# async client (LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_TIMEOUT, ...)
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+AI_MODEL = 'gemini-2.5-flash'
+llm = LLMGateway.from_env(GOOGLE_API_KEY, AI_MODEL)
+
+# Answers are reused while the question, user, data version and model match;
+# set AI_CACHE_DB to a file path to keep them across restarts
+ai_cache = ResponseCache(
+    max_entries=int(os.getenv('AI_CACHE_SIZE', '500')),
+    ttl=float(os.getenv('AI_CACHE_TTL', '3600')),
+    sqlite_path=os.getenv('AI_CACHE_DB') or None
+)
 
 # Models
 class UserRegister(BaseModel):
@@ -108,19 +156,278 @@ def hash_password(password: str) -> str:
 def generate_id() -> str:
     return str(uuid4())
 
+# ========== IDENTITY CACHE ==========
+# username -> userId and userId -> user doc are read by nearly every handler.
+# Both go through a bounded LRU cache with TTL, and each request additionally
+# memoizes its own lookups so a user is never resolved twice per request.
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def peek(self, key):
+        """The live entry for `key`, without touching LRU order or hit stats"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[1] if entry is not None and entry[0] >= time.monotonic() else None
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0
+            }
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+
+username_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Per-request memo, installed fresh for every request by the middleware below
+request_memo: ContextVar[Optional[dict]] = ContextVar('request_memo', default=None)
+
+@app.middleware("http")
+async def memoize_lookups_per_request(request: Request, call_next):
+    token = request_memo.set({})
+    try:
+        return await call_next(request)
+    finally:
+        request_memo.reset(token)
+
+# Per-request Firestore documents and db/serialize/app time, as a Server-Timing
+# header, a log line for requests over SLOW_REQUEST_MS, and GET /metrics
+request_metrics = RequestMetrics()
+app.add_middleware(
+    RequestMetricsMiddleware,
+    metrics=request_metrics,
+    slow_request_ms=float(os.getenv('SLOW_REQUEST_MS', '1000'))
+)
+
+def cached_lookup(cache: TTLCache, kind: str, key: str, load):
+    """Resolve `key` via request memo, then the shared cache, then `load`"""
+    memo = request_memo.get()
+    if memo is not None and (kind, key) in memo:
+        return memo[(kind, key)]
+    
+    value = cache.get(key)
+    if value is None:
+        value = load(key)
+        # Misses aren't cached so a fresh registration is visible immediately
+        if value is not None:
+            cache.set(key, value)
+    
+    if memo is not None:
+        memo[(kind, key)] = value
+    return value
+
+def invalidate_user(user_id: str):
+    """Drop a user's cached profile after any write to their user doc"""
+    user_cache.invalidate(user_id)
+    memo = request_memo.get()
+    if memo is not None:
+        memo.pop(('user', user_id), None)
+
 def get_user_id_from_username(username: str) -> Optional[str]:
     """Get userId from username"""
-    username_ref = db.collection('usernames').document(username).get()
-    if username_ref.exists:
-        return username_ref.to_dict().get('userId')
-    return None
+    return cached_lookup(username_cache, 'username', username, repo.get_user_id)
 
 def get_user_by_id(user_id: str) -> Optional[dict]:
     """Get user document by userId"""
-    user_ref = db.collection('users').document(user_id).get()
-    if user_ref.exists:
-        return user_ref.to_dict()
-    return None
+    user_data = cached_lookup(user_cache, 'user', user_id, repo.get_user)
+    # Hand out a copy so callers can't mutate the cached entry
+    return dict(user_data) if user_data is not None else None
+
+# ========== DATA ACCESS ==========
+# Requests beyond DB_MAX_WORKERS wait on the semaphore (where they can still be
+# cancelled) rather than piling up in the executor's unbounded queue.
+
+db_slots = asyncio.Semaphore(DB_MAX_WORKERS)
+
+async def run_db(fn, *args, **kwargs):
+    """Run blocking repository work on the db pool and await its result"""
+    # copy_context() keeps the per-request memo visible inside the worker thread
+    ctx = copy_context()
+    async with db_slots:
+        with storage_timer():
+            return await asyncio.get_running_loop().run_in_executor(
+                db_executor, partial(ctx.run, fn, *args, **kwargs)
+            )
+
+def get_rollup(user_id: str, period: str = ALL_TIME) -> dict:
+    """A single rollup (see Repository.get_rollups)"""
+    return repo.get_rollups(user_id, period)[period]
+
+# ========== CONDITIONAL GETS ==========
+# Every write to a user's data bumps their data version (see repository.py),
+# so a GET's ETag is that version plus the request it answers. A client that
+# sends it back in If-None-Match gets a 304 after one version read, before
+# any data is touched. The tag also covers the API version (response shapes)
+# and today's date (goal days remaining, budget status' default month), and
+# is weak since compression changes the bytes, not the content.
+
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+def data_etag(request: Request, version: int) -> str:
+    scope = f"{app.version}|{datetime.now():%Y-%m-%d}|{request.url.path}?{request.url.query}"
+    return f'W/"{version}-{hashlib.sha1(scope.encode()).hexdigest()[:16]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match list (or *)"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+async def conditional_get(request: Request, user_id: str) -> dict:
+    """ETag headers for this GET's response, or a 304 if the client's copy is current
+    
+    Call it before reading any data: a write landing in between can then only
+    leave the tag older than the body (refetched next time), never newer.
+    """
+    version = await run_db(repo.data_version, user_id)
+    # A cached user doc from before the latest write (made by another worker)
+    # mustn't go out under the new tag
+    cached = user_cache.peek(user_id)
+    if cached is not None and cached.get('dataVersion', version) < version:
+        invalidate_user(user_id)
+    
+    headers = {"ETag": data_etag(request, version), "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        raise HTTPException(status_code=304, headers=headers)
+    return headers
+
+# ========== QUERY HELPERS ==========
+# Dates are stored as "YYYY-MM-DD" strings, so a month or date prefix can be
+# turned into a lexicographic range on the `date` field. The upper bound gets
+# '\uf8ff' appended so every date starting with `date_to` is included.
+
+# Months (and the first 7 characters of transaction dates) end up in rollup
+# and budget document ids, so they're checked at the API boundary: anything
+# else (a '/', say) would make an invalid document path
+MONTH_FORMAT = re.compile(r'\d{4}-\d{2}')
+DATE_FORMAT = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def check_month(month: Optional[str]) -> Optional[str]:
+    """400 unless `month` is None or YYYY-MM"""
+    if month is not None and not MONTH_FORMAT.fullmatch(month):
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+    return month
+
+def is_date(value: str) -> bool:
+    """A real YYYY-MM-DD date (strptime alone also accepts 2025-1-5)"""
+    if not DATE_FORMAT.fullmatch(value):
+        return False
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+def date_range(month: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None) -> tuple:
+    """Resolve month/from/to filters into (start, end) bounds for a date query"""
+    if month:
+        return month, month + '\uf8ff'
+    return date_from, (date_to + '\uf8ff') if date_to else None
+
+# Keyset pagination: the cursor is the (date, transactionId) of the last row
+# on a page, encoded so clients treat it as opaque.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(txn: dict) -> str:
+    raw = json.dumps([txn['date'], txn['transactionId']]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        date, txn_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {'date': date, 'transactionId': txn_id}
+
+def fetch_transactions_page(user_id: str, start: Optional[str], end: Optional[str], limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple:
+    """Read one page of transactions, newest first; returns (rows, next_cursor)"""
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    after = decode_cursor(cursor) if cursor else None
+    
+    # Fetch one extra row to know whether another page exists
+    rows = repo.list_transactions(user_id, start, end, limit=limit + 1, after=after)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+# ========== RESPONSE HELPERS ==========
+
+def profile_payload(user_id: str, user_data: dict) -> dict:
+    return {
+        "userId": user_id,
+        "username": user_data['username'],
+        "email": user_data['email'],
+        "fullName": user_data['fullName'],
+        "currency": user_data.get('currency', 'PKR'),
+        "savingsVault": user_data.get('savingsVault', 0)
+    }
+
+def report_payload(label: str, period: dict, all_time: dict, user_data: dict) -> dict:
+    """Shape a period rollup plus the all-time rollup into the report response"""
+    # Categories whose transactions were all deleted keep a zero entry
+    category_breakdown = {
+        category: total
+        for category, total in period.get('category_totals', {}).items()
+        if period.get('category_counts', {}).get(category, 0) > 0
+    }
+    
+    return {
+        "month": label,
+        "total_income": period.get('total_income', 0),
+        "total_expense": period.get('total_expense', 0),
+        "balance": rollup_balance(all_time),  # Overall balance
+        "monthly_balance": rollup_balance(period),  # Period balance
+        "category_breakdown": category_breakdown,
+        "transaction_count": period.get('transaction_count', 0),
+        "savingsVault": user_data.get('savingsVault', 0)
+    }
+
+def available_months(all_time: dict) -> List[str]:
+    """Months with at least one transaction, newest first"""
+    return sorted((month for month, count in all_time.get('months', {}).items() if count > 0), reverse=True)
 
 # ========== USER ENDPOINTS ==========
 
@@ -128,35 +435,28 @@ def get_user_by_id(user_id: str) -> Optional[dict]:
 async def register(user: UserRegister):
     """Register a new user with UUID"""
     
-    # Check if username already exists
-    existing_username = db.collection('usernames').document(user.username).get()
-    if existing_username.exists:
+    # Check username and email availability concurrently
+    username_taken, email_taken = await asyncio.gather(
+        run_db(repo.username_taken, user.username),
+        run_db(repo.email_taken, user.email)
+    )
+    if username_taken:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    # Check if email already registered
-    users = db.collection('users').where('email', '==', user.email).limit(1).stream()
-    if len(list(users)) > 0:
+    if email_taken:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Generate UUID for user
     user_id = generate_id()
     
-    # Create user document with UUID
-    db.collection('users').document(user_id).set({
+    # The engine stores the user, its username mapping and empty rollups together
+    await run_db(repo.create_user, {
         'userId': user_id,
         'username': user.username,
         'email': user.email,
         'password': hash_password(user.password),
         'fullName': user.fullName,
-        'currency': user.currency,
-        'savingsVault': 0,
-        'createdAt': firestore.SERVER_TIMESTAMP
-    })
-    
-    # Store username -> userId mapping
-    db.collection('usernames').document(user.username).set({
-        'userId': user_id,
-        'username': user.username
+        'currency': user.currency
     })
     
     return {"message": "User registered successfully", "username": user.username, "userId": user_id}
@@ -164,12 +464,12 @@ async def register(user: UserRegister):
 @app.post("/api/login")
 async def login(credentials: UserLogin):
     """User login - returns userId"""
-    user_id = get_user_id_from_username(credentials.username)
+    user_id = await run_db(get_user_id_from_username, credentials.username)
     
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user_data = get_user_by_id(user_id)
+    user_data = await run_db(get_user_by_id, user_id)
     
     if not user_data or user_data['password'] != hash_password(credentials.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -184,60 +484,58 @@ async def login(credentials: UserLogin):
     }
 
 @app.get("/api/profile/{username}")
-async def get_profile(username: str):
+async def get_profile(username: str, request: Request, response: Response):
     """Get user profile"""
-    user_id = get_user_id_from_username(username)
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user_data = get_user_by_id(user_id)
+    response.headers.update(await conditional_get(request, user_id))
     
-    return {
-        "userId": user_id,
-        "username": user_data['username'],
-        "email": user_data['email'],
-        "fullName": user_data['fullName'],
-        "currency": user_data.get('currency', 'PKR'),
-        "savingsVault": user_data.get('savingsVault', 0)
-    }
+    user_data = await run_db(get_user_by_id, user_id)
+    
+    return profile_payload(user_id, user_data)
 
 @app.put("/api/profile/name")
 async def update_name(data: UpdateName):
     """Update user full name"""
-    user_id = get_user_id_from_username(data.username)
+    user_id = await run_db(get_user_id_from_username, data.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.collection('users').document(user_id).update({'fullName': data.fullName})
+    await run_db(repo.update_user, user_id, {'fullName': data.fullName})
+    invalidate_user(user_id)
     return {"message": "Name updated successfully"}
 
 @app.put("/api/profile/password")
 async def update_password(data: UpdatePassword):
     """Update user password"""
-    user_id = get_user_id_from_username(data.username)
+    user_id = await run_db(get_user_id_from_username, data.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user_data = get_user_by_id(user_id)
+    user_data = await run_db(get_user_by_id, user_id)
     
     if user_data['password'] != hash_password(data.oldPassword):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
     
-    db.collection('users').document(user_id).update({'password': hash_password(data.newPassword)})
+    await run_db(repo.update_user, user_id, {'password': hash_password(data.newPassword)})
+    invalidate_user(user_id)
     return {"message": "Password updated successfully"}
 
 @app.put("/api/profile/currency")
 async def update_currency(data: UpdateCurrency):
     """Update user currency preference"""
-    user_id = get_user_id_from_username(data.username)
+    user_id = await run_db(get_user_id_from_username, data.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.collection('users').document(user_id).update({'currency': data.currency})
+    await run_db(repo.update_user, user_id, {'currency': data.currency})
+    invalidate_user(user_id)
     return {"message": "Currency updated successfully"}
 
 # ========== TRANSACTION ENDPOINTS ==========
@@ -245,13 +543,16 @@ async def update_currency(data: UpdateCurrency):
 @app.post("/api/transactions")
 async def add_transaction(txn: TransactionCreate):
     """Add a new transaction"""
-    user_id = get_user_id_from_username(txn.username)
+    if not is_date(txn.date):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    
+    user_id = await run_db(get_user_id_from_username, txn.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
     txn_id = generate_id()
-    db.collection('transactions').document(txn_id).set({
+    await run_db(repo.add_transactions, [{
         'transactionId': txn_id,
         'userId': user_id,
         'username': txn.username,  # Keep for display
@@ -262,39 +563,182 @@ async def add_transaction(txn: TransactionCreate):
         'date': txn.date,
         'currency': txn.currency,
         'created_at': datetime.now().isoformat()
-    })
+    }])
     return {"message": "Transaction added successfully", "id": txn_id}
 
-@app.get("/api/transactions/{username}")
-async def get_transactions(username: str, month: Optional[str] = None, limit: Optional[int] = None, all: Optional[bool] = False, group_by_month: Optional[bool] = False):
-    """Get transactions for a user - supports monthly filtering and grouping"""
-    user_id = get_user_id_from_username(username)
+# ========== BULK IMPORT ==========
+# Rows are validated one at a time, then written in WriteBatches that stay
+# under Firestore's 500-write limit, a few commits in flight at once. Each
+# batch carries its rows plus one combined increment per rollup doc, so a
+# failed batch leaves no partial totals behind.
+
+BULK_BATCH_SIZE = 500
+BULK_PARALLEL_BATCHES = int(os.getenv('BULK_PARALLEL_BATCHES', '4'))
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', '20000'))
+
+async def read_bulk_rows(request: Request) -> list:
+    """Rows from a JSON array body, a text/csv body or a multipart CSV upload ('file')"""
+    content_type = request.headers.get('content-type', '')
+    
+    try:
+        if content_type.startswith('multipart/form-data'):
+            upload = (await request.form()).get('file')
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Upload the CSV as a 'file' field")
+            text = (await upload.read()).decode('utf-8-sig')
+        elif content_type.startswith('text/csv'):
+            text = (await request.body()).decode('utf-8-sig')
+        else:
+            rows = json.loads(await request.body())
+            if not isinstance(rows, list):
+                raise HTTPException(status_code=400, detail="Expected a JSON array of transactions")
+            return rows
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or a UTF-8 CSV file")
+    
+    # CSV headers match the export (Date, Type, ...) case-insensitively;
+    # empty cells fall back to the model defaults
+    return [
+        {key.strip().lower(): value.strip() for key, value in row.items() if key and isinstance(value, str) and value.strip()}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+def validate_bulk_row(row, username: str) -> TransactionCreate:
+    if not isinstance(row, dict):
+        raise ValueError("Expected an object")
+    
+    txn = TransactionCreate(**{'username': username, **row})
+    if txn.username != username:
+        raise ValueError(f"Row belongs to '{txn.username}', not '{username}'")
+    if txn.type not in ('income', 'expense'):
+        raise ValueError("type must be 'income' or 'expense'")
+    if not is_date(txn.date):
+        raise ValueError("date must be YYYY-MM-DD")
+    
+    return txn
+
+def row_error(index: int, exc: Exception) -> dict:
+    if isinstance(exc, ValidationError):
+        message = "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors())
+    else:
+        message = str(exc)
+    return {"row": index, "error": message}
+
+def bulk_batches(rows: List[tuple]):
+    """Split (row number, transaction) pairs into batches within the write limit"""
+    chunk, months = [], set()
+    for row in rows:
+        chunk_months = months | {row[1]['date'][:7]}
+        # One write per row, per month rollup, the all-time rollup and the balance
+        if chunk and len(chunk) + 1 + len(chunk_months) + 2 > BULK_BATCH_SIZE:
+            yield chunk
+            chunk, chunk_months = [], {row[1]['date'][:7]}
+        chunk.append(row)
+        months = chunk_months
+    if chunk:
+        yield chunk
+
+@app.post("/api/transactions/bulk")
+async def add_transactions_bulk(request: Request, username: Optional[str] = None):
+    """Import many transactions for one user from a JSON array or a CSV file
+    
+    Invalid rows (and rows in a batch that failed to commit) are reported
+    in `errors` by 1-based row number; everything else is imported.
+    """
+    rows = await read_bulk_rows(request)
+    
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_ROWS} rows per import")
+    
+    username = username or next((row['username'] for row in rows if isinstance(row, dict) and row.get('username')), None)
+    if not username:
+        raise HTTPException(status_code=400, detail="username is required")
+    
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get all transactions
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    result = []
-    for txn in transactions:
-        data = txn.to_dict()
-        
-        # Filter by month only if specified and all=False
-        if not all and month:
-            if data['date'].startswith(month):
-                data['id'] = data.get('transactionId', txn.id)
-                result.append(data)
+    errors, valid = [], []
+    created_at = datetime.now().isoformat()
+    for index, row in enumerate(rows, start=1):
+        try:
+            txn = validate_bulk_row(row, username)
+        except ValueError as exc:
+            errors.append(row_error(index, exc))
+            continue
+        valid.append((index, {
+            'transactionId': generate_id(),
+            'userId': user_id,
+            'username': username,
+            'type': txn.type,
+            'category': txn.category,
+            'amount': txn.amount,
+            'description': txn.description,
+            'date': txn.date,
+            'currency': txn.currency,
+            'created_at': created_at
+        }))
+    
+    slots = asyncio.Semaphore(BULK_PARALLEL_BATCHES)
+    
+    async def commit(chunk):
+        async with slots:
+            await run_db(repo.add_transactions, [txn for _, txn in chunk])
+    
+    chunks = list(bulk_batches(valid))
+    results = await asyncio.gather(*(commit(chunk) for chunk in chunks), return_exceptions=True)
+    
+    imported = 0
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            errors.extend({"row": index, "error": f"Write failed: {result}"} for index, _ in chunk)
         else:
-            # Return all transactions
-            data['id'] = data.get('transactionId', txn.id)
-            result.append(data)
+            imported += len(chunk)
+    errors.sort(key=lambda error: error['row'])
+    
+    return {
+        "message": f"Imported {imported} of {len(rows)} transactions",
+        "imported": imported,
+        "failed": len(errors),
+        "errors": errors
+    }
+
+@app.get("/api/transactions/{username}", response_class=FastJSONResponse)
+async def get_transactions(
+    username: str,
+    request: Request,
+    month: Optional[str] = None,
+    limit: Optional[int] = None,
+    all: Optional[bool] = False,
+    group_by_month: Optional[bool] = False,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    paginate: Optional[bool] = False,
+    cursor: Optional[str] = None
+):
+    """Get transactions for a user - supports monthly/date-range filtering, grouping and paging
+    
+    With paginate=true (or a cursor) the response is one page of `limit` rows
+    plus a `next_cursor` to pass back for the following page.
+    """
+    check_month(month)
+    user_id = await run_db(get_user_id_from_username, username)
+    
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    # Sort by date descending (newest first)
-    result.sort(key=lambda x: x['date'], reverse=True)
+    headers = await conditional_get(request, user_id)
     
-    # Apply limit if specified
-    if limit and limit > 0:
-        result = result[:limit]
+    # Filter by month/range only if specified and all=False
+    start, end = (None, None) if all else date_range(month, date_from, date_to)
+    
+    paginate = paginate or cursor is not None
+    if paginate:
+        result, next_cursor = await run_db(fetch_transactions_page, user_id, start, end, limit, cursor)
+    else:
+        # Transactions come back sorted by date descending (newest first)
+        result = await run_db(repo.list_transactions, user_id, start, end, limit)
     
     # Group by month if requested
     if group_by_month:
@@ -315,116 +759,151 @@ async def get_transactions(username: str, month: Optional[str] = None, limit: Op
                 'total_expense': sum(t['amount'] for t in grouped[month_key] if t['type'] == 'expense')
             })
         
-        return {"grouped_by_month": monthly_data}
-    
-    return result
+        if paginate:
+            return FastJSONResponse({"grouped_by_month": monthly_data, "next_cursor": next_cursor}, headers=headers)
+        return FastJSONResponse({"grouped_by_month": monthly_data}, headers=headers)
+    
+    # Returned as a response so the rows skip jsonable_encoder (see responses.py)
+    if paginate:
+        return FastJSONResponse({"transactions": result, "next_cursor": next_cursor}, headers=headers)
+    return FastJSONResponse(result, headers=headers)
 
 @app.delete("/api/transactions/{txn_id}")
 async def delete_transaction(txn_id: str):
     """Delete a transaction"""
-    db.collection('transactions').document(txn_id).delete()
+    # The engine reverses the transaction's rollup changes in the same write
+    await run_db(repo.delete_transaction, txn_id)
     return {"message": "Transaction deleted successfully"}
 
 @app.get("/api/transactions/{username}/months")
-async def get_available_months(username: str):
+async def get_available_months(username: str, request: Request, response: Response):
     """Get list of months that have transactions"""
-    user_id = get_user_id_from_username(username)
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    months = set()
-    for txn in transactions:
-        data = txn.to_dict()
-        month = data['date'][:7]  # YYYY-MM
-        months.add(month)
+    response.headers.update(await conditional_get(request, user_id))
     
-    # Sort months descending (newest first)
-    sorted_months = sorted(list(months), reverse=True)
+    rollup = await run_db(get_rollup, user_id)
     
-    return {"months": sorted_months}
+    return {"months": available_months(rollup)}
 
 # ========== REPORT ENDPOINTS ==========
 
 @app.get("/api/report/{username}")
-async def get_monthly_report(username: str, month: Optional[str] = None):
-    """Get monthly financial report - if no month provided, returns all-time data"""
-    user_id = get_user_id_from_username(username)
+async def get_monthly_report(
+    username: str,
+    request: Request,
+    response: Response,
+    month: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to")
+):
+    """Get monthly financial report - if no month or range provided, returns all-time data"""
+    check_month(month)
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    txn_list = [txn.to_dict() for txn in transactions]
+    response.headers.update(await conditional_get(request, user_id))
+    
+    # All-time rollup for overall balance, month rollup (or a rollup of the
+    # rows in an arbitrary range) for the period, and the user doc - all read concurrently
+    start, end = date_range(None, date_from, date_to)
+    if not month and (date_from or date_to):
+        period_read = run_db(repo.range_rollup, user_id, start, end)
+    else:
+        period_read = asyncio.sleep(0)
+    rollups, period_result, user_data = await asyncio.gather(
+        run_db(repo.get_rollups, user_id, *([month] if month else [])), period_read, run_db(get_user_by_id, user_id)
+    )
+    all_time = rollups[ALL_TIME]
     
-    # Filter by month if provided
     if month:
-        filtered_txns = [t for t in txn_list if t['date'].startswith(month)]
+        period = rollups[month]
+    elif date_from or date_to:
+        period = period_result
     else:
-        # All time data
-        filtered_txns = txn_list
+        period = all_time
     
-    total_income = sum(t['amount'] for t in filtered_txns if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in filtered_txns if t['type'] == 'expense')
+    label = month or (f"{date_from or 'start'} to {date_to or 'now'}" if date_from or date_to else "all-time")
+    return report_payload(label, period, all_time, user_data)
+
+# ========== DASHBOARD ENDPOINTS ==========
+
+@app.get("/api/dashboard/{username}")
+async def get_dashboard(
+    username: str, request: Request, response: Response, month: Optional[str] = None, limit: Optional[int] = None
+):
+    """Everything the dashboard needs in one round trip
+    
+    Resolves the user once, then reads the first page of transactions, the
+    rollups and the user doc concurrently - no transaction scan at all.
+    """
+    check_month(month)
+    user_id = await run_db(get_user_id_from_username, username)
     
-    category_breakdown = {}
-    for txn in filtered_txns:
-        if txn['type'] == 'expense':
-            category_breakdown[txn['category']] = category_breakdown.get(txn['category'], 0) + txn['amount']
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    user_data = get_user_by_id(user_id)
+    response.headers.update(await conditional_get(request, user_id))
     
-    # Get all transactions for overall balance
-    all_txn_list = txn_list
-    overall_income = sum(t['amount'] for t in all_txn_list if t['type'] == 'income')
-    overall_expense = sum(t['amount'] for t in all_txn_list if t['type'] == 'expense')
+    start, end = date_range(month)
+    (transactions, next_cursor), rollups, user_data = await asyncio.gather(
+        run_db(fetch_transactions_page, user_id, start, end, limit),
+        run_db(repo.get_rollups, user_id, *([month] if month else [])),
+        run_db(get_user_by_id, user_id)
+    )
+    all_time = rollups[ALL_TIME]
     
     return {
-        "month": month or "all-time",
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": overall_income - overall_expense,  # Overall balance
-        "monthly_balance": total_income - total_expense,  # Period balance
-        "category_breakdown": category_breakdown,
-        "transaction_count": len(filtered_txns),
-        "savingsVault": user_data.get('savingsVault', 0)
+        "transactions": transactions,
+        "next_cursor": next_cursor,
+        "report": report_payload(month or "all-time", rollups[month or ALL_TIME], all_time, user_data),
+        "balance": rollup_balance(all_time),
+        "months": available_months(all_time),
+        "profile": profile_payload(user_id, user_data)
     }
 
 # ========== SAVINGS VAULT ENDPOINTS ==========
+# Every vault movement is recorded in a savings ledger in the same write as
+# the balance change (see the engines), so the vault can always be audited.
+
+# Withdrawals from one vault queue up on the event loop instead of racing each
+# other into transaction retries (and without parking DB pool threads); the
+# engine still guards against other workers and concurrent deposits
+withdraw_locks = weakref.WeakValueDictionary()
+
+async def withdraw(user_id: str, amount: float) -> float:
+    lock = withdraw_locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        return await run_db(repo.withdraw_savings, user_id, amount)
 
 @app.post("/api/savings/add")
 async def add_to_savings(data: SavingsOperation):
     """Add money to savings vault"""
-    user_id = get_user_id_from_username(data.username)
+    user_id = await run_db(get_user_id_from_username, data.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user_data = get_user_by_id(user_id)
-    current_savings = user_data.get('savingsVault', 0)
-    new_balance = current_savings + data.amount
-    
-    db.collection('users').document(user_id).update({'savingsVault': new_balance})
+    new_balance = await run_db(repo.deposit_savings, user_id, data.amount)
+    invalidate_user(user_id)
     
     return {"message": "Added to savings", "newBalance": new_balance}
 
 @app.post("/api/savings/withdraw")
 async def withdraw_from_savings(data: SavingsOperation):
     """Withdraw from savings vault"""
-    user_id = get_user_id_from_username(data.username)
+    user_id = await run_db(get_user_id_from_username, data.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user_data = get_user_by_id(user_id)
-    current_savings = user_data.get('savingsVault', 0)
-    
-    if data.amount > current_savings:
-        raise HTTPException(status_code=400, detail="Insufficient savings")
-    
-    new_balance = current_savings - data.amount
-    db.collection('users').document(user_id).update({'savingsVault': new_balance})
+    new_balance = await withdraw(user_id, data.amount)
+    invalidate_user(user_id)
     
     return {"message": "Withdrawn from savings", "newBalance": new_balance}
 
@@ -433,70 +912,92 @@ async def withdraw_from_savings(data: SavingsOperation):
 @app.post("/api/budgets/set")
 async def set_budget(budget: BudgetCreate):
     """Set a budget for a category"""
-    user_id = get_user_id_from_username(budget.username)
+    check_month(budget.month)
+    user_id = await run_db(get_user_id_from_username, budget.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
     budget_id = f"{user_id}_{budget.category}_{budget.month}"
-    db.collection('budgets').document(budget_id).set({
+    await run_db(repo.set_budget, {
         'budgetId': budget_id,
         'userId': user_id,
         'username': budget.username,
         'category': budget.category,
         'amount': budget.amount,
         'month': budget.month,
-        'currency': budget.currency,
-        'createdAt': firestore.SERVER_TIMESTAMP
+        'currency': budget.currency
     })
     return {"message": "Budget set successfully"}
 
+MAX_BUDGET_MONTHS = 36
+
+def budget_status_entry(budget: dict, spent: float) -> dict:
+    remaining = budget['amount'] - spent
+    percentage = (spent / budget['amount'] * 100) if budget['amount'] > 0 else 0
+    
+    status = 'good'
+    if percentage >= 100:
+        status = 'exceeded'
+    elif percentage >= 80:
+        status = 'warning'
+    
+    return {
+        'budgetId': budget['budgetId'],  # Include budgetId for deletion
+        'category': budget['category'],
+        'budget': budget['amount'],
+        'spent': spent,
+        'remaining': remaining,
+        'percentage': percentage,
+        'status': status,
+        'currency': budget['currency']
+    }
+
 @app.get("/api/budgets/status/{username}")
-async def get_budget_status(username: str, month: Optional[str] = None):
-    """Get budget status with spending"""
-    user_id = get_user_id_from_username(username)
+async def get_budget_status(
+    username: str, request: Request, response: Response, month: Optional[str] = None, months: Optional[str] = None
+):
+    """Get budget status with spending
+    
+    Pass `months` as a comma-separated list (e.g. 2025-09,2025-10) to get the
+    status of several months in one request.
+    """
+    check_month(month)
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not month:
-        month = datetime.now().strftime("%Y-%m")
+    response.headers.update(await conditional_get(request, user_id))
     
-    budgets = db.collection('budgets').where('userId', '==', user_id).where('month', '==', month).stream()
-    budget_list = [b.to_dict() for b in budgets]
+    if months:
+        month_list = sorted({check_month(m.strip()) for m in months.split(',') if m.strip()}, reverse=True)
+        if len(month_list) > MAX_BUDGET_MONTHS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BUDGET_MONTHS} months per request")
+    else:
+        month_list = [month or datetime.now().strftime("%Y-%m")]
     
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    txn_list = [t.to_dict() for t in transactions if t.to_dict()['date'].startswith(month) and t.to_dict()['type'] == 'expense']
+    # Spend per category comes straight from each month's rollup, so this is
+    # one budgets query plus one batched read of the month docs - no expense scan
+    budget_list, rollups = await asyncio.gather(
+        run_db(repo.budgets_for_months, user_id, month_list),
+        run_db(repo.get_rollups, user_id, *month_list)
+    )
+    spent_by_month = {m: rollups[m].get('category_totals', {}) for m in month_list}
     
-    budget_status = []
+    status_by_month = {m: [] for m in month_list}
     for budget in budget_list:
-        spent = sum(t['amount'] for t in txn_list if t['category'] == budget['category'])
-        remaining = budget['amount'] - spent
-        percentage = (spent / budget['amount'] * 100) if budget['amount'] > 0 else 0
-        
-        status = 'good'
-        if percentage >= 100:
-            status = 'exceeded'
-        elif percentage >= 80:
-            status = 'warning'
-        
-        budget_status.append({
-            'budgetId': budget['budgetId'],  # Include budgetId for deletion
-            'category': budget['category'],
-            'budget': budget['amount'],
-            'spent': spent,
-            'remaining': remaining,
-            'percentage': percentage,
-            'status': status,
-            'currency': budget['currency']
-        })
+        spent = spent_by_month[budget['month']].get(budget['category'], 0)
+        status_by_month[budget['month']].append(budget_status_entry(budget, spent))
     
-    return {"budget_status": budget_status}
+    if months:
+        return {"months": [{"month": m, "budget_status": status_by_month[m]} for m in month_list]}
+    return {"budget_status": status_by_month[month_list[0]]}
 
 @app.delete("/api/budgets/{budget_id}")
 async def delete_budget(budget_id: str):
     """Delete a budget"""
-    db.collection('budgets').document(budget_id).delete()
+    await run_db(repo.delete_budget, budget_id)
     return {"message": "Budget deleted successfully"}
 
 # ========== GOALS ENDPOINTS ==========
@@ -504,14 +1005,14 @@ async def delete_budget(budget_id: str):
 @app.post("/api/goals/create")
 async def create_goal(goal: GoalCreate):
     """Create a financial goal"""
-    user_id = get_user_id_from_username(goal.username)
+    user_id = await run_db(get_user_id_from_username, goal.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
     goal_id = generate_id()
     
-    db.collection('goals').document(goal_id).set({
+    await run_db(repo.create_goal, {
         'goalId': goal_id,
         'userId': user_id,
         'username': goal.username,
@@ -519,25 +1020,25 @@ async def create_goal(goal: GoalCreate):
         'target_amount': goal.target_amount,
         'current_amount': 0,
         'deadline': goal.deadline,
-        'currency': goal.currency,
-        'createdAt': firestore.SERVER_TIMESTAMP
+        'currency': goal.currency
     })
     
     return {"message": "Goal created successfully", "id": goal_id}
 
 @app.get("/api/goals/{username}")
-async def get_goals(username: str):
+async def get_goals(username: str, request: Request, response: Response):
     """Get all financial goals for a user"""
-    user_id = get_user_id_from_username(username)
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    goals = db.collection('goals').where('userId', '==', user_id).stream()
+    response.headers.update(await conditional_get(request, user_id))
+    
+    goals = await run_db(repo.list_goals, user_id)
     goal_list = []
     
-    for goal_doc in goals:
-        goal = goal_doc.to_dict()
+    for goal in goals:
         
         progress = (goal['current_amount'] / goal['target_amount'] * 100) if goal['target_amount'] > 0 else 0
         remaining = goal['target_amount'] - goal['current_amount']
@@ -548,7 +1049,7 @@ async def get_goals(username: str):
         daily_required = remaining / days_remaining if days_remaining > 0 else 0
         
         goal_list.append({
-            'id': goal.get('goalId', goal_doc.id),
+            'id': goal['goalId'],
             'name': goal['name'],
             'target_amount': goal['target_amount'],
             'current_amount': goal['current_amount'],
@@ -563,74 +1064,58 @@ async def get_goals(username: str):
     
     return goal_list
 
-@app.post("/api/goals/contribute")
-async def contribute_to_goal(data: ContributeGoal):
-    """Contribute money to a goal - deducts from balance via expense transaction"""
-    goal_ref = db.collection('goals').document(data.id)
-    goal_doc = goal_ref.get()
-    
-    if not goal_doc.exists:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    
-    goal_data = goal_doc.to_dict()
-    user_id = goal_data['userId']
-    username = goal_data['username']
-    
-    # Get user's current balance (calculated from transactions)
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    txn_list = [txn.to_dict() for txn in transactions]
-    
-    total_income = sum(t['amount'] for t in txn_list if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in txn_list if t['type'] == 'expense')
-    current_balance = total_income - total_expense
-    
-    # Check if user has sufficient balance
-    if current_balance < data.amount:
-        raise HTTPException(status_code=400, detail=f"Insufficient balance. Available: {current_balance:.2f}")
-    
-    # Create expense transaction to deduct from balance
-    txn_id = generate_id()
-    db.collection('transactions').document(txn_id).set({
-        'transactionId': txn_id,
-        'userId': user_id,
-        'username': username,
+def contribution_transaction(goal: dict, amount: float) -> dict:
+    """Expense that moves a goal contribution out of the balance"""
+    return {
+        'transactionId': generate_id(),
+        'userId': goal['userId'],
+        'username': goal['username'],
         'type': 'expense',
         'category': 'Savings',
-        'amount': data.amount,
-        'description': f"Contribution to goal: {goal_data['name']}",
+        'amount': amount,
+        'description': f"Contribution to goal: {goal['name']}",
         'date': datetime.now().strftime("%Y-%m-%d"),
-        'currency': goal_data.get('currency', 'PKR'),
+        'currency': goal.get('currency', 'PKR'),
         'created_at': datetime.now().isoformat()
-    })
-    
-    # Update goal amount
-    new_amount = goal_data['current_amount'] + data.amount
-    goal_ref.update({'current_amount': new_amount})
-    
-    # New balance after expense
-    new_balance = current_balance - data.amount
+    }
+
+@app.post("/api/goals/contribute")
+async def contribute_to_goal(data: ContributeGoal):
+    """Contribute money to a goal - deducts from balance via expense transaction"""
+    # The balance check, the expense and the goal update happen atomically
+    result = await run_db(
+        repo.contribute_to_goal, data.id, data.amount, partial(contribution_transaction, amount=data.amount)
+    )
     
+    return {"message": "Contribution added successfully", **result}
+
+def goal_refund(goal: dict, completed: bool) -> Optional[dict]:
+    """Income returning a cancelled goal's contributions to the balance, if any"""
+    # If user says it's NOT completed and there's money contributed, return it
+    if completed or goal['current_amount'] <= 0:
+        return None
     return {
-        "message": "Contribution added successfully",
-        "new_goal_amount": new_amount,
-        "new_balance": new_balance
+        'transactionId': generate_id(),
+        'userId': goal['userId'],
+        'username': goal['username'],
+        'type': 'income',
+        'category': 'Goal Refund',
+        'amount': goal['current_amount'],
+        'description': f"Refund from cancelled goal: {goal['name']}",
+        'date': datetime.now().strftime("%Y-%m-%d"),
+        'currency': goal.get('currency', 'PKR'),
+        'created_at': datetime.now().isoformat()
     }
 
 @app.delete("/api/goals/{goal_id}")
 async def delete_goal(goal_id: str, completed: bool = False):
     """Delete a financial goal - returns money to balance if cancelled (not completed)"""
-    goal_ref = db.collection('goals').document(goal_id)
-    goal_doc = goal_ref.get()
+    # The engine re-reads the goal and saves the refund with the delete
+    # atomically, so the refund matches the goal as deleted and is paid once
+    goal_data = await run_db(repo.delete_goal, goal_id, partial(goal_refund, completed=completed))
     
-    if not goal_doc.exists:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    
-    goal_data = goal_doc.to_dict()
-    user_id = goal_data['userId']
-    username = goal_data['username']
     current_amount = goal_data['current_amount']
     target_amount = goal_data['target_amount']
-    goal_name = goal_data['name']
     
     # Check if goal is actually complete
     is_actually_complete = current_amount >= target_amount
@@ -638,23 +1123,7 @@ async def delete_goal(goal_id: str, completed: bool = False):
     message = ""
     returned_amount = 0
     
-    # If user says it's NOT completed and there's money contributed, return it
     if not completed and current_amount > 0:
-        # Create income transaction to return money to balance
-        txn_id = generate_id()
-        db.collection('transactions').document(txn_id).set({
-            'transactionId': txn_id,
-            'userId': user_id,
-            'username': username,
-            'type': 'income',
-            'category': 'Goal Refund',
-            'amount': current_amount,
-            'description': f"Refund from cancelled goal: {goal_name}",
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'currency': goal_data.get('currency', 'PKR'),
-            'created_at': datetime.now().isoformat()
-        })
-        
         returned_amount = current_amount
         message = f"Goal cancelled. {current_amount:.2f} returned to balance."
     elif completed:
@@ -665,9 +1134,6 @@ async def delete_goal(goal_id: str, completed: bool = False):
     else:
         message = "Goal deleted."
     
-    # Delete the goal
-    goal_ref.delete()
-    
     return {
         "message": message,
         "was_complete": is_actually_complete,
@@ -679,10 +1145,9 @@ async def delete_goal(goal_id: str, completed: bool = False):
 @app.get("/api/currency/rates")
 async def get_currency_rates():
     """Get currency exchange rates"""
-    rates_ref = db.collection('currency_rates').document('rates')
-    rates_doc = rates_ref.get()
+    rates = await run_db(repo.get_currency_rates)
     
-    if not rates_doc.exists:
+    if rates is None:
         default_rates = {
             "USD": 1.0,
             "EUR": 0.85,
@@ -691,109 +1156,165 @@ async def get_currency_rates():
             "SAR": 3.75,
             "AED": 3.67
         }
-        rates_ref.set(default_rates)
+        await run_db(repo.set_currency_rates, default_rates)
         return {"rates": default_rates}
     
-    return {"rates": rates_doc.to_dict()}
+    return {"rates": rates}
 
 # ========== EXPORT ENDPOINTS ==========
 
+EXPORT_HEADERS = ["Date", "Type", "Category", "Amount", "Currency", "Description"]
+
+def export_rows(txns):
+    """Rows for every export format, pulled lazily from the repository stream"""
+    for txn in txns:
+        yield (txn['date'], txn['type'], txn['category'], txn['amount'], txn.get('currency', 'PKR'), txn['description'])
+
 @app.get("/api/export/{username}")
-async def export_to_excel(username: str, month: Optional[str] = None):
-    """Export transactions to Excel"""
-    user_id = get_user_id_from_username(username)
+async def export_to_excel(
+    username: str,
+    month: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    format: str = "xlsx"
+):
+    """Export transactions as xlsx (default), csv, ndjson or parquet"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    check_month(month)
+    try:
+        writer = export_writer(format)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    user_id = await run_db(get_user_id_from_username, username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    txn_list = [txn.to_dict() for txn in transactions]
+    start, end = date_range(month, date_from, date_to)
     
-    if month:
-        txn_list = [t for t in txn_list if t['date'].startswith(month)]
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transactions"
-    
-    headers = ["Date", "Type", "Category", "Amount", "Currency", "Description"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center")
-    
-    for row, txn in enumerate(txn_list, 2):
-        ws.cell(row=row, column=1, value=txn['date'])
-        ws.cell(row=row, column=2, value=txn['type'])
-        ws.cell(row=row, column=3, value=txn['category'])
-        ws.cell(row=row, column=4, value=txn['amount'])
-        ws.cell(row=row, column=5, value=txn.get('currency', 'PKR'))
-        ws.cell(row=row, column=6, value=txn['description'])
-    
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f"transactions_{username}_{month or 'all'}.xlsx"
+    def produce(sink):
+        writer(sink, EXPORT_HEADERS, export_rows(repo.stream_transactions(user_id, start, end)))
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    period = month or (f"{date_from or 'start'}_to_{date_to or 'now'}" if date_from or date_to else 'all')
+    filename = f"transactions_{username}_{period}.{extension}"
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        stream_export(produce),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 # ========== AI CHAT ENDPOINTS ==========
 
-@app.post("/api/chat")
-async def chat_with_ai(message: ChatMessage):
-    """Chat with AI assistant"""
+async def prepare_chat(message: ChatMessage):
+    """Cache key, prompt and context payload for a chat message"""
     if not GOOGLE_API_KEY:
         raise HTTPException(status_code=500, detail="AI service not configured")
     
-    user_id = get_user_id_from_username(message.username)
+    user_id = await run_db(get_user_id_from_username, message.username)
     
     if not user_id:
         raise HTTPException(status_code=404, detail="User not found")
     
-    transactions = db.collection('transactions').where('userId', '==', user_id).stream()
-    txn_list = [txn.to_dict() for txn in transactions]
+    # Totals come from the all-time rollup instead of a transaction scan
+    rollup = await run_db(get_rollup, user_id)
+    
+    cache_key = ai_cache.key('chat', AI_MODEL, message.username, rollup.get('version', 0), message.message)
     
-    total_income = sum(t['amount'] for t in txn_list if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in txn_list if t['type'] == 'expense')
+    total_income = rollup.get('total_income', 0)
+    total_expense = rollup.get('total_expense', 0)
     
-    context = f"""
+    prompt = f"""
     User's Financial Summary:
     - Total Income: ${total_income}
     - Total Expenses: ${total_expense}
     - Balance: ${total_income - total_expense}
-    - Number of Transactions: {len(txn_list)}
+    - Number of Transactions: {rollup.get('transaction_count', 0)}
     
     User Question: {message.message}
     
     Provide helpful financial advice based on this data.
     """
     
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=context
-    )
+    context = {
+        "income": total_income,
+        "expense": total_expense,
+        "balance": total_income - total_expense
+    }
+    return cache_key, prompt, context
+
+@app.post("/api/chat")
+async def chat_with_ai(message: ChatMessage):
+    """Chat with AI assistant"""
+    cache_key, prompt, context = await prepare_chat(message)
+    
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    result = {
+        "response": await llm.generate(prompt),
+        "context": context
+    }
+    ai_cache.set(cache_key, result)
+    return result
+
+@app.post("/api/chat/stream")
+async def chat_with_ai_stream(message: ChatMessage):
+    """Chat with AI assistant, streamed as server-sent events
+    
+    Events: `context` (the financial summary) first, then `token` chunks of
+    the answer, then `done` - or `error` if generation fails midway.
+    """
+    cache_key, prompt, context = await prepare_chat(message)
+    cached = ai_cache.get(cache_key)
+    if cached is None:
+        llm.raise_if_saturated()
+    
+    def remember(text: str):
+        ai_cache.set(cache_key, {"response": text, "context": context})
     
+    return StreamingResponse(
+        stream_answer(
+            context,
+            llm.stream(prompt),
+            on_complete=remember,
+            cached_text=cached["response"] if cached is not None else None
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+# ========== MONITORING ENDPOINTS ==========
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the identity and AI response caches"""
     return {
-        "response": response.text,
-        "context": {
-            "income": total_income,
-            "expense": total_expense,
-            "balance": total_income - total_expense
-        }
+        "usernames": username_cache.stats(),
+        "users": user_cache.stats(),
+        "ai_responses": ai_cache.stats()
     }
 
+@app.get("/api/metrics/llm")
+async def get_llm_metrics():
+    """Gemini gateway load, counters and latency histograms"""
+    return llm.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Per-route request, storage, serialization and Firestore document totals (Prometheus)"""
+    return PlainTextResponse(request_metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {
         "message": "Expense Tracker API with Firestore (UUID-based)",
         "version": "3.0.0",
         "status": "running",
-        "database": "Firestore",
+        "database": repo.name,
         "schema": "UUID-based user tracking"
     }
 
@@ -0,0 +1,185 @@
+"""
+Token-budgeted prompt context for the AI endpoints
+Instead of pasting a user's whole history into the prompt, the context is
+compact precomputed aggregates (monthly totals, category breakdown) plus only
+the transactions most relevant to the question, ranked by a small local
+TF-IDF index over description, category, type and date, and cut off at a
+token budget
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from histogram import Histogram
+
+# No tokenizer dependency: ~4 characters per token is close enough for
+# English/JSON-ish prompts to budget against
+CHARS_PER_TOKEN = 4
+
+MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july",
+               "august", "september", "october", "november", "december"]
+
+_WORD = re.compile(r"[a-z0-9]+(?:-[0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can did do does for from how i in is it me my of on or "
+    "show tell that the this to was what when where which who why with you your".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def _date_terms(date: str) -> List[str]:
+    # "2025-03-14" is findable as 2025, 2025-03, march and mar
+    terms = [date[:4], date[:7]] if len(date) >= 7 else [date]
+    try:
+        name = MONTH_NAMES[int(date[5:7]) - 1]
+        terms += [name, name[:3]]
+    except (ValueError, IndexError):
+        pass
+    return terms
+
+
+def transaction_terms(txn: dict) -> List[str]:
+    return (
+        tokenize(txn.get("description", "") or "")
+        + tokenize(txn.get("category", "") or "")
+        + [txn.get("type", "") or ""]
+        + _date_terms(txn.get("date", "") or "")
+    )
+
+
+class TransactionIndex:
+    """TF-IDF over one user's transactions, ranked by cosine similarity to a query
+
+    The aggregates are computed here too, so whoever caches the index per
+    snapshot of the data also caches them.
+    """
+
+    def __init__(self, transactions: List[dict]):
+        self.transactions = transactions
+        self.aggregates = aggregate(transactions)
+        self.vectors = []
+        document_frequency = Counter()
+        for txn in transactions:
+            counts = Counter(term for term in transaction_terms(txn) if term)
+            self.vectors.append(counts)
+            document_frequency.update(counts.keys())
+
+        total = len(transactions)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.norms = [
+            math.sqrt(sum((tf * self.idf[term]) ** 2 for term, tf in counts.items())) or 1.0
+            for counts in self.vectors
+        ]
+
+    def _query_terms(self, query: str) -> Counter:
+        terms = Counter()
+        for word in tokenize(query):
+            terms[word] += 1
+            # Poor man's stemming: "groceries" should also find "grocery"
+            if len(word) > 4:
+                for term in self.idf:
+                    if term != word and term[:5] == word[:5]:
+                        terms[term] += 1
+        return terms
+
+    def rank(self, query: str) -> List[int]:
+        """Transaction positions, most relevant first (newest first among ties)"""
+        terms = {term: tf for term, tf in self._query_terms(query).items() if term in self.idf}
+        scores = []
+        for position, counts in enumerate(self.vectors):
+            score = sum(tf * counts[term] * self.idf[term] ** 2 for term, tf in terms.items() if term in counts)
+            scores.append((score / self.norms[position], self.transactions[position].get("date", ""), position))
+        scores.sort(reverse=True)
+        return [position for _, _, position in scores]
+
+
+def aggregate(transactions: Iterable[dict]) -> dict:
+    """Overall, per-month and per-category totals in one pass"""
+    totals = {"income": 0.0, "expense": 0.0, "count": 0}
+    months: Dict[str, Dict[str, float]] = {}
+    categories: Dict[str, float] = {}
+    for txn in transactions:
+        kind = txn.get("type")
+        amount = float(txn.get("amount", 0) or 0)
+        totals["count"] += 1
+        if kind not in ("income", "expense"):
+            continue
+        totals[kind] += amount
+        month = months.setdefault((txn.get("date") or "unknown")[:7], {"income": 0.0, "expense": 0.0})
+        month[kind] += amount
+        if kind == "expense":
+            category = txn.get("category") or "Other"
+            categories[category] = categories.get(category, 0) + amount
+    return {"totals": totals, "months": months, "categories": categories}
+
+
+def format_aggregates(summary: dict) -> str:
+    totals = summary["totals"]
+    lines = [
+        f"Totals: {totals['count']} transactions, income {totals['income']:,.2f}, "
+        f"expenses {totals['expense']:,.2f}, net {totals['income'] - totals['expense']:,.2f}",
+        "Monthly (income / expenses):",
+    ]
+    lines += [
+        f"  {month}: {values['income']:,.2f} / {values['expense']:,.2f}"
+        for month, values in sorted(summary["months"].items(), reverse=True)
+    ]
+    lines.append("Expenses by category:")
+    lines += [
+        f"  {category}: {amount:,.2f}"
+        for category, amount in sorted(summary["categories"].items(), key=lambda item: -item[1])
+    ]
+    return "\n".join(lines)
+
+
+def format_transaction(txn: dict) -> str:
+    return (
+        f"{txn.get('date', '')} | {txn.get('type', '')} | {txn.get('category', '')} | "
+        f"{float(txn.get('amount', 0) or 0):,.2f} {txn.get('currency', '')} | {txn.get('description', '')}"
+    )
+
+
+def build_context(transactions: List[dict], query: str, token_budget: int,
+                  index: Optional[TransactionIndex] = None) -> Tuple[str, dict]:
+    """Aggregates first, then relevant transactions until the budget runs out
+
+    Returns the context text and stats about what went into it. The
+    aggregates are always included, even if they alone exceed the budget.
+    """
+    index = index or TransactionIndex(transactions)
+    summary = format_aggregates(index.aggregates)
+    header = "\n\nMost relevant transactions (date | type | category | amount | description):\n"
+    used = estimate_tokens(summary) + estimate_tokens(header)
+
+    lines = []
+    for position in index.rank(query):
+        line = format_transaction(transactions[position])
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+
+    context = summary + (header + "\n".join(lines) if lines else "")
+    return context, {
+        "transactions_total": len(transactions),
+        "transactions_included": len(lines),
+        "context_tokens": estimate_tokens(context),
+        "token_budget": token_budget,
+    }
+
+
+class PromptSizeMetrics(Histogram):
+    """Distribution of prompt sizes (estimated tokens) over the last N prompts"""
+
+    BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+    UNIT = "tokens"
@@ -0,0 +1,214 @@
+"""
+Storage interface for the UUID backend
+Handlers in main_firestore_uuid.py talk to a Repository instead of a database
+client, so data access can be optimized, swapped and benchmarked in one
+place. Engines:
+
+    firestore  Firestore with rollup docs (repository_firestore.py) - default
+    sqlite     a local SQLite file with indexes, for self-hosting (repository_sqlite.py)
+    memory     process-local dicts, for tests and offline benchmarks (repository_memory.py)
+
+Pick one with STORAGE_ENGINE; see create_repository() for engine settings.
+
+All methods are synchronous (main runs them on its db pool via run_db).
+Documents are plain dicts using the Firestore field names throughout
+(userId, transactionId, budgetId, goalId, ...). Date ranges are half-open
+string bounds on the "YYYY-MM-DD" `date` field: start inclusive, end
+exclusive, either may be None.
+
+Every write to a user's data (profile, vault, transactions, budgets, goals)
+also bumps that user's data version in the same commit; GETs derive their
+ETags from it.
+"""
+import os
+from typing import Callable, Iterator, List, Optional
+
+# ========== ROLLUPS ==========
+# A rollup summarizes a user's transactions over a period: a month
+# ("YYYY-MM") or all time. The all-time rollup also carries `months` (count
+# per month) and a `version` that goes up on every transaction write.
+
+ALL_TIME = 'all'
+
+
+def empty_rollup(user_id: str, period: str) -> dict:
+    return {
+        'userId': user_id,
+        'period': period,
+        'total_income': 0,
+        'total_expense': 0,
+        'transaction_count': 0,
+        'category_totals': {},
+        'category_counts': {}
+    }
+
+
+def add_to_rollup(rollup: dict, txn: dict, sign: int = 1):
+    """Fold one transaction into a rollup dict in place (sign=-1 removes it)"""
+    amount = txn['amount'] * sign
+    rollup['transaction_count'] += sign
+    if txn['type'] in ('income', 'expense'):
+        rollup[f"total_{txn['type']}"] += amount
+    if txn['type'] == 'expense':
+        category = txn['category']
+        rollup['category_totals'][category] = rollup['category_totals'].get(category, 0) + amount
+        rollup['category_counts'][category] = rollup['category_counts'].get(category, 0) + sign
+    if 'months' in rollup:
+        month = txn['date'][:7]
+        rollup['months'][month] = rollup['months'].get(month, 0) + sign
+
+
+def rollup_balance(rollup: dict) -> float:
+    return rollup.get('total_income', 0) - rollup.get('total_expense', 0)
+
+
+def balance_delta(txn: dict, sign: int = 1) -> float:
+    """Effect of a transaction on the running balance"""
+    if txn['type'] == 'income':
+        return txn['amount'] * sign
+    if txn['type'] == 'expense':
+        return -txn['amount'] * sign
+    return 0
+
+
+# ========== INTERFACE ==========
+
+class Repository:
+    """Everything the API reads and writes, independent of the engine"""
+
+    name = 'base'
+
+    # ----- users -----
+
+    def get_user_id(self, username: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def username_taken(self, username: str) -> bool:
+        raise NotImplementedError
+
+    def email_taken(self, email: str) -> bool:
+        raise NotImplementedError
+
+    def create_user(self, user: dict):
+        """Store a new user (with zero savings and balance) and its username"""
+        raise NotImplementedError
+
+    def update_user(self, user_id: str, fields: dict):
+        raise NotImplementedError
+
+    def data_version(self, user_id: str) -> int:
+        """The user's data version: one point read, 0 if never bumped"""
+        raise NotImplementedError
+
+    # ----- savings vault -----
+
+    def deposit_savings(self, user_id: str, amount: float) -> float:
+        """Add to the vault and its ledger atomically; returns the new vault"""
+        raise NotImplementedError
+
+    def withdraw_savings(self, user_id: str, amount: float) -> float:
+        """Check and debit the vault atomically (400 if short, 409 if contended)"""
+        raise NotImplementedError
+
+    # ----- transactions -----
+
+    def add_transactions(self, txns: List[dict]):
+        """Insert one user's transactions together with their rollup changes"""
+        raise NotImplementedError
+
+    def delete_transaction(self, txn_id: str) -> Optional[dict]:
+        """Delete a transaction and reverse its rollup changes; returns it, if it existed"""
+        raise NotImplementedError
+
+    def list_transactions(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                          limit: Optional[int] = None, after: Optional[dict] = None) -> List[dict]:
+        """Transactions newest first (date, then transactionId, descending)
+
+        `after` is the {'date', 'transactionId'} of the last row already seen.
+        Rows carry an `id` field for the frontend.
+        """
+        raise NotImplementedError
+
+    def stream_transactions(self, user_id: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Iterator[dict]:
+        """Like list_transactions, but produced lazily for exports"""
+        raise NotImplementedError
+
+    def get_rollups(self, user_id: str, *periods: str) -> dict:
+        """The all-time rollup plus any month rollups, keyed by period"""
+        raise NotImplementedError
+
+    def range_rollup(self, user_id: str, start: Optional[str], end: Optional[str]) -> dict:
+        """A rollup over an arbitrary date range"""
+        raise NotImplementedError
+
+    # ----- budgets -----
+
+    def set_budget(self, budget: dict):
+        """Create or replace a budget by its budgetId"""
+        raise NotImplementedError
+
+    def budgets_for_months(self, user_id: str, months: List[str]) -> List[dict]:
+        raise NotImplementedError
+
+    def delete_budget(self, budget_id: str):
+        raise NotImplementedError
+
+    # ----- goals -----
+
+    def create_goal(self, goal: dict):
+        raise NotImplementedError
+
+    def list_goals(self, user_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    def get_goal(self, goal_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def contribute_to_goal(self, goal_id: str, amount: float, expense: Callable[[dict], dict]) -> dict:
+        """Move `amount` from the user's balance into a goal atomically
+
+        `expense(goal)` builds the balancing expense transaction. Raises 404
+        for a missing goal and 400 if the balance is short; returns
+        new_goal_amount and new_balance.
+        """
+        raise NotImplementedError
+
+    def delete_goal(self, goal_id: str, refund: Callable[[dict], Optional[dict]]) -> dict:
+        """Delete a goal atomically; returns it as it was when deleted
+
+        `refund(goal)` builds the transaction (if any) that returns its
+        contributions, saved in the same write. Raises 404 for a missing goal.
+        """
+        raise NotImplementedError
+
+    # ----- currency rates -----
+
+    def get_currency_rates(self) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set_currency_rates(self, rates: dict):
+        raise NotImplementedError
+
+
+def create_repository(engine: Optional[str] = None) -> Repository:
+    """The engine named by STORAGE_ENGINE (firestore, sqlite or memory)
+
+    firestore reads FIREBASE_CREDENTIALS (default serviceAccountKey.json) and
+    sqlite reads SQLITE_PATH (default expense_tracker.db). Engine modules are
+    imported lazily so sqlite/memory deployments don't need firebase_admin.
+    """
+    engine = (engine or os.getenv('STORAGE_ENGINE', 'firestore')).lower()
+    if engine == 'firestore':
+        from repository_firestore import FirestoreRepository
+        return FirestoreRepository(os.getenv('FIREBASE_CREDENTIALS', 'serviceAccountKey.json'))
+    if engine == 'sqlite':
+        from repository_sqlite import SQLiteRepository
+        return SQLiteRepository(os.getenv('SQLITE_PATH', 'expense_tracker.db'))
+    if engine == 'memory':
+        from repository_memory import MemoryRepository
+        return MemoryRepository()
+    raise ValueError(f"Unknown STORAGE_ENGINE '{engine}' (use firestore, sqlite or memory)")
@@ -0,0 +1,446 @@
+"""
+Firestore engine for the repository interface
+Collections: users, usernames (username -> userId), transactions, rollups,
+budgets, goals, currency_rates, and users/{userId}/savings_ledger.
+
+Rollups are one summary doc per user and month ("{userId}_{YYYY-MM}") plus
+one all-time doc ("{userId}_all"), kept current with Increment in the same
+batch as every transaction write/delete so reports never have to scan
+transactions. The same batch keeps a running `balance` (income - expense) on
+the user doc, trusted once `balanceComplete` is set.
+The all-time doc carries `complete: True` once the user has been backfilled;
+until then the increments only cover recent writes and are recomputed. Its
+`version` goes up on every transaction write (AI response cache key).
+
+The user doc's `dataVersion` is incremented in the same commit as every
+write to the user's data, so ETags cost one point read to check.
+"""
+import os
+from typing import Callable, Iterator, List, Optional
+from uuid import uuid4
+
+import firebase_admin
+from fastapi import HTTPException
+from firebase_admin import credentials, firestore
+
+from repository import ALL_TIME, Repository, add_to_rollup, balance_delta, empty_rollup, rollup_balance
+from request_metrics import MeteredClient
+
+# Firestore caps 'in' filters, so longer month lists are queried in chunks
+BUDGET_MONTHS_PER_QUERY = 10
+
+SAVINGS_TXN_ATTEMPTS = int(os.getenv('SAVINGS_TXN_ATTEMPTS', '10'))
+
+
+class BalanceUnavailable(Exception):
+    """The user doc predates the running balance counter"""
+
+
+class FirestoreRepository(Repository):
+    name = 'firestore'
+
+    def __init__(self, credentials_path: str = 'serviceAccountKey.json'):
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app(credentials.Certificate(credentials_path))
+        # Counts documents read/written/deleted per request (see request_metrics.py)
+        self.db = MeteredClient(firestore.client())
+
+    # ========== USERS ==========
+
+    def get_user_id(self, username: str) -> Optional[str]:
+        username_ref = self.db.collection('usernames').document(username).get()
+        if username_ref.exists:
+            return username_ref.to_dict().get('userId')
+        return None
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        user_ref = self.db.collection('users').document(user_id).get()
+        if user_ref.exists:
+            return user_ref.to_dict()
+        return None
+
+    def username_taken(self, username: str) -> bool:
+        return self.db.collection('usernames').document(username).get().exists
+
+    def email_taken(self, email: str) -> bool:
+        return len(list(self.db.collection('users').where('email', '==', email).limit(1).stream())) > 0
+
+    def create_user(self, user: dict):
+        # Create user document and username -> userId mapping together
+        user_id = user['userId']
+        batch = self.db.batch()
+        batch.set(self.db.collection('users').document(user_id), {
+            **user,
+            'savingsVault': 0,
+            'balance': 0,
+            'balanceComplete': True,
+            'dataVersion': 0,
+            'createdAt': firestore.SERVER_TIMESTAMP
+        })
+        batch.set(self.db.collection('usernames').document(user['username']), {
+            'userId': user_id,
+            'username': user['username']
+        })
+        # New users start with complete (empty) rollups - nothing to backfill
+        batch.set(self.rollup_ref(user_id, ALL_TIME), {**empty_rollup(user_id, ALL_TIME), 'months': {}, 'complete': True})
+        batch.commit()
+
+    def update_user(self, user_id: str, fields: dict):
+        self.db.collection('users').document(user_id).update({**fields, 'dataVersion': firestore.Increment(1)})
+
+    def data_version(self, user_id: str) -> int:
+        user_doc = self.db.collection('users').document(user_id).get(field_paths=['dataVersion'])
+        return (user_doc.to_dict() or {}).get('dataVersion', 0) if user_doc.exists else 0
+
+    def bump_version(self, batch, user_id: str):
+        """Queue a data version increment for a user in `batch` (or a transaction)"""
+        batch.set(self.db.collection('users').document(user_id), {'dataVersion': firestore.Increment(1)}, merge=True)
+
+    # ========== SAVINGS VAULT ==========
+    # Every vault movement is appended to users/{userId}/savings_ledger in the
+    # same commit as the balance change, so the vault can always be audited.
+
+    def ledger_entry(self, user_ref, entry_type: str, amount: float):
+        """Reference and body for a new savings ledger entry"""
+        entry_id = str(uuid4())
+        return user_ref.collection('savings_ledger').document(entry_id), {
+            'entryId': entry_id,
+            'type': entry_type,
+            'amount': amount,
+            'createdAt': firestore.SERVER_TIMESTAMP
+        }
+
+    def deposit_savings(self, user_id: str, amount: float) -> float:
+        """Increment the vault server-side - no read, so concurrent deposits never collide"""
+        user_ref = self.db.collection('users').document(user_id)
+        entry_ref, entry = self.ledger_entry(user_ref, 'deposit', amount)
+
+        batch = self.db.batch()
+        batch.update(user_ref, {'savingsVault': firestore.Increment(amount), 'dataVersion': firestore.Increment(1)})
+        batch.set(entry_ref, entry)
+        batch.commit()
+        return user_ref.get().to_dict().get('savingsVault', 0)
+
+    def withdraw_savings(self, user_id: str, amount: float) -> float:
+        repo = self
+
+        @firestore.transactional
+        def withdraw_in_transaction(transaction, user_ref) -> float:
+            """Check and debit the vault atomically (retried by Firestore on contention)"""
+            current_savings = user_ref.get(transaction=transaction).to_dict().get('savingsVault', 0)
+
+            if amount > current_savings:
+                raise HTTPException(status_code=400, detail="Insufficient savings")
+
+            new_balance = current_savings - amount
+            entry_ref, entry = repo.ledger_entry(user_ref, 'withdrawal', amount)
+            transaction.update(user_ref, {'savingsVault': new_balance, 'dataVersion': firestore.Increment(1)})
+            transaction.set(entry_ref, entry)
+
+            return new_balance
+
+        try:
+            return withdraw_in_transaction(
+                self.db.transaction(max_attempts=SAVINGS_TXN_ATTEMPTS), self.db.collection('users').document(user_id)
+            )
+        except ValueError:
+            # Transaction retries exhausted under contention
+            raise HTTPException(status_code=409, detail="Savings vault is busy, please try again")
+
+    # ========== ROLLUPS ==========
+
+    def rollup_ref(self, user_id: str, period: str):
+        return self.db.collection('rollups').document(f"{user_id}_{period}")
+
+    def apply_rollups(self, batch, txns: List[dict], sign: int = 1):
+        """Queue combined rollup and balance increments for one user's transactions
+
+        One write per touched rollup doc however many transactions there are
+        (sign=-1 reverses them).
+        """
+        user_id = txns[0]['userId']
+        updates = {}
+        balance = 0
+
+        for txn in txns:
+            month = txn['date'][:7]
+            amount = txn['amount'] * sign
+            for period in (month, ALL_TIME):
+                update = updates.setdefault(period, {'transaction_count': 0})
+                update['transaction_count'] += sign
+                if txn['type'] in ('income', 'expense'):
+                    field = f"total_{txn['type']}"
+                    update[field] = update.get(field, 0) + amount
+                if txn['type'] == 'expense':
+                    totals = update.setdefault('category_totals', {})
+                    counts = update.setdefault('category_counts', {})
+                    totals[txn['category']] = totals.get(txn['category'], 0) + amount
+                    counts[txn['category']] = counts.get(txn['category'], 0) + sign
+                if period == ALL_TIME:
+                    months = update.setdefault('months', {})
+                    months[month] = months.get(month, 0) + sign
+            balance += balance_delta(txn, sign)
+        updates[ALL_TIME]['version'] = 1
+
+        for period, update in updates.items():
+            increments = {
+                field: ({key: firestore.Increment(value) for key, value in value.items()}
+                        if isinstance(value, dict) else firestore.Increment(value))
+                for field, value in update.items()
+            }
+            batch.set(self.rollup_ref(user_id, period), {'userId': user_id, 'period': period, **increments}, merge=True)
+
+        user_update = {'dataVersion': firestore.Increment(1)}
+        if balance:
+            user_update['balance'] = firestore.Increment(balance)
+        batch.set(self.db.collection('users').document(user_id), user_update, merge=True)
+
+    def save_transaction(self, batch, txn: dict):
+        """Queue a new transaction document together with its rollup increments"""
+        batch.set(self.db.collection('transactions').document(txn['transactionId']), txn)
+        self.apply_rollups(batch, [txn])
+
+    def rebuild_rollups(self, user_id: str) -> dict:
+        """Recompute a user's rollup docs and balance from a full scan (backfill only)
+
+        Runs as a transaction that reads the all-time doc, which every
+        transaction write increments, so a write landing during the scan forces
+        a retry instead of being overwritten. Returns every rollup keyed by period.
+        """
+        repo = self
+
+        @firestore.transactional
+        def rebuild_in_transaction(transaction, all_time_ref) -> dict:
+            previous = all_time_ref.get(transaction=transaction)
+            rollups = {ALL_TIME: {**empty_rollup(user_id, ALL_TIME), 'months': {}}}
+
+            query = repo.db.collection('transactions').where('userId', '==', user_id)
+            for txn in query.stream(transaction=transaction):
+                data = txn.to_dict()
+                add_to_rollup(rollups[ALL_TIME], data)
+                add_to_rollup(rollups.setdefault(data['date'][:7], empty_rollup(user_id, data['date'][:7])), data)
+            rollups[ALL_TIME]['complete'] = True
+            # Keep counting up so versions seen before the rebuild are never reused
+            rollups[ALL_TIME]['version'] = ((previous.to_dict() or {}).get('version', 0) if previous.exists else 0) + 1
+
+            for period, rollup in rollups.items():
+                transaction.set(repo.rollup_ref(user_id, period), rollup)
+            transaction.set(repo.db.collection('users').document(user_id), {
+                'balance': rollup_balance(rollups[ALL_TIME]),
+                'balanceComplete': True
+            }, merge=True)
+            return rollups
+
+        return rebuild_in_transaction(self.db.transaction(), self.rollup_ref(user_id, ALL_TIME))
+
+    def get_rollups(self, user_id: str, *periods: str) -> dict:
+        """Read the all-time rollup plus any month rollups in one round trip
+
+        Users whose all-time doc isn't marked complete are backfilled first.
+        """
+        refs = {period: self.rollup_ref(user_id, period) for period in (ALL_TIME,) + periods}
+        docs = {doc.id: doc for doc in self.db.get_all(list(refs.values()))}
+
+        all_time = docs.get(refs[ALL_TIME].id)
+        if all_time is None or not all_time.exists or not all_time.to_dict().get('complete'):
+            rebuilt = self.rebuild_rollups(user_id)
+            return {period: rebuilt.get(period, empty_rollup(user_id, period)) for period in refs}
+
+        # Month docs only exist once a transaction lands in that month
+        result = {}
+        for period, ref in refs.items():
+            doc = docs.get(ref.id)
+            result[period] = doc.to_dict() if doc is not None and doc.exists else empty_rollup(user_id, period)
+        return result
+
+    def range_rollup(self, user_id: str, start: Optional[str], end: Optional[str]) -> dict:
+        # Arbitrary ranges have no rollup doc, so sum just the rows in range
+        rollup = empty_rollup(user_id, f"{start or ''}..{end or ''}")
+        for txn in self.transactions_query(user_id, start, end).stream():
+            add_to_rollup(rollup, txn.to_dict())
+        return rollup
+
+    # ========== TRANSACTIONS ==========
+
+    def add_transactions(self, txns: List[dict]):
+        batch = self.db.batch()
+        for txn in txns:
+            batch.set(self.db.collection('transactions').document(txn['transactionId']), txn)
+        self.apply_rollups(batch, txns)
+        batch.commit()
+
+    def delete_transaction(self, txn_id: str) -> Optional[dict]:
+        repo = self
+
+        @firestore.transactional
+        def delete_in_transaction(transaction, txn_ref) -> Optional[dict]:
+            """Read and reverse the transaction atomically
+
+            A concurrent delete of the same id forces a retry, which then finds
+            it gone, so its rollup changes are only ever reversed once.
+            """
+            txn_doc = txn_ref.get(transaction=transaction)
+            if not txn_doc.exists:
+                return None
+            txn = txn_doc.to_dict()
+            transaction.delete(txn_ref)
+            repo.apply_rollups(transaction, [txn], sign=-1)
+            return txn
+
+        return delete_in_transaction(self.db.transaction(), self.db.collection('transactions').document(txn_id))
+
+    def transactions_query(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None):
+        """A user's transaction query, newest first (see firestore.indexes.json)"""
+        query = self.db.collection('transactions').where('userId', '==', user_id)
+        if start:
+            query = query.where('date', '>=', start)
+        if end:
+            query = query.where('date', '<', end)
+        return query.order_by('date', direction=firestore.Query.DESCENDING)
+
+    @staticmethod
+    def transaction_payload(txn) -> dict:
+        data = txn.to_dict()
+        data['id'] = data.get('transactionId', txn.id)
+        return data
+
+    def list_transactions(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                          limit: Optional[int] = None, after: Optional[dict] = None) -> List[dict]:
+        query = self.transactions_query(user_id, start, end).order_by(
+            'transactionId', direction=firestore.Query.DESCENDING
+        )
+        if after:
+            query = query.start_after(after)
+        if limit and limit > 0:
+            query = query.limit(limit)
+        return [self.transaction_payload(txn) for txn in query.stream()]
+
+    def stream_transactions(self, user_id: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Iterator[dict]:
+        for doc in self.transactions_query(user_id, start, end).stream():
+            yield doc.to_dict()
+
+    # ========== BUDGETS ==========
+
+    def set_budget(self, budget: dict):
+        batch = self.db.batch()
+        batch.set(self.db.collection('budgets').document(budget['budgetId']),
+                  {**budget, 'createdAt': firestore.SERVER_TIMESTAMP})
+        self.bump_version(batch, budget['userId'])
+        batch.commit()
+
+    def budgets_for_months(self, user_id: str, months: List[str]) -> List[dict]:
+        budgets = []
+        for i in range(0, len(months), BUDGET_MONTHS_PER_QUERY):
+            chunk = months[i:i + BUDGET_MONTHS_PER_QUERY]
+            query = self.db.collection('budgets').where('userId', '==', user_id).where('month', 'in', chunk)
+            budgets.extend(b.to_dict() for b in query.stream())
+        return budgets
+
+    def delete_budget(self, budget_id: str):
+        budget_ref = self.db.collection('budgets').document(budget_id)
+        budget_doc = budget_ref.get()
+        if not budget_doc.exists:
+            return
+        batch = self.db.batch()
+        batch.delete(budget_ref)
+        self.bump_version(batch, budget_doc.to_dict()['userId'])
+        batch.commit()
+
+    # ========== GOALS ==========
+
+    def create_goal(self, goal: dict):
+        batch = self.db.batch()
+        batch.set(self.db.collection('goals').document(goal['goalId']), {**goal, 'createdAt': firestore.SERVER_TIMESTAMP})
+        self.bump_version(batch, goal['userId'])
+        batch.commit()
+
+    def list_goals(self, user_id: str) -> List[dict]:
+        return [
+            {**doc.to_dict(), 'goalId': doc.to_dict().get('goalId', doc.id)}
+            for doc in self.db.collection('goals').where('userId', '==', user_id).stream()
+        ]
+
+    def get_goal(self, goal_id: str) -> Optional[dict]:
+        goal_doc = self.db.collection('goals').document(goal_id).get()
+        return goal_doc.to_dict() if goal_doc.exists else None
+
+    def contribute_to_goal(self, goal_id: str, amount: float, expense: Callable[[dict], dict]) -> dict:
+        repo = self
+
+        @firestore.transactional
+        def contribute_in_transaction(transaction, goal_ref) -> dict:
+            """Check the running balance and move money into the goal atomically
+
+            Reads the goal and the user doc inside the transaction, so concurrent
+            contributions (or any other balance change) force a retry instead of
+            both passing the same balance check.
+            """
+            goal_doc = goal_ref.get(transaction=transaction)
+            if not goal_doc.exists:
+                raise HTTPException(status_code=404, detail="Goal not found")
+
+            goal_data = goal_doc.to_dict()
+            user_id = goal_data['userId']
+            user_doc = repo.db.collection('users').document(user_id).get(transaction=transaction)
+            user_data = user_doc.to_dict() if user_doc.exists else {}
+            if not user_data.get('balanceComplete'):
+                raise BalanceUnavailable(user_id)
+            current_balance = user_data.get('balance', 0)
+
+            # Check if user has sufficient balance
+            if current_balance < amount:
+                raise HTTPException(status_code=400, detail=f"Insufficient balance. Available: {current_balance:.2f}")
+
+            # Create expense transaction to deduct from balance
+            repo.save_transaction(transaction, expense(goal_data))
+
+            # Update goal amount
+            new_amount = goal_data['current_amount'] + amount
+            transaction.update(goal_ref, {'current_amount': new_amount})
+
+            return {"new_goal_amount": new_amount, "new_balance": current_balance - amount}
+
+        goal_ref = self.db.collection('goals').document(goal_id)
+        try:
+            return contribute_in_transaction(self.db.transaction(), goal_ref)
+        except BalanceUnavailable as exc:
+            # Backfill the balance from the user's transactions once, then retry
+            self.rebuild_rollups(exc.args[0])
+            return contribute_in_transaction(self.db.transaction(), goal_ref)
+
+    def delete_goal(self, goal_id: str, refund: Callable[[dict], Optional[dict]]) -> dict:
+        repo = self
+
+        @firestore.transactional
+        def delete_in_transaction(transaction, goal_ref) -> dict:
+            """Re-read the goal and delete it together with its refund
+
+            A concurrent delete or contribution forces a retry, so the refund
+            is paid once and always matches the goal's current amount.
+            """
+            goal_doc = goal_ref.get(transaction=transaction)
+            if not goal_doc.exists:
+                raise HTTPException(status_code=404, detail="Goal not found")
+
+            goal = goal_doc.to_dict()
+            refund_txn = refund(goal)
+            if refund_txn is not None:
+                repo.save_transaction(transaction, refund_txn)
+            else:
+                repo.bump_version(transaction, goal['userId'])
+            transaction.delete(goal_ref)
+            return goal
+
+        return delete_in_transaction(self.db.transaction(), self.db.collection('goals').document(goal_id))
+
+    # ========== CURRENCY RATES ==========
+
+    def get_currency_rates(self) -> Optional[dict]:
+        rates_doc = self.db.collection('currency_rates').document('rates').get()
+        return rates_doc.to_dict() if rates_doc.exists else None
+
+    def set_currency_rates(self, rates: dict):
+        self.db.collection('currency_rates').document('rates').set(rates)
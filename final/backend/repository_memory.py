@@ -0,0 +1,246 @@
+"""
+In-memory engine for the repository interface
+Process-local dicts behind one lock: nothing persists, nothing needs
+credentials, and there's no I/O, so the API can be exercised and benchmarked
+offline (STORAGE_ENGINE=memory) and timings show the Python side alone.
+Rollups are maintained incrementally like the Firestore engine's.
+"""
+import copy
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from repository import ALL_TIME, Repository, add_to_rollup, empty_rollup, rollup_balance
+
+
+def _sort_key(txn: dict) -> tuple:
+    return txn['date'], txn['transactionId']
+
+
+class MemoryRepository(Repository):
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.users = {}
+        self.usernames = {}
+        self.transactions = {}
+        # userId -> that user's transactions, kept sorted oldest first by (date, transactionId)
+        self.user_transactions = {}
+        self.rollups = {}
+        self.budgets = {}
+        self.goals = {}
+        self.savings_ledger = []
+        self.currency_rates = None
+
+    # ========== USERS ==========
+
+    def get_user_id(self, username: str) -> Optional[str]:
+        return self.usernames.get(username)
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        user = self.users.get(user_id)
+        return dict(user) if user is not None else None
+
+    def username_taken(self, username: str) -> bool:
+        return username in self.usernames
+
+    def email_taken(self, email: str) -> bool:
+        return any(user['email'] == email for user in self.users.values())
+
+    def create_user(self, user: dict):
+        with self._lock:
+            if user['username'] in self.usernames:
+                raise HTTPException(status_code=400, detail="Username already exists")
+            user_id = user['userId']
+            self.users[user_id] = {**user, 'savingsVault': 0, 'dataVersion': 0, 'createdAt': datetime.now().isoformat()}
+            self.usernames[user['username']] = user_id
+            self.user_transactions[user_id] = []
+            self.rollups[(user_id, ALL_TIME)] = {**empty_rollup(user_id, ALL_TIME), 'months': {}, 'version': 0}
+
+    def update_user(self, user_id: str, fields: dict):
+        with self._lock:
+            self.users[user_id].update(fields)
+            self._bump(user_id)
+
+    def data_version(self, user_id: str) -> int:
+        return self.users.get(user_id, {}).get('dataVersion', 0)
+
+    def _bump(self, user_id: str):
+        user = self.users.get(user_id)
+        if user is not None:
+            user['dataVersion'] = user.get('dataVersion', 0) + 1
+
+    # ========== SAVINGS VAULT ==========
+
+    def _ledger(self, user_id: str, entry_type: str, amount: float):
+        self.savings_ledger.append({
+            'entryId': str(uuid4()), 'userId': user_id, 'type': entry_type, 'amount': amount,
+            'createdAt': datetime.now().isoformat()
+        })
+
+    def deposit_savings(self, user_id: str, amount: float) -> float:
+        with self._lock:
+            user = self.users[user_id]
+            user['savingsVault'] = user.get('savingsVault', 0) + amount
+            self._ledger(user_id, 'deposit', amount)
+            self._bump(user_id)
+            return user['savingsVault']
+
+    def withdraw_savings(self, user_id: str, amount: float) -> float:
+        with self._lock:
+            user = self.users[user_id]
+            if amount > user.get('savingsVault', 0):
+                raise HTTPException(status_code=400, detail="Insufficient savings")
+            user['savingsVault'] -= amount
+            self._ledger(user_id, 'withdrawal', amount)
+            self._bump(user_id)
+            return user['savingsVault']
+
+    # ========== ROLLUPS ==========
+
+    def _rollup(self, user_id: str, period: str) -> dict:
+        rollup = self.rollups.get((user_id, period))
+        if rollup is None:
+            rollup = self.rollups[(user_id, period)] = empty_rollup(user_id, period)
+            if period == ALL_TIME:
+                rollup.update(months={}, version=0)
+        return rollup
+
+    def _apply(self, txns: List[dict], sign: int = 1):
+        for txn in txns:
+            add_to_rollup(self._rollup(txn['userId'], txn['date'][:7]), txn, sign)
+            add_to_rollup(self._rollup(txn['userId'], ALL_TIME), txn, sign)
+        self._rollup(txns[0]['userId'], ALL_TIME)['version'] += 1
+        self._bump(txns[0]['userId'])
+
+    def get_rollups(self, user_id: str, *periods: str) -> dict:
+        with self._lock:
+            result = {
+                period: copy.deepcopy(self.rollups.get((user_id, period)) or empty_rollup(user_id, period))
+                for period in (ALL_TIME,) + periods
+            }
+        result[ALL_TIME].setdefault('months', {})
+        result[ALL_TIME]['complete'] = True
+        return result
+
+    def range_rollup(self, user_id: str, start: Optional[str], end: Optional[str]) -> dict:
+        rollup = empty_rollup(user_id, f"{start or ''}..{end or ''}")
+        for txn in self._select(user_id, start, end):
+            add_to_rollup(rollup, txn)
+        return rollup
+
+    # ========== TRANSACTIONS ==========
+
+    def _insert(self, txns: List[dict]):
+        for txn in txns:
+            txn = dict(txn)
+            self.transactions[txn['transactionId']] = txn
+            insort(self.user_transactions.setdefault(txn['userId'], []), txn, key=_sort_key)
+        self._apply(txns)
+
+    def add_transactions(self, txns: List[dict]):
+        with self._lock:
+            self._insert(txns)
+
+    def delete_transaction(self, txn_id: str) -> Optional[dict]:
+        with self._lock:
+            txn = self.transactions.pop(txn_id, None)
+            if txn is None:
+                return None
+            self.user_transactions[txn['userId']].remove(txn)
+            self._apply([txn], sign=-1)
+            return dict(txn)
+
+    def _select(self, user_id: str, start: Optional[str], end: Optional[str],
+                limit: Optional[int] = None, after: Optional[dict] = None) -> List[dict]:
+        """Matching rows newest first, copied out under the lock"""
+        with self._lock:
+            rows = self.user_transactions.get(user_id, [])
+            # Bisect the sorted list for the range instead of scanning it
+            lo = bisect_left(rows, (start,), key=_sort_key) if start else 0
+            hi = bisect_left(rows, (end,), key=_sort_key) if end else len(rows)
+            if after:
+                hi = min(hi, bisect_left(rows, (after['date'], after['transactionId']), key=_sort_key))
+            if limit and limit > 0:
+                lo = max(lo, hi - limit)
+            return [dict(txn) for txn in reversed(rows[lo:hi])]
+
+    def list_transactions(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                          limit: Optional[int] = None, after: Optional[dict] = None) -> List[dict]:
+        return [{**txn, 'id': txn['transactionId']} for txn in self._select(user_id, start, end, limit, after)]
+
+    def stream_transactions(self, user_id: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Iterator[dict]:
+        return iter(self._select(user_id, start, end))
+
+    # ========== BUDGETS ==========
+
+    def set_budget(self, budget: dict):
+        with self._lock:
+            self.budgets[budget['budgetId']] = {**budget, 'createdAt': datetime.now().isoformat()}
+            self._bump(budget['userId'])
+
+    def budgets_for_months(self, user_id: str, months: List[str]) -> List[dict]:
+        wanted = set(months)
+        with self._lock:
+            return [dict(b) for b in self.budgets.values() if b['userId'] == user_id and b['month'] in wanted]
+
+    def delete_budget(self, budget_id: str):
+        with self._lock:
+            budget = self.budgets.pop(budget_id, None)
+            if budget is not None:
+                self._bump(budget['userId'])
+
+    # ========== GOALS ==========
+
+    def create_goal(self, goal: dict):
+        with self._lock:
+            self.goals[goal['goalId']] = {**goal, 'createdAt': datetime.now().isoformat()}
+            self._bump(goal['userId'])
+
+    def list_goals(self, user_id: str) -> List[dict]:
+        with self._lock:
+            return [dict(goal) for goal in self.goals.values() if goal['userId'] == user_id]
+
+    def get_goal(self, goal_id: str) -> Optional[dict]:
+        goal = self.goals.get(goal_id)
+        return dict(goal) if goal is not None else None
+
+    def contribute_to_goal(self, goal_id: str, amount: float, expense: Callable[[dict], dict]) -> dict:
+        with self._lock:
+            goal = self.goals.get(goal_id)
+            if goal is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+
+            current_balance = rollup_balance(self._rollup(goal['userId'], ALL_TIME))
+            if current_balance < amount:
+                raise HTTPException(status_code=400, detail=f"Insufficient balance. Available: {current_balance:.2f}")
+
+            self._insert([expense(dict(goal))])
+            goal['current_amount'] += amount
+            return {"new_goal_amount": goal['current_amount'], "new_balance": current_balance - amount}
+
+    def delete_goal(self, goal_id: str, refund: Callable[[dict], Optional[dict]]) -> dict:
+        with self._lock:
+            goal = self.goals.pop(goal_id, None)
+            if goal is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+
+            refund_txn = refund(dict(goal))
+            if refund_txn is not None:
+                self._insert([refund_txn])
+            self._bump(goal['userId'])
+            return dict(goal)
+
+    # ========== CURRENCY RATES ==========
+
+    def get_currency_rates(self) -> Optional[dict]:
+        return dict(self.currency_rates) if self.currency_rates else None
+
+    def set_currency_rates(self, rates: dict):
+        self.currency_rates = dict(rates)
@@ -0,0 +1,459 @@
+"""
+SQLite engine for the repository interface, for self-hosted deployments
+One file in WAL mode; columns use the same names as the Firestore fields so
+rows come back as the same dicts. Transactions are indexed on
+(userId, date, transactionId) for range reads and keyset paging, and rollups
+are kept in rollup_totals - one row per user, period and type/category,
+upserted in the same SQLite transaction as each write - so reports, budget
+status and balance checks read a handful of rows however long the history is.
+Multi-step operations (withdrawals, goal contributions) run under
+BEGIN IMMEDIATE, which serializes writers across threads and processes.
+users.dataVersion is bumped in the same SQLite transaction as every write to
+the user's data (ETags for the GET endpoints).
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from repository import ALL_TIME, Repository, empty_rollup
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    userId TEXT PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    fullName TEXT NOT NULL,
+    currency TEXT,
+    savingsVault REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    dataVersion INTEGER NOT NULL DEFAULT 0,
+    createdAt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transactionId TEXT PRIMARY KEY,
+    userId TEXT NOT NULL,
+    username TEXT,
+    type TEXT NOT NULL,
+    category TEXT,
+    amount REAL NOT NULL,
+    description TEXT,
+    date TEXT NOT NULL,
+    currency TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (userId, date DESC, transactionId DESC);
+
+CREATE TABLE IF NOT EXISTS rollup_totals (
+    userId TEXT NOT NULL,
+    period TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (userId, period, type, category)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS budgets (
+    budgetId TEXT PRIMARY KEY,
+    userId TEXT NOT NULL,
+    username TEXT,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    month TEXT NOT NULL,
+    currency TEXT,
+    createdAt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_budgets_user_month ON budgets (userId, month);
+
+CREATE TABLE IF NOT EXISTS goals (
+    goalId TEXT PRIMARY KEY,
+    userId TEXT NOT NULL,
+    username TEXT,
+    name TEXT NOT NULL,
+    target_amount REAL NOT NULL,
+    current_amount REAL NOT NULL DEFAULT 0,
+    deadline TEXT,
+    currency TEXT,
+    createdAt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_goals_user ON goals (userId);
+
+CREATE TABLE IF NOT EXISTS savings_ledger (
+    entryId TEXT PRIMARY KEY,
+    userId TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    createdAt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_savings_ledger_user ON savings_ledger (userId);
+
+CREATE TABLE IF NOT EXISTS currency_rates (
+    code TEXT PRIMARY KEY,
+    rate REAL NOT NULL
+);
+"""
+
+USER_FIELDS = ('userId', 'username', 'email', 'password', 'fullName', 'currency', 'savingsVault', 'createdAt')
+TRANSACTION_FIELDS = ('transactionId', 'userId', 'username', 'type', 'category', 'amount', 'description',
+                      'date', 'currency', 'created_at')
+BUDGET_FIELDS = ('budgetId', 'userId', 'username', 'category', 'amount', 'month', 'currency', 'createdAt')
+GOAL_FIELDS = ('goalId', 'userId', 'username', 'name', 'target_amount', 'current_amount', 'deadline',
+               'currency', 'createdAt')
+
+
+def _insert(table: str, fields: tuple, verb: str = "INSERT") -> str:
+    return f"{verb} INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})"
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class SQLiteRepository(Repository):
+    name = 'sqlite'
+
+    def __init__(self, path: str = 'expense_tracker.db'):
+        self.path = Path(path)
+        if self.path.parent != Path('.'):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections aren't shared across threads; one per thread
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Files created before dataVersion existed
+        if 'dataVersion' not in {row['name'] for row in conn.execute("PRAGMA table_info(users)")}:
+            conn.execute("ALTER TABLE users ADD COLUMN dataVersion INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        """Write transaction: commit on success, roll back on error"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ========== USERS ==========
+
+    def get_user_id(self, username: str) -> Optional[str]:
+        row = self._conn().execute("SELECT userId FROM users WHERE username = ?", (username,)).fetchone()
+        return row['userId'] if row else None
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(USER_FIELDS)}, dataVersion FROM users WHERE userId = ?", (user_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def username_taken(self, username: str) -> bool:
+        return self.get_user_id(username) is not None
+
+    def email_taken(self, email: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM users WHERE email = ? LIMIT 1", (email,)).fetchone() is not None
+
+    def create_user(self, user: dict):
+        user = {**user, 'savingsVault': 0, 'createdAt': _now()}
+        try:
+            with self._tx() as conn:
+                conn.execute(_insert('users', USER_FIELDS), tuple(user.get(f) for f in USER_FIELDS))
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Username already exists")
+
+    def update_user(self, user_id: str, fields: dict):
+        unknown = set(fields) - set(USER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        with self._tx() as conn:
+            conn.execute(
+                f"UPDATE users SET {', '.join(f'{field} = ?' for field in fields)}, dataVersion = dataVersion + 1 "
+                f"WHERE userId = ?",
+                (*fields.values(), user_id)
+            )
+
+    def data_version(self, user_id: str) -> int:
+        row = self._conn().execute("SELECT dataVersion FROM users WHERE userId = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump(conn, user_id: str):
+        conn.execute("UPDATE users SET dataVersion = dataVersion + 1 WHERE userId = ?", (user_id,))
+
+    # ========== SAVINGS VAULT ==========
+
+    def _ledger(self, conn, user_id: str, entry_type: str, amount: float):
+        conn.execute(
+            "INSERT INTO savings_ledger (entryId, userId, type, amount, createdAt) VALUES (?, ?, ?, ?, ?)",
+            (str(uuid4()), user_id, entry_type, amount, _now())
+        )
+
+    def deposit_savings(self, user_id: str, amount: float) -> float:
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE users SET savingsVault = savingsVault + ?, dataVersion = dataVersion + 1 WHERE userId = ?",
+                (amount, user_id)
+            )
+            self._ledger(conn, user_id, 'deposit', amount)
+            return conn.execute("SELECT savingsVault FROM users WHERE userId = ?", (user_id,)).fetchone()[0]
+
+    def withdraw_savings(self, user_id: str, amount: float) -> float:
+        with self._tx() as conn:
+            current_savings = conn.execute(
+                "SELECT savingsVault FROM users WHERE userId = ?", (user_id,)
+            ).fetchone()[0]
+            if amount > current_savings:
+                raise HTTPException(status_code=400, detail="Insufficient savings")
+            conn.execute(
+                "UPDATE users SET savingsVault = ?, dataVersion = dataVersion + 1 WHERE userId = ?",
+                (current_savings - amount, user_id)
+            )
+            self._ledger(conn, user_id, 'withdrawal', amount)
+            return current_savings - amount
+
+    # ========== ROLLUPS ==========
+
+    def _apply_rollups(self, conn, txns: List[dict], sign: int = 1):
+        """Upsert rollup_totals for one user's transactions and bump their versions"""
+        deltas = {}
+        for txn in txns:
+            category = txn['category'] if txn['type'] == 'expense' else ''
+            for period in (txn['date'][:7], ALL_TIME):
+                key = (txn['userId'], period, txn['type'], category)
+                amount, count = deltas.get(key, (0, 0))
+                deltas[key] = (amount + txn['amount'] * sign, count + sign)
+        conn.executemany(
+            "INSERT INTO rollup_totals (userId, period, type, category, amount, count) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (userId, period, type, category) "
+            "DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count",
+            [(*key, amount, count) for key, (amount, count) in deltas.items()]
+        )
+        conn.execute(
+            "UPDATE users SET version = version + 1, dataVersion = dataVersion + 1 WHERE userId = ?",
+            (txns[0]['userId'],)
+        )
+
+    @staticmethod
+    def _fold(rollup: dict, row):
+        """Add one rollup_totals row to a rollup dict"""
+        rollup['transaction_count'] += row['count']
+        if row['type'] in ('income', 'expense'):
+            rollup[f"total_{row['type']}"] += row['amount']
+        if row['type'] == 'expense':
+            rollup['category_totals'][row['category']] = row['amount']
+            rollup['category_counts'][row['category']] = row['count']
+
+    def get_rollups(self, user_id: str, *periods: str) -> dict:
+        conn = self._conn()
+        wanted = (ALL_TIME,) + periods
+        result = {period: empty_rollup(user_id, period) for period in wanted}
+        rows = conn.execute(
+            f"SELECT period, type, category, amount, count FROM rollup_totals "
+            f"WHERE userId = ? AND period IN ({', '.join('?' for _ in wanted)})",
+            (user_id, *wanted)
+        )
+        for row in rows:
+            self._fold(result[row['period']], row)
+
+        all_time = result[ALL_TIME]
+        all_time['months'] = {
+            row['period']: row['total']
+            for row in conn.execute(
+                "SELECT period, SUM(count) AS total FROM rollup_totals WHERE userId = ? AND period != ? GROUP BY period",
+                (user_id, ALL_TIME)
+            )
+        }
+        version = conn.execute("SELECT version FROM users WHERE userId = ?", (user_id,)).fetchone()
+        all_time['version'] = version[0] if version else 0
+        all_time['complete'] = True
+        return result
+
+    def range_rollup(self, user_id: str, start: Optional[str], end: Optional[str]) -> dict:
+        where, params = self._range(user_id, start, end)
+        rollup = empty_rollup(user_id, f"{start or ''}..{end or ''}")
+        rows = self._conn().execute(
+            f"SELECT type, CASE WHEN type = 'expense' THEN category ELSE '' END AS category, "
+            f"SUM(amount) AS amount, COUNT(*) AS count FROM transactions WHERE {where} GROUP BY 1, 2",
+            params
+        )
+        for row in rows:
+            self._fold(rollup, row)
+        return rollup
+
+    # ========== TRANSACTIONS ==========
+
+    def add_transactions(self, txns: List[dict]):
+        with self._tx() as conn:
+            self._insert_transactions(conn, txns)
+
+    def _insert_transactions(self, conn, txns: List[dict]):
+        conn.executemany(
+            _insert('transactions', TRANSACTION_FIELDS),
+            [tuple(txn.get(f) for f in TRANSACTION_FIELDS) for txn in txns]
+        )
+        self._apply_rollups(conn, txns)
+
+    def delete_transaction(self, txn_id: str) -> Optional[dict]:
+        with self._tx() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE transactionId = ?", (txn_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            txn = dict(row)
+            conn.execute("DELETE FROM transactions WHERE transactionId = ?", (txn_id,))
+            self._apply_rollups(conn, [txn], sign=-1)
+            return txn
+
+    @staticmethod
+    def _range(user_id: str, start: Optional[str], end: Optional[str], after: Optional[dict] = None) -> tuple:
+        where, params = ["userId = ?"], [user_id]
+        if start:
+            where.append("date >= ?")
+            params.append(start)
+        if end:
+            where.append("date < ?")
+            params.append(end)
+        if after:
+            where.append("(date < ? OR (date = ? AND transactionId < ?))")
+            params += [after['date'], after['date'], after['transactionId']]
+        return " AND ".join(where), params
+
+    def _select_transactions(self, user_id, start, end, limit=None, after=None):
+        where, params = self._range(user_id, start, end, after)
+        sql = (f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE {where} "
+               f"ORDER BY date DESC, transactionId DESC")
+        if limit and limit > 0:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._conn().execute(sql, params)
+
+    def list_transactions(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                          limit: Optional[int] = None, after: Optional[dict] = None) -> List[dict]:
+        return [
+            {**dict(row), 'id': row['transactionId']}
+            for row in self._select_transactions(user_id, start, end, limit, after)
+        ]
+
+    def stream_transactions(self, user_id: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Iterator[dict]:
+        for row in self._select_transactions(user_id, start, end):
+            yield dict(row)
+
+    # ========== BUDGETS ==========
+
+    def set_budget(self, budget: dict):
+        budget = {**budget, 'createdAt': _now()}
+        with self._tx() as conn:
+            conn.execute(
+                _insert('budgets', BUDGET_FIELDS, verb="INSERT OR REPLACE"),
+                tuple(budget.get(f) for f in BUDGET_FIELDS)
+            )
+            self._bump(conn, budget['userId'])
+
+    def budgets_for_months(self, user_id: str, months: List[str]) -> List[dict]:
+        rows = self._conn().execute(
+            f"SELECT {', '.join(BUDGET_FIELDS)} FROM budgets "
+            f"WHERE userId = ? AND month IN ({', '.join('?' for _ in months)})",
+            (user_id, *months)
+        )
+        return [dict(row) for row in rows]
+
+    def delete_budget(self, budget_id: str):
+        with self._tx() as conn:
+            row = conn.execute("SELECT userId FROM budgets WHERE budgetId = ?", (budget_id,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM budgets WHERE budgetId = ?", (budget_id,))
+                self._bump(conn, row['userId'])
+
+    # ========== GOALS ==========
+
+    def create_goal(self, goal: dict):
+        goal = {**goal, 'createdAt': _now()}
+        with self._tx() as conn:
+            conn.execute(_insert('goals', GOAL_FIELDS), tuple(goal.get(f) for f in GOAL_FIELDS))
+            self._bump(conn, goal['userId'])
+
+    def list_goals(self, user_id: str) -> List[dict]:
+        rows = self._conn().execute(f"SELECT {', '.join(GOAL_FIELDS)} FROM goals WHERE userId = ?", (user_id,))
+        return [dict(row) for row in rows]
+
+    def get_goal(self, goal_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(GOAL_FIELDS)} FROM goals WHERE goalId = ?", (goal_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def contribute_to_goal(self, goal_id: str, amount: float, expense: Callable[[dict], dict]) -> dict:
+        with self._tx() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(GOAL_FIELDS)} FROM goals WHERE goalId = ?", (goal_id,)
+            ).fetchone()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+            goal = dict(row)
+
+            totals = {
+                row['type']: row['amount']
+                for row in conn.execute(
+                    "SELECT type, SUM(amount) AS amount FROM rollup_totals WHERE userId = ? AND period = ? GROUP BY type",
+                    (goal['userId'], ALL_TIME)
+                )
+            }
+            current_balance = totals.get('income', 0) - totals.get('expense', 0)
+            if current_balance < amount:
+                raise HTTPException(status_code=400, detail=f"Insufficient balance. Available: {current_balance:.2f}")
+
+            self._insert_transactions(conn, [expense(goal)])
+            new_amount = goal['current_amount'] + amount
+            conn.execute("UPDATE goals SET current_amount = ? WHERE goalId = ?", (new_amount, goal_id))
+
+            return {"new_goal_amount": new_amount, "new_balance": current_balance - amount}
+
+    def delete_goal(self, goal_id: str, refund: Callable[[dict], Optional[dict]]) -> dict:
+        with self._tx() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(GOAL_FIELDS)} FROM goals WHERE goalId = ?", (goal_id,)
+            ).fetchone()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+            goal = dict(row)
+
+            refund_txn = refund(goal)
+            if refund_txn is not None:
+                self._insert_transactions(conn, [refund_txn])
+            conn.execute("DELETE FROM goals WHERE goalId = ?", (goal_id,))
+            self._bump(conn, goal['userId'])
+            return goal
+
+    # ========== CURRENCY RATES ==========
+
+    def get_currency_rates(self) -> Optional[dict]:
+        rates = {row['code']: row['rate'] for row in self._conn().execute("SELECT code, rate FROM currency_rates")}
+        return rates or None
+
+    def set_currency_rates(self, rates: dict):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM currency_rates")
+            conn.executemany("INSERT INTO currency_rates (code, rate) VALUES (?, ?)", list(rates.items()))
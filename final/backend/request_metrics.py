@@ -0,0 +1,404 @@
+"""
+Per-request cost accounting for the UUID backend
+Every request gets a RequestUsage (in a ContextVar, so the db pool's worker
+threads see it too) that collects:
+
+    - Firestore documents read, written and deleted, counted by MeteredClient,
+      a thin proxy around the Firestore client the repository uses
+    - time in storage (run_db calls; overlapping calls count once)
+    - time serializing the response (encoding after the endpoint returns,
+      rendering the body and compressing it)
+
+RequestMetricsMiddleware reports it three ways: a Server-Timing header
+(db / serialize / app, where app is everything else), a JSON log line for
+requests slower than SLOW_REQUEST_MS, and per-route aggregates rendered in
+Prometheus text format for GET /metrics. Streamed bodies (exports, SSE)
+finish after the header is sent, so their header only covers the time to
+first byte; the log and /metrics include the whole stream. Exports read on
+their own producer thread rather than through run_db, so their documents are
+counted but their storage time shows up as app time.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.routing import request_response
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("request_metrics")
+
+
+# ========== PER-REQUEST USAGE ==========
+
+class RequestUsage:
+    """What one request has cost so far"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.reads = self.writes = self.deletes = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.handler_done: Optional[float] = None
+        self._db_active = 0
+        self._db_since = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, reads: int = 0, writes: int = 0, deletes: int = 0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.deletes += deletes
+
+    @contextmanager
+    def storage(self):
+        """Time storage work; calls running side by side (asyncio.gather) count once"""
+        with self._lock:
+            if self._db_active == 0:
+                self._db_since = time.perf_counter()
+            self._db_active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._db_active -= 1
+                if self._db_active == 0:
+                    self.db_seconds += time.perf_counter() - self._db_since
+
+    def breakdown(self) -> dict:
+        """Milliseconds so far: total, db, serialize and app (the rest)"""
+        total = time.perf_counter() - self.started
+        app = max(0.0, total - self.db_seconds - self.serialize_seconds)
+        return {
+            "total_ms": total * 1000,
+            "db_ms": self.db_seconds * 1000,
+            "serialize_ms": self.serialize_seconds * 1000,
+            "app_ms": app * 1000,
+        }
+
+    def server_timing(self) -> str:
+        times = self.breakdown()
+        db = f"db;dur={times['db_ms']:.1f}"
+        if self.reads or self.writes or self.deletes:
+            db += f';desc="{self.reads} reads, {self.writes} writes, {self.deletes} deletes"'
+        return (f"{db}, serialize;dur={times['serialize_ms']:.1f}, "
+                f"app;dur={times['app_ms']:.1f}, total;dur={times['total_ms']:.1f}")
+
+
+current_usage: ContextVar[Optional[RequestUsage]] = ContextVar('request_usage', default=None)
+
+
+def count_documents(reads: int = 0, writes: int = 0, deletes: int = 0):
+    usage = current_usage.get()
+    if usage is not None:
+        usage.count(reads, writes, deletes)
+
+
+@contextmanager
+def storage_timer():
+    usage = current_usage.get()
+    if usage is None:
+        yield
+        return
+    with usage.storage():
+        yield
+
+
+# ========== SERIALIZATION ==========
+
+class TimedRoute(APIRoute):
+    """APIRoute that notes when the endpoint returns, so the encoding after it counts as serialization"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+
+        if asyncio.iscoroutinefunction(call):
+            async def timed_call(*call_args, **call_kwargs):
+                try:
+                    return await call(*call_args, **call_kwargs)
+                finally:
+                    _handler_done()
+        else:
+            def timed_call(*call_args, **call_kwargs):
+                try:
+                    return call(*call_args, **call_kwargs)
+                finally:
+                    _handler_done()
+
+        self.dependant.call = timed_call
+        self.app = request_response(self.get_route_handler())
+
+
+def _handler_done():
+    usage = current_usage.get()
+    if usage is not None:
+        usage.handler_done = time.perf_counter()
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that books the time from the endpoint's return to the rendered body
+
+    Subclasses change the encoder by overriding encode().
+    """
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        try:
+            return self.encode(content)
+        finally:
+            record_serialization(start)
+
+    def encode(self, content) -> bytes:
+        return super().render(content)
+
+
+def record_serialization(start: float):
+    """Book serialization that ended now; it began at the endpoint's return if that came first"""
+    usage = current_usage.get()
+    if usage is None:
+        return
+    if usage.handler_done is not None and usage.handler_done <= start:
+        start = usage.handler_done
+    add_serialization(time.perf_counter() - start)
+
+
+def add_serialization(seconds: float):
+    usage = current_usage.get()
+    if usage is not None:
+        usage.serialize_seconds += seconds
+
+
+# ========== FIRESTORE CLIENT ==========
+
+# Methods that return another reference or query, which stay metered
+_CHAINED = frozenset({
+    'collection', 'document', 'where', 'order_by', 'limit', 'limit_to_last', 'offset', 'select',
+    'start_at', 'start_after', 'end_at', 'end_before',
+})
+
+
+class MeteredClient:
+    """Proxy for a Firestore client, reference or query that counts the documents it moves
+
+    Reads are counted per document returned (a query that matches nothing
+    still bills one, as Firestore does), writes and deletes per document.
+    Batches and transactions are the real objects with their write methods
+    counted, so firestore.transactional works unchanged; a transaction that
+    is retried counts its writes again.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _CHAINED:
+            return lambda *args, **kwargs: MeteredClient(attr(*args, **kwargs))
+        return attr
+
+    def get(self, *args, **kwargs):
+        result = self._target.get(*args, **kwargs)
+        count_documents(reads=max(1, len(result)) if isinstance(result, list) else 1)
+        return result
+
+    def stream(self, *args, **kwargs):
+        read = 0
+        try:
+            for doc in self._target.stream(*args, **kwargs):
+                read += 1
+                yield doc
+        finally:
+            count_documents(reads=max(1, read))
+
+    def get_all(self, references, *args, **kwargs):
+        read = 0
+        try:
+            for doc in self._target.get_all(references, *args, **kwargs):
+                read += 1
+                yield doc
+        finally:
+            count_documents(reads=read)
+
+    def set(self, *args, **kwargs):
+        count_documents(writes=1)
+        return self._target.set(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        count_documents(writes=1)
+        return self._target.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        count_documents(deletes=1)
+        return self._target.delete(*args, **kwargs)
+
+    def batch(self):
+        return _count_writes(self._target.batch())
+
+    def transaction(self, *args, **kwargs):
+        return _count_writes(self._target.transaction(*args, **kwargs))
+
+
+def _count_writes(writer):
+    for name, kind in (('set', 'writes'), ('create', 'writes'), ('update', 'writes'), ('delete', 'deletes')):
+        method = getattr(writer, name, None)
+        if method is not None:
+            setattr(writer, name, _counted(method, kind))
+    return writer
+
+
+def _counted(method, kind: str):
+    def call(*args, **kwargs):
+        count_documents(**{kind: 1})
+        return method(*args, **kwargs)
+    return call
+
+
+# ========== AGGREGATES ==========
+
+class RequestMetrics:
+    """Per-route totals since startup, rendered in Prometheus text format"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statuses = Counter()
+        self._routes = {}
+
+    def observe(self, method: str, route: str, status: int, usage: RequestUsage, seconds: float):
+        with self._lock:
+            self._statuses[(method, route, status)] += 1
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = {
+                    'buckets': [0] * len(self.BUCKETS), 'count': 0, 'seconds': 0.0,
+                    'db_seconds': 0.0, 'serialize_seconds': 0.0, 'reads': 0, 'writes': 0, 'deletes': 0,
+                }
+            for i, limit in enumerate(self.BUCKETS):
+                if seconds <= limit:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['db_seconds'] += usage.db_seconds
+            stats['serialize_seconds'] += usage.serialize_seconds
+            stats['reads'] += usage.reads
+            stats['writes'] += usage.writes
+            stats['deletes'] += usage.deletes
+
+    def render(self) -> str:
+        with self._lock:
+            statuses = dict(self._statuses)
+            routes = {key: {**stats, 'buckets': list(stats['buckets'])} for key, stats in self._routes.items()}
+
+        lines = [
+            "# HELP http_requests_total Requests handled, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(statuses.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Time from request to the last body byte.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), stats in sorted(routes.items()):
+            for limit, count in zip(self.BUCKETS, stats['buckets']):
+                lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=limit)} {count}")
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {stats['count']}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {stats['seconds']:.6f}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {stats['count']}")
+
+        for name, field, help_text in (
+            ("http_request_db_seconds_total", "db_seconds", "Time spent in storage calls."),
+            ("http_request_serialize_seconds_total", "serialize_seconds", "Time spent serializing responses."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (method, route), stats in sorted(routes.items()):
+                lines.append(f"{name}{_labels(method=method, route=route)} {stats[field]:.6f}")
+
+        lines += [
+            "# HELP firestore_documents_total Firestore documents read, written and deleted.",
+            "# TYPE firestore_documents_total counter",
+        ]
+        for (method, route), stats in sorted(routes.items()):
+            for op, field in (("read", "reads"), ("write", "writes"), ("delete", "deletes")):
+                lines.append(f"firestore_documents_total{_labels(method=method, route=route, op=op)} {stats[field]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+# ========== MIDDLEWARE ==========
+
+class RequestMetricsMiddleware:
+    """Installs a RequestUsage per HTTP request and reports it when the response is done"""
+
+    def __init__(self, app, metrics: RequestMetrics, slow_request_ms: float = 1000):
+        self.app = app
+        self.metrics = metrics
+        self.slow_request_ms = slow_request_ms
+        self._route_paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = RequestUsage()
+        token = current_usage.set(usage)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", usage.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_usage.reset(token)
+            self.report(scope, status, usage)
+
+    def route_path(self, scope) -> str:
+        """The matched route's template, so metrics don't get a label per username"""
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    def report(self, scope, status: int, usage: RequestUsage):
+        times = usage.breakdown()
+        route = self.route_path(scope)
+        self.metrics.observe(scope["method"], route, status, usage, times["total_ms"] / 1000)
+
+        if times["total_ms"] >= self.slow_request_ms:
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status,
+                **{key: round(value, 1) for key, value in times.items()},
+                "reads": usage.reads,
+                "writes": usage.writes,
+                "deletes": usage.deletes,
+            }))
@@ -0,0 +1,134 @@
+"""
+Response encoding for large payloads
+FastJSONResponse renders with orjson (falling back to the stdlib json module
+if it isn't installed). List endpoints return it directly, which also skips
+FastAPI's jsonable_encoder pass over every row. CompressionMiddleware
+negotiates brotli or gzip from Accept-Encoding for complete bodies of at
+least COMPRESS_MIN_BYTES. Streamed bodies (exports, SSE) pass through
+untouched, so their chunks still go out as soon as they're produced.
+"""
+import gzip
+import json
+import time
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers, MutableHeaders
+
+from request_metrics import TimedJSONResponse, add_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fast settings: these bodies are compressed on every request, not once
+GZIP_LEVEL = 4
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _default(value):
+    """Types orjson/json don't handle natively (e.g. Firestore timestamps)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(TimedJSONResponse):
+    """JSON via orjson; return it from the endpoint so jsonable_encoder is skipped too"""
+
+    def encode(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+# ========== COMPRESSION ==========
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' or 'gzip' if the client accepts it (q > 0), preferring brotli"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Compress complete text/JSON bodies of at least `minimum_size` bytes
+
+    Add it before any @app.middleware("http") function so it runs inside it:
+    BaseHTTPMiddleware re-sends every body as a stream, which this passes through.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        pending_start = None
+
+        async def send_compressed(message):
+            nonlocal pending_start
+            if message["type"] == "http.response.start":
+                # Hold the headers until the body shows whether it's worth compressing
+                pending_start = message
+                return
+            if pending_start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start, pending_start = pending_start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if (message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if coding is not None:
+                began = time.perf_counter()
+                body = compress(body, coding)
+                add_serialization(time.perf_counter() - began)
+                headers["content-encoding"] = coding
+                headers["content-length"] = str(len(body))
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
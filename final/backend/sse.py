@@ -0,0 +1,66 @@
+"""
+Server-sent events for streamed AI answers
+The financial context goes out as the first event so the UI can render it
+immediately, then each generated chunk as a `token` event, then `done` (or
+`error`). If the client disconnects, Starlette cancels the response task and
+the upstream generation stream is closed with it
+"""
+import json
+from typing import AsyncIterator, Callable, Optional
+
+import anyio
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Stop nginx-style proxies from buffering the whole response
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_answer(
+    context: dict,
+    chunks: Optional[AsyncIterator],
+    on_complete: Optional[Callable[[str], None]] = None,
+    cached_text: Optional[str] = None,
+):
+    """SSE body: context, then the generated text chunk by chunk
+
+    `chunks` is a lazy async generator of response chunks (e.g.
+    LLMGateway.stream), so generation only starts once the context event is
+    out. `on_complete` receives the full text once the stream has finished
+    normally. With `cached_text` nothing is generated.
+    """
+    yield sse_event("context", context)
+
+    if cached_text is not None:
+        yield sse_event("token", {"text": cached_text})
+        yield sse_event("done", {"cached": True})
+        return
+
+    parts = []
+    try:
+        async for chunk in chunks:
+            text = getattr(chunk, "text", None)
+            if text:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        detail = getattr(e, "detail", None) or f"Chat failed: {str(e)}"
+        yield sse_event("error", {"detail": detail, "status": getattr(e, "status_code", 500)})
+        return
+    finally:
+        # Runs on client disconnect too (the task is cancelled); shield the
+        # close so the upstream HTTP stream is released, not abandoned
+        if hasattr(chunks, "aclose"):
+            with anyio.CancelScope(shield=True):
+                await chunks.aclose()
+
+    if on_complete is not None:
+        on_complete("".join(parts))
+    yield sse_event("done", {"cached": False})
@@ -3,7 +3,7 @@
 import { useState, useEffect } from 'react'
 import { useRouter } from 'next/navigation'
 import Link from 'next/link'
-import { getTransactions, getMonthlyReport, addTransaction, downloadExcel, deleteTransaction, getProfile } from '@/lib/api'
+import { getDashboard, getTransactionsPage, addTransaction, downloadExcel, deleteTransaction } from '@/lib/api'
 import { Transaction, MonthlyReport, UserProfile } from '@/types'
 import SummaryCards from '@/components/SummaryCards'
 import SavingsVault from '@/components/SavingsVault'
@@ -22,6 +22,8 @@ export default function DashboardPage() {
   const [username, setUsername] = useState<string | null>(null)
   const [userProfile, setUserProfile] = useState<UserProfile | null>(null)
   const [transactions, setTransactions] = useState<Transaction[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [report, setReport] = useState<MonthlyReport | null>(null)
   const [loading, setLoading] = useState(true)
   const [monthLoading, setMonthLoading] = useState(false)
@@ -49,14 +51,11 @@ export default function DashboardPage() {
   const loadData = async (user: string) => {
     try {
       const month = viewAllTime ? undefined : selectedMonth
-      const [txns, rpt, profile] = await Promise.all([
-        viewAllTime ? getTransactions(user) : getTransactions(user, month),
-        viewAllTime ? getMonthlyReport(user) : getMonthlyReport(user, month),
-        getProfile(user)
-      ])
-      setTransactions(txns)
-      setReport(rpt)
-      setUserProfile(profile)
+      const dashboard = await getDashboard(user, month)
+      setTransactions(dashboard.transactions)
+      setNextCursor(dashboard.next_cursor)
+      setReport(dashboard.report)
+      setUserProfile(dashboard.profile)
     } catch (error) {
       console.error('Failed to load data:', error)
     } finally {
@@ -64,6 +63,21 @@ export default function DashboardPage() {
     }
   }
 
+  const handleLoadMore = async () => {
+    if (!username || !nextCursor) return
+    setLoadingMore(true)
+    try {
+      const month = viewAllTime ? undefined : selectedMonth
+      const page = await getTransactionsPage(username, month, nextCursor)
+      setTransactions(prev => [...prev, ...page.transactions])
+      setNextCursor(page.next_cursor)
+    } catch (error) {
+      console.error('Failed to load more transactions:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleAddTransaction = async (data: any) => {
     if (!username || !userProfile) return
     await addTransaction({
@@ -261,6 +275,10 @@ export default function DashboardPage() {
               selectedMonth={selectedMonth}
               viewAllTime={viewAllTime}
               loading={monthLoading}
+              totalCount={report?.transaction_count}
+              hasMore={!!nextCursor}
+              loadingMore={loadingMore}
+              onLoadMore={handleLoadMore}
             />
           </div>
         </div>
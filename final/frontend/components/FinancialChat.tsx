@@ -1,7 +1,7 @@
 'use client'
 
 import { useState, useRef, useEffect } from 'react'
-import { sendChatMessage } from '@/lib/api'
+import { streamChatMessage } from '@/lib/api'
 import { Button } from '@/components/ui/Button'
 import { Send, X, MessageCircle, Loader2 } from 'lucide-react'
 
@@ -26,7 +26,9 @@ export default function FinancialChat({ username }: FinancialChatProps) {
   ])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [streaming, setStreaming] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
+  const abortRef = useRef<AbortController | null>(null)
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -36,8 +38,23 @@ export default function FinancialChat({ username }: FinancialChatProps) {
     scrollToBottom()
   }, [messages])
 
+  // Closing the chat or leaving the page cancels an answer in progress
+  useEffect(() => () => abortRef.current?.abort(), [])
+
+  const handleClose = () => {
+    abortRef.current?.abort()
+    setIsOpen(false)
+  }
+
+  const appendToLastMessage = (text: string) => {
+    setMessages(prev => {
+      const last = prev[prev.length - 1]
+      return [...prev.slice(0, -1), { ...last, content: last.content + text }]
+    })
+  }
+
   const handleSend = async () => {
-    if (!input.trim() || loading) return
+    if (!input.trim() || loading || streaming) return
 
     const userMessage: Message = {
       role: 'user',
@@ -49,17 +66,27 @@ export default function FinancialChat({ username }: FinancialChatProps) {
     setInput('')
     setLoading(true)
 
-    try {
-      const response = await sendChatMessage(username, input)
-      
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: response.response,
-        timestamp: new Date()
-      }
+    const controller = new AbortController()
+    abortRef.current = controller
+    let started = false
 
-      setMessages(prev => [...prev, assistantMessage])
+    try {
+      // Render the answer as it is generated instead of waiting for all of it
+      await streamChatMessage(username, input, {
+        signal: controller.signal,
+        onToken: (text) => {
+          if (!started) {
+            started = true
+            setLoading(false)
+            setStreaming(true)
+            setMessages(prev => [...prev, { role: 'assistant', content: text, timestamp: new Date() }])
+          } else {
+            appendToLastMessage(text)
+          }
+        }
+      })
     } catch (error: any) {
+      if (error.name === 'AbortError') return
       const errorMessage: Message = {
         role: 'assistant',
         content: `Sorry, I encountered an error: ${error.message}. Please try again.`,
@@ -67,7 +94,9 @@ export default function FinancialChat({ username }: FinancialChatProps) {
       }
       setMessages(prev => [...prev, errorMessage])
     } finally {
+      if (abortRef.current === controller) abortRef.current = null
       setLoading(false)
+      setStreaming(false)
     }
   }
 
@@ -104,7 +133,7 @@ export default function FinancialChat({ username }: FinancialChatProps) {
           </div>
         </div>
         <button
-          onClick={() => setIsOpen(false)}
+          onClick={handleClose}
           className="hover:bg-white/20 p-2 rounded-lg transition-colors"
         >
           <X className="w-5 h-5" />
@@ -155,12 +184,12 @@ export default function FinancialChat({ username }: FinancialChatProps) {
             onChange={(e) => setInput(e.target.value)}
             onKeyPress={handleKeyPress}
             placeholder="Ask about your finances..."
-            disabled={loading}
+            disabled={loading || streaming}
             className="flex-1 px-4 py-2 border border-slate-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-primary-500 focus:border-transparent disabled:bg-slate-100 disabled:cursor-not-allowed"
           />
           <Button
             onClick={handleSend}
-            disabled={!input.trim() || loading}
+            disabled={!input.trim() || loading || streaming}
             className="px-4 py-2 bg-gradient-to-r from-primary-600 to-violet-600 text-white rounded-xl hover:shadow-lg transition-all disabled:opacity-50 disabled:cursor-not-allowed"
           >
             <Send className="w-5 h-5" />
@@ -12,9 +12,13 @@ interface TransactionListProps {
     selectedMonth?: string;
     viewAllTime?: boolean;
     loading?: boolean;
+    totalCount?: number;
+    hasMore?: boolean;
+    loadingMore?: boolean;
+    onLoadMore?: () => void;
 }
 
-export default function TransactionList({ transactions, onDelete, currency, selectedMonth, viewAllTime, loading }: TransactionListProps) {
+export default function TransactionList({ transactions, onDelete, currency, selectedMonth, viewAllTime, loading, totalCount, hasMore, loadingMore, onLoadMore }: TransactionListProps) {
     const monthName = viewAllTime 
         ? 'All Time'
         : selectedMonth 
@@ -35,7 +39,7 @@ export default function TransactionList({ transactions, onDelete, currency, sele
                 </div>
                 <div className="text-right">
                     <p className="text-xs text-slate-500">Total</p>
-                    <p className="text-lg font-bold text-slate-900">{loading ? '...' : transactions.length}</p>
+                    <p className="text-lg font-bold text-slate-900">{loading ? '...' : (totalCount ?? transactions.length)}</p>
                 </div>
             </div>
 
@@ -95,6 +99,15 @@ export default function TransactionList({ transactions, onDelete, currency, sele
                         </div>
                     ))
                 )}
+                {hasMore && onLoadMore && (
+                    <button
+                        onClick={onLoadMore}
+                        disabled={loadingMore}
+                        className="w-full py-3 text-sm font-medium text-primary-600 bg-primary-50 border border-primary-100 rounded-xl hover:bg-primary-100 transition-all disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                )}
             </div>
             )}
         </Card>
@@ -1,5 +1,5 @@
 // API Client
-import { User, Transaction, MonthlyReport, ApiResponse, UserProfile } from '@/types';
+import { User, Transaction, TransactionPage, MonthlyReport, DashboardData, ApiResponse, UserProfile } from '@/types';
 
 const API_BASE_URL = 'http://localhost:8000/api';
 
@@ -97,6 +97,40 @@ export async function getTransactions(username: string, month?: string): Promise
   return response.json();
 }
 
+export async function getTransactionsPage(username: string, month?: string, cursor?: string | null, limit: number = 50): Promise<TransactionPage> {
+  // One page of transactions, newest first; pass next_cursor back for the next page
+  const params = new URLSearchParams({ paginate: 'true', limit: String(limit) });
+  if (month) params.set('month', month);
+  else params.set('all', 'true');
+  if (cursor) params.set('cursor', cursor);
+
+  const response = await fetch(`${API_BASE_URL}/transactions/${username}?${params}`);
+  if (!response.ok) throw new Error('Failed to fetch transactions');
+  const data = await response.json();
+  // Backends without paging support return a plain array
+  return Array.isArray(data) ? { transactions: data, next_cursor: null } : data;
+}
+
+export async function getDashboard(username: string, month?: string): Promise<DashboardData> {
+  // First page of transactions, report, balance, months and profile in one request
+  const url = month
+    ? `${API_BASE_URL}/dashboard/${username}?month=${month}`
+    : `${API_BASE_URL}/dashboard/${username}`;
+  const response = await fetch(url);
+  if (response.status === 404) {
+    // Backends without the dashboard endpoint (the Java proxy): make the
+    // separate calls instead. They give no month list or all-time balance.
+    const [page, report, profile] = await Promise.all([
+      getTransactionsPage(username, month),
+      getMonthlyReport(username, month),
+      getProfile(username),
+    ]);
+    return { ...page, report, profile };
+  }
+  if (!response.ok) throw new Error('Failed to fetch dashboard');
+  return response.json();
+}
+
 export async function getMonthlyReport(username: string, month?: string): Promise<MonthlyReport> {
   const url = month 
     ? `${API_BASE_URL}/report/${username}?month=${month}`
@@ -160,6 +194,57 @@ export async function sendChatMessage(username: string, message: string): Promis
   return data;
 }
 
+export interface ChatStreamHandlers {
+  onContext?: (context: any) => void;
+  onToken: (text: string) => void;
+  signal?: AbortSignal;
+}
+
+// Streams the answer as server-sent events: `context` first, then `token`
+// chunks, then `done` or `error`. Aborting the signal cancels generation.
+export async function streamChatMessage(username: string, message: string, handlers: ChatStreamHandlers): Promise<void> {
+  const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ username, message }),
+    signal: handlers.signal,
+  });
+
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.detail || 'Chat failed');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      const payload = data ? JSON.parse(data) : {};
+
+      if (event === 'context') handlers.onContext?.(payload);
+      else if (event === 'token') handlers.onToken(payload.text);
+      else if (event === 'error') throw new Error(payload.detail || 'Chat failed');
+      else if (event === 'done') return;
+    }
+  }
+}
+
 export async function analyzeExpenses(username: string, query: string): Promise<{ analysis: string; transaction_count: number }> {
   const response = await fetch(`${API_BASE_URL}/analyze`, {
     method: 'POST',
@@ -27,6 +27,11 @@ export interface Transaction {
   created_at?: string;
 }
 
+export interface TransactionPage {
+  transactions: Transaction[];
+  next_cursor: string | null;
+}
+
 export interface MonthlyReport {
   totalIncome: number;
   totalExpense: number;
@@ -40,6 +45,13 @@ export interface MonthlyReport {
   transaction_count?: number;  // Backward compatibility
 }
 
+export interface DashboardData extends TransactionPage {
+  report: MonthlyReport;
+  balance?: number;  // Not available from backends without /dashboard
+  months?: string[];  // Not available from backends without /dashboard
+  profile: UserProfile;
+}
+
 export interface ApiResponse<T = any> {
   message?: string;
   [key: string]: any;
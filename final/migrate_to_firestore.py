@@ -1,207 +1,418 @@
 """
 Firebase Data Migration Script
 Migrates JSON data to Firestore with UUID-based schema
+
+Streams each java-backend/data/*.json file, writes documents in batches of
+up to 500 from a bounded worker pool, and uses deterministic IDs (UUIDv5 of
+the username, of the source id, or of the record's position) so re-running
+overwrites instead of duplicating. Progress is checkpointed per file, so an
+interrupted run resumes where it stopped:
+
+    python migrate_to_firestore.py                 # migrate / resume
+    python migrate_to_firestore.py --workers 16    # more batches in flight
+    python migrate_to_firestore.py --restart       # ignore the checkpoint
 """
+import argparse
+import codecs
 import json
+import os
+import sys
+import threading
+import time
+import uuid
 import firebase_admin
 from firebase_admin import credentials, firestore
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-import uuid
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate('serviceAccountKey.json')
-firebase_admin.initialize_app(cred)
+# Stable namespace for migrated IDs - changing it would duplicate every document
+MIGRATION_NAMESPACE = uuid.UUID('5b7d1c1e-7f0a-4c4e-9a55-2f6f0c3e8a11')
+
+FIRESTORE_BATCH_LIMIT = 500
+READ_CHUNK_SIZE = 1 << 20
+
+db = None
+
+def deterministic_id(kind: str, key) -> str:
+    return str(uuid.uuid5(MIGRATION_NAMESPACE, f"{kind}:{key}"))
+
+def user_id_for(username: str) -> str:
+    return deterministic_id('user', username)
+
+# ========== STREAMING JSON ==========
+
+def iter_json_array(path: Path):
+    """Yield (item, bytes read so far) from a top-level JSON array, one item at a time"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    with open(path, 'rb') as f:
+        buffer, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in chars:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                fill()
+
+        fill()
+        skip(' \t\r\n\ufeff')
+        if buffer[pos:pos + 1] == '{':
+            # The Java backend writes "{}" for an empty store
+            if json.loads(buffer[pos:] + f.read().decode('utf-8')) != {}:
+                raise ValueError(f"{path} is not a JSON array")
+            return
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError(f"{path} is not a JSON array")
+        pos += 1
+
+        while True:
+            skip(' \t\r\n,')
+            if pos >= len(buffer):
+                raise ValueError(f"{path} ended before the closing ]")
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                item, end = None, None
+            # An item touching the end of the buffer may be cut short - read on
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError(f"{path} has invalid JSON near byte {f.tell()}")
+                fill()
+                continue
+            pos = end
+            yield item, f.tell()
+
+# ========== CHECKPOINT ==========
+
+class Checkpoint:
+    """Per-file count of source records that are safely in Firestore"""
+
+    def __init__(self, path: Path, restart: bool = False):
+        self.path = path
+        self.state = {}
+        if path.exists() and not restart:
+            self.state = json.loads(path.read_text())
+        self.lock = threading.Lock()
+
+    def resume_from(self, name: str, source: Path):
+        """(records already migrated, whether the file was finished)"""
+        entry = self.state.get(name)
+        if not entry:
+            return 0, False
+        if entry.get('fingerprint') != fingerprint(source):
+            print(f"  ⚠️  {source.name} changed since the last run - starting it over")
+            return 0, False
+        return entry['done'], entry.get('finished', False)
+
+    def save(self, name: str, source: Path, done: int, finished: bool = False):
+        with self.lock:
+            self.state[name] = {'fingerprint': fingerprint(source), 'done': done, 'finished': finished}
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.state, indent=2))
+            os.replace(tmp, self.path)
+
+def fingerprint(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+# ========== PROGRESS ==========
+
+class Progress:
+    """docs/sec and an ETA from how far into the source file has been committed"""
+
+    def __init__(self, name: str, total_bytes: int):
+        self.name = name
+        self.total_bytes = max(total_bytes, 1)
+        self.start = self.last_print = time.monotonic()
+        self.docs = 0
+        self.bytes = 0
+
+    def update(self, docs: int = 0, position: int = None, force: bool = False):
+        self.docs += docs
+        if position is not None:
+            self.bytes = max(self.bytes, position)
+        now = time.monotonic()
+        if not force and now - self.last_print < 1:
+            return
+        self.last_print = now
+        elapsed = max(now - self.start, 1e-6)
+        fraction = min(self.bytes / self.total_bytes, 1)
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else 0
+        print(f"\r  ⏳ {self.name}: {self.docs} docs, {self.docs / elapsed:.0f} docs/sec, "
+              f"{fraction:.0%} read, ETA {eta:.0f}s   ", end='', flush=True)
+
+    def finish(self):
+        self.update(force=True)
+        print()
+
+# ========== BATCHED WRITER ==========
+
+def commit_batch(writes, attempts: int = 5):
+    """Commit one WriteBatch, backing off on transient failures"""
+    if not writes:
+        return
+    for attempt in range(attempts):
+        batch = db.batch()
+        for ref, data in writes:
+            batch.set(ref, data)
+        try:
+            batch.commit()
+            return
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+def migrate_file(name: str, source: Path, to_writes, checkpoint: Checkpoint, args) -> dict:
+    """Stream one JSON array into Firestore through the worker pool
+
+    to_writes(record, index) returns the (ref, data) pairs for a record, or
+    None to skip it. Records never straddle batches, so a batch covers a
+    contiguous index range and the checkpoint is the highest index below
+    which every batch has committed.
+    """
+    stats = {'records': 0, 'docs': 0, 'skipped': 0}
+    start_index, finished = checkpoint.resume_from(name, source)
+    if finished:
+        print(f"  ⏭️  {name} already migrated ({start_index} records)")
+        return stats
+    if start_index:
+        print(f"  ↪️  Resuming {name} after {start_index} records")
 
-db = firestore.client()
+    progress = Progress(name, source.stat().st_size)
+    finished_ranges = {}
+    done = start_index
 
-# Store username -> userId mapping for transactions migration
-username_to_userid = {}
+    def on_done(first: int, last: int):
+        nonlocal done
+        finished_ranges[first] = last
+        while done in finished_ranges:
+            done = finished_ranges.pop(done)
+        checkpoint.save(name, source, done)
 
-def migrate_users():
-    """Migrate users from JSON to Firestore with UUID"""
-    users_file = Path('java-backend/data/users.json')
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        in_flight = {}
+
+        def drain(block_until: int):
+            while len(in_flight) > block_until:
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    first, last, count, position = in_flight.pop(future)
+                    future.result()
+                    on_done(first, last)
+                    progress.update(docs=count, position=position)
+
+        writes, batch_start, batch_position = [], start_index, 0
+        index = -1
+        for index, (record, position) in enumerate(iter_json_array(source)):
+            if index < start_index:
+                progress.update(position=position)
+                continue
+            stats['records'] += 1
+            record_writes = to_writes(record, index)
+            if record_writes is None:
+                stats['skipped'] += 1
+                record_writes = []
+            if writes and len(writes) + len(record_writes) > args.batch_size:
+                in_flight[pool.submit(commit_batch, writes)] = (batch_start, index, len(writes), batch_position)
+                writes, batch_start = [], index
+                # Bound memory: never more than two batches per worker queued
+                drain(args.workers * 2)
+            writes.extend(record_writes)
+            batch_position = position
+
+        end_index = index + 1
+        if writes or batch_start < end_index:
+            in_flight[pool.submit(commit_batch, writes)] = (batch_start, end_index, len(writes), batch_position)
+        drain(0)
+
+    checkpoint.save(name, source, done, finished=True)
+    progress.finish()
+    stats['docs'] = progress.docs
+    return stats
+
+# ========== MIGRATIONS ==========
+
+def migrate_users(data_dir: Path, checkpoint: Checkpoint, args) -> set:
+    """Migrate users from JSON to Firestore with UUID - returns the known usernames"""
+    users_file = data_dir / 'users.json'
     if not users_file.exists():
         print("❌ Users file not found")
-        return
-    
-    users = json.loads(users_file.read_text())
-    print(f"📤 Migrating {len(users)} users...")
-    
-    for user in users:
-        # Generate UUID for user
-        user_id = str(uuid.uuid4())
+        return set()
+
+    print("📤 Migrating users...")
+    usernames = set()
+
+    def to_writes(user, index):
         username = user['username']
-        
-        # Store in users collection with UUID as document ID
-        user_ref = db.collection('users').document(user_id)
-        user_ref.set({
-            'userId': user_id,
-            'username': username,
-            'email': user.get('email', ''),
-            'password': user.get('password', ''),
-            'fullName': user.get('fullName', ''),
-            'currency': user.get('currency', 'PKR'),
-            'savingsVault': user.get('savingsVault', 0),
-            'createdAt': firestore.SERVER_TIMESTAMP
-        })
-        
-        # Store username -> userId mapping for quick lookups
-        username_ref = db.collection('usernames').document(username)
-        username_ref.set({
-            'userId': user_id,
-            'username': username
-        })
-        
-        # Save mapping for transaction migration
-        username_to_userid[username] = user_id
-        
-        print(f"  ✅ Migrated user: {username} → {user_id}")
-    
-    print(f"✅ Successfully migrated {len(users)} users\n")
-
-def migrate_transactions():
-    """Migrate transactions from JSON to Firestore with userId"""
-    transactions_file = Path('java-backend/data/transactions.json')
-    if not transactions_file.exists():
-        print("❌ Transactions file not found")
-        return
-    
-    transactions = json.loads(transactions_file.read_text())
-    print(f"📤 Migrating {len(transactions)} transactions...")
-    
-    for txn in transactions:
-        username = txn.get('username', '')
-        user_id = username_to_userid.get(username)
-        
-        if not user_id:
-            print(f"  ⚠️  Skipping transaction - user not found: {username}")
-            continue
-        
-        txn_id = txn.get('id', str(uuid.uuid4()))
-        txn_ref = db.collection('transactions').document(txn_id)
-        txn_ref.set({
-            'transactionId': txn_id,
-            'userId': user_id,
-            'username': username,  # Keep for display purposes
-            'type': txn.get('type', ''),
-            'category': txn.get('category', ''),
-            'amount': float(txn.get('amount', 0)),
-            'description': txn.get('description', ''),
-            'date': txn.get('date', ''),
-            'currency': txn.get('currency', 'PKR'),
-            'createdAt': txn.get('created_at', datetime.now().isoformat())
-        })
-    
-    print(f"✅ Successfully migrated {len(transactions)} transactions\n")
-
-def migrate_budgets():
-    """Migrate budgets from JSON to Firestore with userId"""
-    budgets_file = Path('java-backend/data/budgets.json')
-    if not budgets_file.exists():
-        print("⚠️  Budgets file not found (skipping)")
-        return
-    
-    budgets = json.loads(budgets_file.read_text())
-    print(f"📤 Migrating {len(budgets)} budgets...")
-    
-    for budget in budgets:
-        username = budget.get('username', '')
-        user_id = username_to_userid.get(username)
-        
-        if not user_id:
-            print(f"  ⚠️  Skipping budget - user not found: {username}")
-            continue
-        
-        budget_id = budget.get('id', str(uuid.uuid4()))
-        budget_ref = db.collection('budgets').document(budget_id)
-        budget_ref.set({
-            'budgetId': budget_id,
-            'userId': user_id,
-            'username': username,  # Keep for display
-            'category': budget.get('category', ''),
-            'amount': float(budget.get('amount', 0)),
-            'month': budget.get('month', ''),
-            'currency': budget.get('currency', 'PKR'),
-            'createdAt': firestore.SERVER_TIMESTAMP
-        })
-    
-    print(f"✅ Successfully migrated {len(budgets)} budgets\n")
-
-def migrate_goals():
-    """Migrate financial goals from JSON to Firestore with userId"""
-    goals_file = Path('java-backend/data/goals.json')
-    if not goals_file.exists():
-        print("⚠️  Goals file not found (skipping)")
+        user_id = user_id_for(username)
+        return [
+            (db.collection('users').document(user_id), {
+                'userId': user_id,
+                'username': username,
+                'email': user.get('email', ''),
+                'password': user.get('password', ''),
+                'fullName': user.get('fullName', ''),
+                'currency': user.get('currency', 'PKR'),
+                'savingsVault': user.get('savingsVault', 0),
+                'createdAt': firestore.SERVER_TIMESTAMP
+            }),
+            # username -> userId mapping for quick lookups
+            (db.collection('usernames').document(username), {
+                'userId': user_id,
+                'username': username
+            })
+        ]
+
+    # Later files only need the set of usernames, which is cheap to rebuild
+    # even when the users themselves were already migrated
+    for user, _ in iter_json_array(users_file):
+        usernames.add(user['username'])
+
+    stats = migrate_file('users', users_file, to_writes, checkpoint, args)
+    print(f"✅ Successfully migrated {stats['records']} users\n")
+    return usernames
+
+def migrate_owned(kind: str, data_dir: Path, usernames: set, checkpoint: Checkpoint, args, to_doc):
+    """Migrate a per-user collection, skipping records whose user wasn't migrated"""
+    source = data_dir / f"{kind}.json"
+    if not source.exists():
+        print(f"⚠️  {kind.capitalize()} file not found (skipping)")
         return
-    
-    goals = json.loads(goals_file.read_text())
-    print(f"📤 Migrating {len(goals)} goals...")
-    
-    for goal in goals:
-        username = goal.get('username', '')
-        user_id = username_to_userid.get(username)
-        
-        if not user_id:
-            print(f"  ⚠️  Skipping goal - user not found: {username}")
-            continue
-        
-        goal_id = goal.get('id', str(uuid.uuid4()))
-        goal_ref = db.collection('goals').document(goal_id)
-        goal_ref.set({
-            'goalId': goal_id,
-            'userId': user_id,
-            'username': username,  # Keep for display
-            'name': goal.get('name', ''),
-            'target_amount': float(goal.get('target_amount', 0)),
-            'current_amount': float(goal.get('current_amount', 0)),
-            'deadline': goal.get('deadline', ''),
-            'currency': goal.get('currency', 'PKR'),
-            'createdAt': firestore.SERVER_TIMESTAMP
-        })
-    
-    print(f"✅ Successfully migrated {len(goals)} goals\n")
-
-def migrate_currency_rates():
+
+    print(f"📤 Migrating {kind}...")
+
+    def to_writes(record, index):
+        username = record.get('username', '')
+        if username not in usernames:
+            return None
+        doc_id, data = to_doc(record, index, user_id_for(username), username)
+        return [(db.collection(kind).document(doc_id), data)]
+
+    stats = migrate_file(kind, source, to_writes, checkpoint, args)
+    if stats['skipped']:
+        print(f"  ⚠️  Skipped {stats['skipped']} {kind} whose user was not found")
+    print(f"✅ Successfully migrated {stats['records'] - stats['skipped']} {kind}\n")
+
+def transaction_doc(txn, index, user_id, username):
+    txn_id = txn.get('id') or deterministic_id('transaction', index)
+    return txn_id, {
+        'transactionId': txn_id,
+        'userId': user_id,
+        'username': username,  # Keep for display purposes
+        'type': txn.get('type', ''),
+        'category': txn.get('category', ''),
+        'amount': float(txn.get('amount', 0)),
+        'description': txn.get('description', ''),
+        'date': txn.get('date', ''),
+        'currency': txn.get('currency', 'PKR'),
+        'createdAt': txn.get('created_at', datetime.now().isoformat())
+    }
+
+def budget_doc(budget, index, user_id, username):
+    # Same ID scheme as POST /api/budgets/set, so later edits update in place
+    budget_id = f"{user_id}_{budget.get('category', '')}_{budget.get('month', '')}"
+    return budget_id, {
+        'budgetId': budget_id,
+        'userId': user_id,
+        'username': username,  # Keep for display
+        'category': budget.get('category', ''),
+        'amount': float(budget.get('amount', 0)),
+        'month': budget.get('month', ''),
+        'currency': budget.get('currency', 'PKR'),
+        'createdAt': firestore.SERVER_TIMESTAMP
+    }
+
+def goal_doc(goal, index, user_id, username):
+    goal_id = goal.get('id') or deterministic_id('goal', index)
+    return goal_id, {
+        'goalId': goal_id,
+        'userId': user_id,
+        'username': username,  # Keep for display
+        'name': goal.get('name', ''),
+        'target_amount': float(goal.get('target_amount', 0)),
+        'current_amount': float(goal.get('current_amount', 0)),
+        'deadline': goal.get('deadline', ''),
+        'currency': goal.get('currency', 'PKR'),
+        'createdAt': firestore.SERVER_TIMESTAMP
+    }
+
+def migrate_currency_rates(data_dir: Path):
     """Migrate currency rates from JSON to Firestore"""
-    rates_file = Path('java-backend/data/currency_rates.json')
+    rates_file = data_dir / 'currency_rates.json'
     if not rates_file.exists():
         print("⚠️  Currency rates file not found (skipping)")
         return
-    
+
     rates_data = json.loads(rates_file.read_text())
     print(f"📤 Migrating currency rates...")
-    
+
     rates_ref = db.collection('currency_rates').document('rates')
     rates_ref.set(rates_data.get('rates', {}))
-    
+
     print(f"✅ Successfully migrated currency rates\n")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate java-backend JSON data to Firestore")
+    parser.add_argument('--data-dir', default='java-backend/data', help="directory holding the *.json files")
+    parser.add_argument('--credentials', default='serviceAccountKey.json')
+    parser.add_argument('--workers', type=int, default=8, help="batches committed in parallel")
+    parser.add_argument('--batch-size', type=int, default=FIRESTORE_BATCH_LIMIT, help="writes per batch (max 500)")
+    parser.add_argument('--checkpoint', default='.migration_checkpoint.json')
+    parser.add_argument('--restart', action='store_true', help="ignore the checkpoint and migrate everything again")
+    args = parser.parse_args()
+    args.batch_size = max(2, min(args.batch_size, FIRESTORE_BATCH_LIMIT))
+    return args
+
 def main():
     """Run all migrations"""
+    global db
+    args = parse_args()
+    data_dir = Path(args.data_dir)
+
+    # Initialize Firebase Admin SDK
+    firebase_admin.initialize_app(credentials.Certificate(args.credentials))
+    db = firestore.client()
+
     print("🔥 Starting Firebase Data Migration\n")
     print("="*50)
-    
+
+    checkpoint = Checkpoint(Path(args.checkpoint), restart=args.restart)
+    start = time.monotonic()
+
     try:
-        migrate_users()
-        migrate_transactions()
-        migrate_budgets()
-        migrate_goals()
-        migrate_currency_rates()
-        
+        usernames = migrate_users(data_dir, checkpoint, args)
+        migrate_owned('transactions', data_dir, usernames, checkpoint, args, transaction_doc)
+        migrate_owned('budgets', data_dir, usernames, checkpoint, args, budget_doc)
+        migrate_owned('goals', data_dir, usernames, checkpoint, args, goal_doc)
+        migrate_currency_rates(data_dir)
+
         print("="*50)
-        print("🎉 Migration completed successfully!")
-        print("\n📊 Summary:")
-        print(f"  • Users: ✅")
-        print(f"  • Transactions: ✅")
-        print(f"  • Budgets: ✅")
-        print(f"  • Goals: ✅")
-        print(f"  • Currency Rates: ✅")
-        
+        print(f"🎉 Migration completed successfully in {time.monotonic() - start:.1f}s!")
+        print(f"\n📊 Checkpoint: {args.checkpoint}")
+        for name, entry in checkpoint.state.items():
+            print(f"  • {name.capitalize()}: {entry['done']} records ✅")
+
     except Exception as e:
         print(f"\n❌ Migration failed: {str(e)}")
+        print(f"   Progress is saved in {args.checkpoint} - re-run to resume")
         import traceback
         traceback.print_exc()
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()